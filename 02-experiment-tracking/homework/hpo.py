@@ -1,23 +1,58 @@
 import os
+import sys
 import pickle
 import click
 import mlflow
 import numpy as np
+from pathlib import Path
 from hyperopt import STATUS_OK, Trials, fmin, hp, tpe
 from hyperopt.pyll import scope
 from sklearn.ensemble import RandomForestRegressor
 # from sklearn.metrics import root_mean_squared_error
 from sklearn.metrics import mean_squared_error
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.search import parallel_fmin  # noqa: E402
+from nyc_taxi.arrays import load_split  # noqa: E402
+from nyc_taxi.tracking import BatchLogger  # noqa: E402
+
 mlflow.set_tracking_uri("http://127.0.0.1:5000")
 mlflow.set_experiment("random-forest-hyperopt")
 
+# Training data of this process; pool workers fill it once in their initializer
+_data = {}
+# Trial runs are logged in the background; each process drains its queue before exiting
+tracking = BatchLogger()
+
 
 def load_pickle(filename: str):
     with open(filename, "rb") as f_in:
         return pickle.load(f_in)
 
 
+def load_training_data(data_path: str):
+    for name in ("train", "val"):
+        # Memory-mapped arrays are shared by all workers; the pickles are copied into each
+        _data[name] = load_split(data_path, name)
+
+
+def objective(params):
+    X_train, y_train = _data['train']
+    X_val, y_val = _data['val']
+
+    with tracking.start_run() as run:
+        run.set_tag("developer", "chad")
+        run.set_tag("model", "rf-regressor")
+        run.log_params(params)
+        rf = RandomForestRegressor(**params)
+        rf.fit(X_train, y_train)
+        y_pred = rf.predict(X_val)
+        rmse = mean_squared_error(y_val, y_pred, squared=False)
+        run.log_metric("RMSE", rmse)
+
+    return {'loss': rmse, 'status': STATUS_OK}
+
+
 @click.command()
 @click.option(
     "--data_path",
@@ -29,23 +64,12 @@ def load_pickle(filename: str):
     default=15,
     help="The number of parameter evaluations for the optimizer to explore"
 )
-def run_optimization(data_path: str, num_trials: int):
-
-    X_train, y_train = load_pickle(os.path.join(data_path, "train.pkl"))
-    X_val, y_val = load_pickle(os.path.join(data_path, "val.pkl"))
-
-    def objective(params):
-        with mlflow.start_run():
-            mlflow.set_tag("developer", "chad")
-            mlflow.set_tag("model", "rf-regressor")
-            mlflow.log_params(params)
-            rf = RandomForestRegressor(**params)
-            rf.fit(X_train, y_train)
-            y_pred = rf.predict(X_val)
-            rmse = mean_squared_error(y_val, y_pred, squared=False)
-            mlflow.log_metric("RMSE", rmse)
-
-        return {'loss': rmse, 'status': STATUS_OK}
+@click.option(
+    "--parallelism",
+    default=1,
+    help="Number of trials evaluated concurrently on a local process pool"
+)
+def run_optimization(data_path: str, num_trials: int, parallelism: int):
 
     search_space = {
         'max_depth': scope.int(hp.quniform('max_depth', 1, 20, 1)),
@@ -56,14 +80,34 @@ def run_optimization(data_path: str, num_trials: int):
     }
 
     rstate = np.random.default_rng(42)  # for reproducible results
-    fmin(
-        fn=objective,
-        space=search_space,
-        algo=tpe.suggest,
-        max_evals=num_trials,
-        trials=Trials(),
-        rstate=rstate
-    )
+    try:
+        if parallelism > 1:
+            # Each worker loads train/val once; trials only ship their params
+            parallel_fmin(
+                fn=objective,
+                space=search_space,
+                algo=tpe.suggest,
+                max_evals=num_trials,
+                parallelism=parallelism,
+                trials=Trials(),
+                rstate=rstate,
+                initializer=load_training_data,
+                initargs=(data_path,)
+            )
+            return
+
+        load_training_data(data_path)
+        fmin(
+            fn=objective,
+            space=search_space,
+            algo=tpe.suggest,
+            max_evals=num_trials,
+            trials=Trials(),
+            rstate=rstate
+        )
+    finally:
+        # Whichever branch ran, runs still queued in this process are logged before exiting
+        tracking.close()
 
 
 if __name__ == '__main__':
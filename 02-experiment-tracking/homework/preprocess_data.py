@@ -1,9 +1,19 @@
 import os
+import sys
 import pickle
 import click
+import numpy as np
 import pandas as pd
+import sklearn
 
-from sklearn.feature_extraction import DictVectorizer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+# Imported as modules: their sources are part of the preprocessing cache key
+from nyc_taxi import arrays, features, trips  # noqa: E402
+from nyc_taxi.cache import OutputCache, cache_key, file_digest, source_digest  # noqa: E402
+
+OUTPUTS = ["dv.pkl", "train.pkl", "val.pkl", "test.pkl", "train", "val", "test"]
 
 
 def dump_pickle(obj, filename: str):
@@ -11,28 +21,30 @@ def dump_pickle(obj, filename: str):
         return pickle.dump(obj, f_out)
 
 
-def read_dataframe(filename: str):
-    df = pd.read_parquet(filename)
-
-    df['duration'] = df['lpep_dropoff_datetime'] - df['lpep_pickup_datetime']
-    df.duration = df.duration.apply(lambda td: td.total_seconds() / 60)
-    df = df[(df.duration >= 1) & (df.duration <= 60)]
-
-    categorical = ['PULocationID', 'DOLocationID']
-    df[categorical] = df[categorical].astype(str)
-
-    return df
+def preprocessing_key(input_files, pu_do_encoding: str):
+    # Everything the outputs depend on: input bytes, feature spec and code version
+    return cache_key(
+        inputs=[file_digest(path) for path in input_files],
+        features={"categorical": ["PU_DO"], "numerical": ["trip_distance"], "target": "duration"},
+        pu_do_encoding=pu_do_encoding,
+        code=source_digest(__file__, trips.__file__, features.__file__, arrays.__file__),
+        libraries=[np.__version__, pd.__version__, sklearn.__version__],
+    )
 
 
-def preprocess(df: pd.DataFrame, dv: DictVectorizer, fit_dv: bool = False):
-    df['PU_DO'] = df['PULocationID'] + '_' + df['DOLocationID']
-    categorical = ['PU_DO']
-    numerical = ['trip_distance']
-    dicts = df[categorical + numerical].to_dict(orient='records')
+def preprocess(df: pd.DataFrame, dv=None, fit_dv: bool = False, pu_do_encoding: str = 'string'):
+    # Same columns as DictVectorizer on {'PU_DO', 'trip_distance'} dicts, built from arrays
     if fit_dv:
-        X = dv.fit_transform(dicts)
+        encoder = features.TripFeatureEncoder(
+            categorical=['PU_DO'],
+            numerical=['trip_distance'],
+            pair_encoding=pu_do_encoding
+        )
+        encoder.fit(df)
+        dv = features.to_preprocessor(encoder)
     else:
-        X = dv.transform(dicts)
+        encoder = features.as_encoder(dv)
+    X = encoder.transform(df)
     return X, dv
 
 
@@ -45,17 +57,42 @@ def preprocess(df: pd.DataFrame, dv: DictVectorizer, fit_dv: bool = False):
     "--dest_path",
     help="Location where the resulting files will be saved"
 )
-def run_data_prep(raw_data_path: str, dest_path: str, dataset: str = "green"):
+@click.option(
+    "--pu_do_encoding",
+    default="string",
+    type=click.Choice(features.PAIR_ENCODINGS),
+    help="How the PU_DO pair is encoded; 'int' and 'hash' save the encoder as dv.pkl"
+)
+@click.option(
+    "--cache_dir",
+    default=None,
+    help="Where preprocessed outputs are cached by content (default: <dest_path>/.cache)"
+)
+@click.option(
+    "--no_cache",
+    is_flag=True,
+    help="Always recompute the outputs"
+)
+def run_data_prep(raw_data_path: str, dest_path: str, pu_do_encoding: str = "string", dataset: str = "green",
+                  cache_dir: str = None, no_cache: bool = False):
+    input_files = [
+        os.path.join(raw_data_path, f"{dataset}_tripdata_2023-{month:02d}.parquet")
+        for month in (1, 2, 3)
+    ]
+    cache = OutputCache(cache_dir or os.path.join(dest_path, ".cache"))
+    key = preprocessing_key(input_files, pu_do_encoding)
+    if not no_cache and cache.restore(key, dest_path, OUTPUTS):
+        print(f"Preprocessing cache hit {key[:12]} ({cache.stats}), outputs restored to {dest_path}")
+        return
+
     # Load parquet files
-    df_train = read_dataframe(
-        os.path.join(raw_data_path, f"{dataset}_tripdata_2023-01.parquet")
-    )
-    df_val = read_dataframe(
-        os.path.join(raw_data_path, f"{dataset}_tripdata_2023-02.parquet")
-    )
-    df_test = read_dataframe(
-        os.path.join(raw_data_path, f"{dataset}_tripdata_2023-03.parquet")
-    )
+    df_train, df_val, df_test = [
+        trips.read_dataframe(
+            filename,
+            categorical=None  # the encoder reads the integer location IDs directly
+        )
+        for filename in input_files
+    ]
 
     # Extract the target
     target = 'duration'
@@ -63,9 +100,8 @@ def run_data_prep(raw_data_path: str, dest_path: str, dataset: str = "green"):
     y_val = df_val[target].values
     y_test = df_test[target].values
 
-    # Fit the DictVectorizer and preprocess data
-    dv = DictVectorizer()
-    X_train, dv = preprocess(df_train, dv, fit_dv=True)
+    # Fit the encoder and preprocess data
+    X_train, dv = preprocess(df_train, fit_dv=True, pu_do_encoding=pu_do_encoding)
     X_val, _ = preprocess(df_val, dv, fit_dv=False)
     X_test, _ = preprocess(df_test, dv, fit_dv=False)
 
@@ -78,6 +114,15 @@ def run_data_prep(raw_data_path: str, dest_path: str, dataset: str = "green"):
     dump_pickle((X_val, y_val), os.path.join(dest_path, "val.pkl"))
     dump_pickle((X_test, y_test), os.path.join(dest_path, "test.pkl"))
 
+    # Memory-mappable copies for HPO workers, in the layout the random forest
+    # fits (CSC) and predicts (CSR) on so sklearn uses the mapped arrays as is
+    arrays.save_dataset(os.path.join(dest_path, "train"), X_train, y_train, format="csc", dtype=np.float32)
+    arrays.save_dataset(os.path.join(dest_path, "val"), X_val, y_val, format="csr", dtype=np.float32)
+    arrays.save_dataset(os.path.join(dest_path, "test"), X_test, y_test, format="csr", dtype=np.float32)
+
+    cache.store(key, dest_path, OUTPUTS)
+    print(f"Preprocessing cache miss {key[:12]} ({cache.stats}), outputs saved to {dest_path}")
+
 
 if __name__ == '__main__':
     run_data_prep()
@@ -1,13 +1,19 @@
 import os
+import sys
 import pickle
 import click
 import mlflow
 
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from mlflow.entities import ViewType
 from mlflow.tracking import MlflowClient
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.arrays import load_split  # noqa: E402
+
 HPO_EXPERIMENT_NAME = "random-forest-hyperopt"
 EXPERIMENT_NAME = "random-forest-best-models"
 RF_PARAMS = ['max_depth', 'n_estimators', 'min_samples_split', 'min_samples_leaf', 'random_state']
@@ -17,15 +23,25 @@ mlflow.set_experiment(EXPERIMENT_NAME)
 mlflow.sklearn.autolog()
 
 
+# Datasets of this process, loaded once instead of once per retrained model
+_data = {}
+
+
 def load_pickle(filename):
     with open(filename, "rb") as f_in:
         return pickle.load(f_in)
 
 
+def load_datasets(data_path):
+    if _data.get("path") != data_path:
+        # Memory-mapped when preprocess_data.py saved the arrays, so workers share them
+        _data.update({name: load_split(data_path, name) for name in ("train", "val", "test")})
+        _data["path"] = data_path
+    return _data["train"], _data["val"], _data["test"]
+
+
 def train_and_log_model(data_path, params):
-    X_train, y_train = load_pickle(os.path.join(data_path, "train.pkl"))
-    X_val, y_val = load_pickle(os.path.join(data_path, "val.pkl"))
-    X_test, y_test = load_pickle(os.path.join(data_path, "test.pkl"))
+    (X_train, y_train), (X_val, y_val), (X_test, y_test) = load_datasets(data_path)
 
     with mlflow.start_run():
         new_params = {}
@@ -54,7 +70,13 @@ def train_and_log_model(data_path, params):
     type=int,
     help="Number of top models that need to be evaluated to decide which one to promote"
 )
-def run_register_model(data_path: str, top_n: int):
+@click.option(
+    "--parallelism",
+    default=1,
+    type=int,
+    help="Number of top models retrained concurrently in separate processes"
+)
+def run_register_model(data_path: str, top_n: int, parallelism: int):
 
     client = MlflowClient()
 
@@ -66,8 +88,15 @@ def run_register_model(data_path: str, top_n: int):
         max_results=top_n,
         order_by=["metrics.RMSE ASC"]
     )
-    for run in runs:
-        train_and_log_model(data_path=data_path, params=run.data.params)
+    params = [run.data.params for run in runs]
+    if parallelism > 1:
+        with ProcessPoolExecutor(
+            max_workers=parallelism, initializer=load_datasets, initargs=(data_path,)
+        ) as pool:
+            list(pool.map(train_and_log_model, [data_path] * len(params), params))
+    else:
+        for run_params in params:
+            train_and_log_model(data_path=data_path, params=run_params)
 
     # Select the model with the lowest test RMSE
     experiment = client.get_experiment_by_name(EXPERIMENT_NAME)
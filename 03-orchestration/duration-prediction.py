@@ -1,77 +1,102 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
 from pathlib import Path
 import pickle
 
 import pandas as pd
 import xgboost as xgb
 
-from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
+from hyperopt import fmin, tpe, hp, STATUS_OK, STATUS_FAIL, Trials
 from hyperopt.pyll import scope
 
 from sklearn.feature_extraction import DictVectorizer
 from sklearn.metrics import mean_squared_error
 
-from prefect import flow, task
-from prefect.task_runners import SequentialTaskRunner
+from prefect import flow, task, get_run_logger
+from prefect.task_runners import ConcurrentTaskRunner
 
 import mlflow
 
-@task
-def read_dataframe(year, month):
-    url = f"https://d37ci6vzurychx.cloudfront.net/trip-data/green_tripdata_{year}-{month:02d}.parquet"
-    df = pd.read_parquet(url)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi import features, trips  # noqa: E402
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+from nyc_taxi.features import PAIR_ENCODINGS, TripFeatureEncoder, as_encoder, to_preprocessor  # noqa: E402
+from nyc_taxi.tracking import BatchLogger  # noqa: E402
+from nyc_taxi.pruning import PRUNERS, make_pruner, pruning_callback  # noqa: E402
+from nyc_taxi.timing import TaskTimer  # noqa: E402
+from nyc_taxi.task_cache import cache_expiration_from_env, cache_summary, make_cache_key_fn  # noqa: E402
 
-    df.lpep_dropoff_datetime = pd.to_datetime(df.lpep_dropoff_datetime)
-    df.lpep_pickup_datetime = pd.to_datetime(df.lpep_pickup_datetime)
+# Wall-clock time of every task call, logged at the end of the flow
+timer = TaskTimer()
 
-    df['duration'] = df.lpep_dropoff_datetime - df.lpep_pickup_datetime
-    df.duration = df.duration.apply(lambda td: td.total_seconds() / 60)
+# Data tasks are cached on their input files, parameters and code;
+# TASK_CACHE_EXPIRATION_HOURS sets how long a cached result stays valid
+CACHE_EXPIRATION = cache_expiration_from_env()
 
-    df = df[(df.duration >= 1) & (df.duration <= 60)]
 
-    categorical = ['PULocationID', 'DOLocationID']
-    df[categorical] = df[categorical].astype(str)
+def trip_url(year, month):
+    return f"https://d37ci6vzurychx.cloudfront.net/trip-data/green_tripdata_{year}-{month:02d}.parquet"
 
-    df['PU_DO'] = df['PULocationID'] + '_' + df['DOLocationID']
+
+@task(
+    cache_key_fn=make_cache_key_fn(paths=lambda p: [trip_url(p['year'], p['month'])], modules=[trips]),
+    cache_expiration=CACHE_EXPIRATION
+)
+@timer
+def read_dataframe(year, month):
+    url = trip_url(year, month)
+    df = prepare_trips(pd.read_parquet(url), categorical=None)
 
     return df
 
-@task
-def create_X(df, dv=None):
+@task(cache_key_fn=make_cache_key_fn(modules=[features]), cache_expiration=CACHE_EXPIRATION)
+@timer
+def create_X(df, dv=None, pu_do_encoding='string'):
     categorical = ['PU_DO']
     numerical = ['trip_distance']
-    dicts = df[categorical + numerical].to_dict(orient='records')
 
     if dv == None:
-        dv = DictVectorizer(sparse=True)
-        X = dv.fit_transform(dicts)
+        encoder = TripFeatureEncoder(categorical=categorical, numerical=numerical, pair_encoding=pu_do_encoding)
+        X = encoder.fit(df).transform(df)
+        dv = to_preprocessor(encoder)
     else:
-        X = dv.transform(dicts)
+        X = as_encoder(dv).transform(df)
 
     return X, dv
 
 @task
-def train_model_hyperopt(X_train, y_train, X_val, y_val, dv):
+@timer
+def train_model_hyperopt(X_train, y_train, X_val, y_val, dv, pruning='none'):
 
     train = xgb.DMatrix(X_train, label=y_train)
     valid = xgb.DMatrix(X_val, label=y_val)
 
+    # Trial runs are logged in the background and flushed when the search ends
+    tracking = BatchLogger()
+
     def _objective(params):
-        with mlflow.start_run():
-            mlflow.set_tag("model", "xgboost")
-            mlflow.log_params(params)
+        with tracking.start_run() as run:
+            run.set_tag("model", "xgboost")
+            run.log_params(params)
+            callback = pruning_callback(pruner)
             booster = xgb.train(
                 params=params,
                 dtrain=train,
                 num_boost_round=100,
                 evals=[(valid, 'validation')],
-                early_stopping_rounds=50
+                early_stopping_rounds=50,
+                callbacks=[callback]
             )
+            if callback.pruned:
+                # Stopped after a few rounds; hyperopt skips the trial and moves on
+                run.set_tag("pruned", "true")
+                run.log_metric("rounds", len(callback.curve))
+                return {'status': STATUS_FAIL, 'pruned': True, 'rounds': len(callback.curve)}
             y_pred = booster.predict(valid)
             rmse = mean_squared_error(y_val, y_pred, squared=False)
-            mlflow.log_metric("rmse", rmse)
+            run.log_metric("rmse", rmse)
 
         return {'loss': rmse, 'status': STATUS_OK}
 
@@ -85,16 +110,19 @@ def train_model_hyperopt(X_train, y_train, X_val, y_val, dv):
         'seed': 42
     }
 
-    best_result = fmin(
-        fn=_objective,
-        space=search_space,
-        algo=tpe.suggest,
-        max_evals=5,
-        trials=Trials()
-    )
+    pruner = make_pruner(pruning)
+    with tracking:
+        best_result = fmin(
+            fn=_objective,
+            space=search_space,
+            algo=tpe.suggest,
+            max_evals=5,
+            trials=Trials()
+        )
     return best_result
 
 @task
+@timer
 def train_model(X_train, y_train, X_val, y_val, dv):
     with mlflow.start_run():
         
@@ -112,6 +140,7 @@ def train_model(X_train, y_train, X_val, y_val, dv):
         }
 
         mlflow.log_params(best_params)
+        mlflow.log_param("pu_do_encoding", getattr(dv, "pair_encoding", "string"))
 
         booster = xgb.train(
             params=best_params,
@@ -132,23 +161,39 @@ def train_model(X_train, y_train, X_val, y_val, dv):
 
         mlflow.xgboost.log_model(booster, artifact_path="models_mlflow")
 
-@flow(task_runner=SequentialTaskRunner())
-def run(year, month):
-    df_train = read_dataframe(year=year, month=month).result()
+@flow(task_runner=ConcurrentTaskRunner())
+def run(year, month, pu_do_encoding='string', pruning='none'):
+    timer.reset()
+
+    # The two months are independent and downloaded concurrently
+    df_train = read_dataframe(year=year, month=month)
 
     next_year = year if month < 12 else year + 1
     next_month = month + 1 if month < 12 else 1
-    df_val = read_dataframe(year=next_year, month=next_month).result()
+    df_val = read_dataframe(year=next_year, month=next_month)
 
-    X_train, dv = create_X(df_train).result()
-    X_val, _ = create_X(df_val, dv).result()
+    # Fitting only waits for the training month, the validation one may still be downloading
+    fit = create_X(df_train, pu_do_encoding=pu_do_encoding)
+    X_train, dv = fit.result()
+    transform = create_X(df_val, dv)
+    X_val, _ = transform.result()
 
     target = 'duration'
-    y_train = df_train[target].values
-    y_val = df_val[target].values
-
-    train_model_hyperopt(X_train, y_train, X_val, y_val, dv).result()
-    train_model(X_train, y_train, X_val, y_val, dv).result()
+    y_train = df_train.result()[target].values
+    y_val = df_val.result()[target].values
+
+    best = train_model_hyperopt(X_train, y_train, X_val, y_val, dv, pruning)
+    # Fixed params, but run after the search so the two do not compete for cores
+    train_model(X_train, y_train, X_val, y_val, dv, wait_for=[best]).result()
+
+    logger = get_run_logger()
+    logger.info("Task cache: %s", cache_summary({
+        "read_dataframe(train)": df_train,
+        "read_dataframe(val)": df_val,
+        "create_X(train)": fit,
+        "create_X(val)": transform,
+    }))
+    logger.info("Task timings:\n%s", timer.summary())
 
 if __name__ == "__main__":
     # Use argparse to take user input
@@ -157,6 +202,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser("Train a model to predict taxi trip duration.")
     parser.add_argument('--year', type=int, required=True, help="Input the year of taxi data to train the model on.")
     parser.add_argument('--month', type=int, required=True, help="Input the month of taxi data to train the model on.")
+    parser.add_argument('--pu-do-encoding', choices=PAIR_ENCODINGS, default='string', help="How the PU_DO pair is encoded.")
+    parser.add_argument('--pruning', choices=PRUNERS, default='none', help="How unpromising hyperopt trials are stopped early.")
     args = parser.parse_args()
 
     models_folder = Path("models")
@@ -165,5 +212,5 @@ if __name__ == "__main__":
     mlflow.set_tracking_uri("http://localhost:5000")
     mlflow.set_experiment("nyc-taxi-experiment")
 
-    run(year=args.year, month=args.month)
+    run(year=args.year, month=args.month, pu_do_encoding=args.pu_do_encoding, pruning=args.pruning)
     
@@ -1,12 +1,13 @@
+import os
+import sys
 import pandas as pd
 
 import datetime as dt
 from datetime import datetime
 from datetime import timedelta
 
-import subprocess
+from pathlib import Path
 
-from sklearn.feature_extraction import DictVectorizer
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
 
@@ -14,16 +15,31 @@ from prefect import flow, task
 
 import pickle
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.features import TripFeatureEncoder  # noqa: E402
+from nyc_taxi.fetch import fetch_to, trip_data_url  # noqa: E402
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+
+# One cleaned partition per month: integer location IDs and duration. The encoder is
+# not stored; each run fits it again on the assembled window
+FEATURE_STORE = "./data/features"
+
 @task
 def read_data(path):
     df = pd.read_parquet(path)
     return df
 
+
+def clean_trips(df, categorical):
+    # The shared duration target and 1-60 minute filter; fhv files leave some location IDs empty
+    df = prepare_trips(df, categorical=None)
+    df[categorical] = df[categorical].fillna(-1).astype('int')
+    return df
+
+
 @task
 def prepare_features(df, categorical, train=True):
-    df['duration'] = df.dropOff_datetime - df.pickup_datetime
-    df['duration'] = df.duration.dt.total_seconds() / 60
-    df = df[(df.duration >= 1) & (df.duration <= 60)].copy()
+    df = clean_trips(df, categorical)
 
     mean_duration = df.duration.mean()
     if train:
@@ -31,14 +47,15 @@ def prepare_features(df, categorical, train=True):
     else:
         print(f"The mean duration of validation is {mean_duration}")
     
-    df[categorical] = df[categorical].fillna(-1).astype('int').astype('str')
+    df[categorical] = df[categorical].astype('str')
     return df
 
 @task
 def train_model(df, categorical):
-    train_dicts = df[categorical].to_dict(orient='records')
-    dv = DictVectorizer()
-    X_train = dv.fit_transform(train_dicts) 
+    # Same columns as DictVectorizer on the location dicts; accepts string or integer IDs
+    encoder = TripFeatureEncoder(categorical=categorical, numerical=[]).fit(df)
+    dv = encoder.to_dict_vectorizer()
+    X_train = encoder.transform(df)
     y_train = df.duration.values
 
     print(f"The shape of X_train is {X_train.shape}")
@@ -53,8 +70,7 @@ def train_model(df, categorical):
 
 @task
 def run_model(df, categorical, dv, lr):
-    val_dicts = df[categorical].to_dict(orient='records')
-    X_val = dv.transform(val_dicts) 
+    X_val = TripFeatureEncoder.from_dict_vectorizer(dv).transform(df)
     y_pred = lr.predict(X_val)
     y_val = df.duration.values
 
@@ -69,22 +85,67 @@ def get_paths(date: dt.datetime=None):
     dates = [date-timedelta(days=60), date-timedelta(days=30)]
     filenames = [f"fhv_tripdata_{date.year}-{date.month:02}.parquet" for date in dates]
     output_dir = "./data"
-    urls = [f"https://d37ci6vzurychx.cloudfront.net/trip-data/{fn}" for fn in filenames]
-    sps = [["wget", "-P", output_dir, url] for url in urls]
-    [subprocess.run(sp, text=True, check=True) for sp in sps]
-    return f"./data/{filenames[0]}", f"./data/{filenames[1]}"
+    # Served from the local mirror when already downloaded, otherwise fetched in parallel ranges
+    return tuple(fetch_to(trip_data_url(fn), output_dir) for fn in filenames)
+
+
+def months_before(date: dt.datetime, k: int):
+    """First day of the calendar month ``k`` months before ``date``'s month."""
+    index = date.year * 12 + date.month - 1 - k
+    return dt.datetime(index // 12, index % 12 + 1, 1)
 
-@flow
-def main(date: dt.datetime=None):
-    train_path, val_path = get_paths(date).result()
 
+def partition_path(month: dt.datetime):
+    return os.path.join(FEATURE_STORE, f"fhv_tripdata_{month.year}-{month.month:02}.parquet")
+
+@task
+def ingest_month(month: dt.datetime, categorical):
+    """Clean one month into the store, unless an earlier run already did."""
+    path = partition_path(month)
+    if os.path.exists(path):
+        print(f"Reusing cleaned {path}")
+        return path
+
+    filename = f"fhv_tripdata_{month.year}-{month.month:02}.parquet"
+    raw_path = f"./data/{filename}"
+    if not os.path.exists(raw_path):
+        fetch_to(trip_data_url(filename), "./data")
+
+    df = clean_trips(pd.read_parquet(raw_path, columns=categorical + ['pickup_datetime', 'dropOff_datetime']), categorical)
+    os.makedirs(FEATURE_STORE, exist_ok=True)
+    # Write next to the partition and rename, so a failed run never leaves half a month behind
+    df[categorical + ['duration']].reset_index(drop=True).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    print(f"Cleaned {raw_path} into {path}")
+    return path
+
+@task
+def assemble_window(paths):
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+@flow
+def main(date: dt.datetime=None, incremental: bool=False, window: int=1):
+    if date is None:
+        date = dt.datetime.today()
     categorical = ['PUlocationID', 'DOlocationID']
-    
-    df_train = read_data(train_path)
-    df_train_processed = prepare_features(df_train, categorical)
 
-    df_val = read_data(val_path)
-    df_val_processed = prepare_features(df_val, categorical, False)
+    if incremental:
+        # Train on the `window` months before the validation month; only months
+        # missing from the store are downloaded and cleaned
+        train_months = [months_before(date, k + 1) for k in range(window, 0, -1)]
+        val_month = months_before(date, 1)
+        train_paths = [ingest_month(month, categorical) for month in train_months]
+        val_path = ingest_month(val_month, categorical)
+        df_train_processed = assemble_window(train_paths)
+        df_val_processed = assemble_window([val_path])
+    else:
+        train_path, val_path = get_paths(date).result()
+
+        df_train = read_data(train_path)
+        df_train_processed = prepare_features(df_train, categorical)
+
+        df_val = read_data(val_path)
+        df_val_processed = prepare_features(df_val, categorical, False)
 
     # train the model
     lr, dv = train_model(df_train_processed, categorical).result()
@@ -1,5 +1,8 @@
-import pandas as pd
+import sys
 import pickle
+from pathlib import Path
+
+import pandas as pd
 
 from sklearn.feature_extraction import DictVectorizer
 from sklearn.linear_model import LinearRegression, Lasso, Ridge
@@ -9,68 +12,86 @@ import mlflow
 
 import xgboost as xgb
 
-from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
+from hyperopt import fmin, tpe, hp, STATUS_OK, STATUS_FAIL, Trials
 from hyperopt.pyll import scope
 
-from prefect import flow, task
-from prefect.task_runners import SequentialTaskRunner
-
-@task
-def read_dataframe(filename):
-    df = pd.read_parquet(filename)
-
-    df.lpep_dropoff_datetime = pd.to_datetime(df.lpep_dropoff_datetime)
-    df.lpep_pickup_datetime = pd.to_datetime(df.lpep_pickup_datetime)
-
-    df['duration'] = df.lpep_dropoff_datetime - df.lpep_pickup_datetime
-    df.duration = df.duration.apply(lambda td: td.total_seconds() / 60)
+from prefect import flow, task, get_run_logger
+from prefect.task_runners import ConcurrentTaskRunner
 
-    df = df[(df.duration >= 1) & (df.duration <= 60)]
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi import features, trips  # noqa: E402
+from nyc_taxi.features import TripFeatureEncoder, as_encoder, to_preprocessor  # noqa: E402
+from nyc_taxi.timing import TaskTimer  # noqa: E402
+from nyc_taxi.task_cache import cache_expiration_from_env, cache_summary, make_cache_key_fn  # noqa: E402
+from nyc_taxi.tracking import BatchLogger  # noqa: E402
+from nyc_taxi.pruning import make_pruner, pruning_callback  # noqa: E402
 
-    categorical = ['PULocationID', 'DOLocationID']
-    df[categorical] = df[categorical].astype(str)
+# Wall-clock time of every task call, logged at the end of the flow
+timer = TaskTimer()
 
-    return df
+# Data tasks are cached on their input files, parameters and code;
+# TASK_CACHE_EXPIRATION_HOURS sets how long a cached result stays valid
+CACHE_EXPIRATION = cache_expiration_from_env()
 
-@task
-def add_features(df_train, df_val):
-    df_train['PU_DO'] = df_train['PULocationID'] + '_' + df_train['DOLocationID']
-    df_val['PU_DO'] = df_val['PULocationID'] + '_' + df_val['DOLocationID']
+@task(cache_key_fn=make_cache_key_fn(modules=[trips]), cache_expiration=CACHE_EXPIRATION)
+@timer
+def read_dataframe(filename):
+    # Location IDs stay integers; the feature tasks encode them without building strings
+    return trips.read_dataframe(filename, categorical=None)
 
+@task(cache_key_fn=make_cache_key_fn(modules=[features]), cache_expiration=CACHE_EXPIRATION)
+@timer
+def fit_features(df_train, pu_do_encoding='string'):
     categorical = ['PU_DO'] #'PULocationID', 'DOLocationID']
     numerical = ['trip_distance']
 
-    dv = DictVectorizer()
+    encoder = TripFeatureEncoder(categorical=categorical, numerical=numerical, pair_encoding=pu_do_encoding)
+    X_train = encoder.fit(df_train).transform(df_train)
 
-    train_dicts = df_train[categorical + numerical].to_dict(orient='records')
-    X_train = dv.fit_transform(train_dicts)
+    # preprocessor.b stays a DictVectorizer for 'string' pairs, otherwise it is the encoder
+    dv = to_preprocessor(encoder)
 
-    val_dicts = df_val[categorical + numerical].to_dict(orient='records')
-    X_val = dv.transform(val_dicts)
+    target = 'duration'
+    y_train = df_train[target].values
+    return X_train, y_train, dv
 
+@task(cache_key_fn=make_cache_key_fn(modules=[features]), cache_expiration=CACHE_EXPIRATION)
+@timer
+def transform_features(df, dv):
+    X = as_encoder(dv).transform(df)
 
     target = 'duration'
-    y_train = df_train[target].values
-    y_val = df_val[target].values
-    return X_train, X_val, y_train, y_val, dv
+    y = df[target].values
+    return X, y
 
 
 @task
-def train_model_search(train, valid, y_val):
+@timer
+def train_model_search(train, valid, y_val, pruning='none'):
+    # Trial runs are logged in the background and flushed when the search ends
+    tracking = BatchLogger()
+
     def _objective(params):
-        with mlflow.start_run():
-            mlflow.set_tag("model", "xgboost")
-            mlflow.log_params(params)
+        with tracking.start_run() as run:
+            run.set_tag("model", "xgboost")
+            run.log_params(params)
+            callback = pruning_callback(pruner)
             booster = xgb.train(
                 params=params,
                 dtrain=train,
                 num_boost_round=100,
                 evals=[(valid, 'validation')],
-                early_stopping_rounds=50
+                early_stopping_rounds=50,
+                callbacks=[callback]
             )
+            if callback.pruned:
+                # Stopped after a few rounds; hyperopt skips the trial and moves on
+                run.set_tag("pruned", "true")
+                run.log_metric("rounds", len(callback.curve))
+                return {'status': STATUS_FAIL, 'pruned': True, 'rounds': len(callback.curve)}
             y_pred = booster.predict(valid)
             rmse = mean_squared_error(y_val, y_pred, squared=False)
-            mlflow.log_metric("rmse", rmse)
+            run.log_metric("rmse", rmse)
 
         return {'loss': rmse, 'status': STATUS_OK}
 
@@ -84,16 +105,19 @@ def train_model_search(train, valid, y_val):
         'seed': 42
     }
 
-    best_result = fmin(
-        fn=_objective,
-        space=search_space,
-        algo=tpe.suggest,
-        max_evals=1,
-        trials=Trials()
-    )
+    pruner = make_pruner(pruning)
+    with tracking:
+        best_result = fmin(
+            fn=_objective,
+            space=search_space,
+            algo=tpe.suggest,
+            max_evals=1,
+            trials=Trials()
+        )
     return best_result
 
 @task
+@timer
 def train_best_model(train, valid, y_val, dv):
     with mlflow.start_run():
         
@@ -108,6 +132,7 @@ def train_best_model(train, valid, y_val, dv):
         }
 
         mlflow.log_params(best_params)
+        mlflow.log_param("pu_do_encoding", getattr(dv, "pair_encoding", "string"))
 
         booster = xgb.train(
             params=best_params,
@@ -127,25 +152,40 @@ def train_best_model(train, valid, y_val, dv):
 
         mlflow.xgboost.log_model(booster, artifact_path="models_mlflow")
 
-@flow(task_runner = SequentialTaskRunner())
+@flow(task_runner = ConcurrentTaskRunner())
 def main_flow(train_path: str = './data/green_tripdata_2021-01.parquet', 
-                val_path: str = './data/green_tripdata_2021-02.parquet'):
+                val_path: str = './data/green_tripdata_2021-02.parquet',
+                pu_do_encoding: str = 'string',
+                pruning: str = 'none'):
     mlflow.set_tracking_uri("sqlite:///mlflow.db")
     mlflow.set_experiment("nyc-taxi-experiment")
-    
-    # Load
-    df_train = read_dataframe(train_path).result()
-    df_val = read_dataframe(val_path).result()
+    timer.reset()
+
+    # Load: the two months are independent and read concurrently
+    df_train = read_dataframe(train_path)
+    df_val = read_dataframe(val_path)
 
-    # Transform
-    X_train, X_val, y_train, y_val, dv = add_features(df_train, df_val).result()
+    # Transform: fitting only waits for the training month, the validation one may still be loading
+    fit = fit_features(df_train, pu_do_encoding)
+    X_train, y_train, dv = fit.result()
+    transform = transform_features(df_val, dv)
+    X_val, y_val = transform.result()
 
     # Training
     train = xgb.DMatrix(X_train, label=y_train)
     valid = xgb.DMatrix(X_val, label=y_val)
-    best = train_model_search(train, valid, y_val).result()
-    # train_best_model(X_train, X_val, y_train, y_val, dv, wait_for=best)
-    train_best_model(train, valid, y_val, dv)
+    best = train_model_search(train, valid, y_val, pruning)
+    # Fixed params, but run after the search so the two do not compete for cores
+    train_best_model(train, valid, y_val, dv, wait_for=[best]).result()
+
+    logger = get_run_logger()
+    logger.info("Task cache: %s", cache_summary({
+        "read_dataframe(train)": df_train,
+        "read_dataframe(val)": df_val,
+        "fit_features": fit,
+        "transform_features": transform,
+    }))
+    logger.info("Task timings:\n%s", timer.summary())
 
 # main_flow()
 
@@ -2,10 +2,11 @@
 # coding: utf-8
 import os
 import sys
-import uuid
 import pickle
+from pathlib import Path
 
 import pandas as pd
+import numpy as np
 
 import mlflow
 
@@ -14,59 +15,134 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
 from sklearn.pipeline import make_pipeline
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.backfill import backfill, partitions  # noqa: E402
+from nyc_taxi.fetch import fetch, trip_data_url  # noqa: E402
+from nyc_taxi.model_cache import load_model as load_cached_model  # noqa: E402
+from nyc_taxi.parquet import iter_trips, read_trips  # noqa: E402
+from nyc_taxi.predictions import PredictionWriter, predictions_table, write_predictions  # noqa: E402
+from nyc_taxi.ride_ids import parse_trip_filename, ride_ids  # noqa: E402
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+from nyc_taxi.features import as_encoder  # noqa: E402
 
-def generate_uuids(n):
-    ride_ids = [str(uuid.uuid4()) for i in range(n)]
-    return ride_ids
 
-def read_dataframe(filename: str):
-    df = pd.read_parquet(filename)
+def read_dataframe(filename: str, filters=None):
+    partition = parse_trip_filename(filename)
+    # Every ride in the file is scored unless filters (e.g. nyc_taxi.parquet.pickup_window) narrow it down
+    df, stats = read_trips(filename, filters=filters)
+    print(f'read {stats}')
 
-    df['duration'] = df.lpep_dropoff_datetime - df.lpep_pickup_datetime
-    df.duration = df.duration.dt.total_seconds() / 60
-    df = df[(df.duration >= 1) & (df.duration <= 60)]
+    df = prepare_trips(df, categorical=None)
 
-    df['ride_id'] = generate_uuids(len(df))
+    # Derived from the file and the row, so rescoring a month gives the same IDs
+    df['ride_id'] = ride_ids(*partition, df.index)
     return df
 
 
-def prepare_dictionaries(df: pd.DataFrame):
-    categorical = ['PULocationID', 'DOLocationID']
-    df[categorical] = df[categorical].astype(str)
-
-    df['PU_DO'] = df['PULocationID'] + '_' + df['DOLocationID']
-
-    categorical = ['PU_DO']
-    numerical = ['trip_distance']
-    dicts = df[categorical + numerical].to_dict(orient='records')
-    return dicts
+def prepare_features(df: pd.DataFrame, dv: DictVectorizer):
+    # Same matrix as dv.transform() on PU_DO/trip_distance dicts, without the dicts;
+    # pipelines trained with an integer or hashed PU_DO carry their encoder instead
+    encoder = as_encoder(dv)
+    return encoder.transform(df)
 
 def load_model(run_id: str):
     logged_model = f's3://mlflow-artifacts-remote433/1/{run_id}/artifacts/model'
-    model = mlflow.pyfunc.load_model(logged_model)
+    # The sklearn flavor gives back the DictVectorizer + regressor pipeline itself;
+    # after the first download it is loaded from the local model cache
+    model = load_cached_model(logged_model, flavor='sklearn')
     return model
 
-def apply_model(input_file, run_id, output_file):
-    print(f'reading the data {input_file}...')
-    df = read_dataframe(input_file)
-    dicts = prepare_dictionaries(df)
+def score_table(df: pd.DataFrame, dv, model, run_id):
+    y_pred = model.predict(prepare_features(df, dv)) if len(df) else np.empty(0)
+    actual_duration = df['duration'].to_numpy()
+
+    # Arrow arrays over the existing buffers; model_version becomes a
+    # dictionary column and file metadata instead of a string per row
+    return predictions_table({
+        'ride_id': df['ride_id'],
+        'PULocationID': df['PULocationID'],
+        'DOLocationID': df['DOLocationID'],
+        'actual_duration': actual_duration,
+        'predicted_duration': y_pred,
+        'diff': actual_duration - y_pred,
+    }, model_version=run_id)
+
+def apply_model(input_file, run_id, output_file, batch_size=None, pipeline=None, filters=None):
+    if pipeline is None:
+        print(f'loading the model with RUN_ID={run_id}...')
+        pipeline = load_model(run_id)
+    if batch_size:
+        return apply_model_streaming(input_file, run_id, output_file, batch_size, pipeline, filters)
 
-    print(f'loading the model with RUN_ID={run_id}...')
-    model = load_model(run_id)
+    print(f'reading the data {input_file}...')
+    df = read_dataframe(input_file, filters)
+    dv, model = pipeline[0], pipeline[-1]
 
     print(f'applying the model to {input_file}...')
-    y_pred = model.predict(dicts)
+    table = score_table(df, dv, model, run_id)
 
     print(f'saving the results to {output_file}...')
-    df_result = pd.DataFrame()
-    df_result['PULocationID'] = df['PULocationID']
-    df_result['DOLocationID'] = df['DOLocationID']
-    df_result['actual_duration'] = df['duration']
-    df_result['predicted_duration'] = y_pred
-    df_result['diff'] = df_result['actual_duration'] - df_result['predicted_duration']
-    df_result['model_version'] = run_id
-
-    df_result.to_parquet(output_file, index=False)
+    write_predictions(table, output_file)
+
+def apply_model_streaming(input_file, run_id, output_file, batch_size=65_536, pipeline=None, filters=None):
+    """Score ``batch_size`` rows at a time, appending each batch to the output file.
+
+    Peak memory depends on the batch size, not on the size of the month.
+    """
+    partition = parse_trip_filename(input_file)
+    if input_file.startswith(('http://', 'https://')):
+        # Stream from the local mirror instead of holding the download in memory
+        input_file = fetch(input_file)
+
+    if pipeline is None:
+        print(f'loading the model with RUN_ID={run_id}...')
+        pipeline = load_model(run_id)
+    dv, model = as_encoder(pipeline[0]), pipeline[-1]
+
+    print(f'streaming {input_file} to {output_file} in batches of {batch_size} rows...')
+    # Small batches are buffered into full row groups (PREDICTIONS_ROW_GROUP_SIZE)
+    with PredictionWriter(output_file) as writer:
+        for df in iter_trips(input_file, batch_size=batch_size, filters=filters):
+            df = prepare_trips(df, categorical=None)
+            # iter_trips indexes rows by their position in the file, as read_dataframe does
+            df['ride_id'] = ride_ids(*partition, df.index)
+            writer.write(score_table(df, dv, model, run_id))
+    print(f'saved {writer.rows} predictions to {output_file}')
+
+def input_url(taxi_type, year, month):
+    return trip_data_url(f"{taxi_type}_tripdata_{year:04d}-{month:02d}.parquet")
+
+_worker = {}
+
+def init_worker(run_id):
+    # Backfill workers load the model once and reuse it for every partition they score
+    _worker['run_id'] = run_id
+    _worker['pipeline'] = load_model(run_id)
+
+def score_partition(partition, output_file):
+    apply_model(input_url(partition.taxi_type, partition.year, partition.month),
+                run_id=_worker['run_id'],
+                output_file=output_file,
+                batch_size=int(os.getenv('SCORE_BATCH_SIZE', 0)),
+                pipeline=_worker['pipeline'])
+
+def run_backfill():
+    taxi_types = sys.argv[2] # e.g. 'green,yellow'
+    start, end = sys.argv[3], sys.argv[4] # 'YYYY-MM', both included
+    run_id = sys.argv[5]  # MLflow run ID
+
+    # Writes output/taxi_type=<type>/year=<yyyy>/month=<mm>/predictions.parquet;
+    # partitions finished by an earlier run are skipped
+    result = backfill(score_partition,
+                      partitions(taxi_types, start, end),
+                      root='output',
+                      workers=int(os.getenv('BACKFILL_WORKERS', os.cpu_count())),
+                      retries=int(os.getenv('BACKFILL_RETRIES', 2)),
+                      initializer=init_worker,
+                      initargs=(run_id,))
+    print(result)
+    if result.failed:
+        sys.exit(1)
 
 def run():
     taxi_type = sys.argv[1] # 'green' or 'yellow'
@@ -74,15 +150,22 @@ def run():
     month = int(sys.argv[3]) # 1-12
     run_id = sys.argv[4]  # MLflow run ID
 
-    input_file = f"https://d37ci6vzurychx.cloudfront.net/trip-data/{taxi_type}_tripdata_{year:04d}-{month:02d}.parquet"
+    input_file = input_url(taxi_type, year, month)
     output_file = f"output/{taxi_type}/{year:04d}-{month:02d}.parquet"
 
     # RUN_ID = os.getenv('RUN_ID', 'ecfa50f261e64914817112759fbbfc48')
+    # SCORE_BATCH_SIZE=<rows> scores the month in bounded-memory batches
+    batch_size = int(os.getenv('SCORE_BATCH_SIZE', 0))
 
     apply_model(input_file, 
                 run_id=run_id, 
-                output_file=output_file)
+                output_file=output_file,
+                batch_size=batch_size)
 
 # get_ipython().system('ls output/green')
 if __name__ == "__main__":
-    run()
+    # python score.py backfill green,yellow 2021-01 2021-12 <RUN_ID>
+    if sys.argv[1] == 'backfill':
+        run_backfill()
+    else:
+        run()
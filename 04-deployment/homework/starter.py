@@ -1,9 +1,15 @@
 #!/usr/bin/env python
 # coding: utf-8
+import sys
 import argparse
 import boto3
 import pickle
 import pandas as pd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.features import TripFeatureEncoder  # noqa: E402
+from nyc_taxi.predictions import COMPRESSIONS, predictions_table, write_predictions  # noqa: E402
 
 categorical = ['PUlocationID', 'DOlocationID']
 s3 = boto3.client('s3')
@@ -20,29 +26,25 @@ def read_data(filename):
     
     return df
 
-def apply_model(year, month):
+def apply_model(year, month, compression=None, row_group_size=None):
     with open('model.bin', 'rb') as f_in:
         dv, lr = pickle.load(f_in)
 
     df = read_data(f'https://d37ci6vzurychx.cloudfront.net/trip-data/fhv_tripdata_{year:04d}-{month:02d}.parquet')
 
-    dicts = df[categorical].to_dict(orient='records')
-    X_val = dv.transform(dicts)
+    X_val = TripFeatureEncoder.from_dict_vectorizer(dv).transform(df)
     y_pred = lr.predict(X_val)
 
     print(y_pred.mean())
 
     df['ride_id'] = f'{year:04d}/{month:02d}_'+df.index.astype('str')
-    df_result = pd.DataFrame()
-    df_result['ride_id'] = df['ride_id']
-    df_result['predicted_duration'] = y_pred
+    # Arrow arrays over the existing buffers, written with a real codec
+    table = predictions_table({
+        'ride_id': df['ride_id'],
+        'predicted_duration': y_pred,
+    })
     output_file = f'results_{year:04d}_{month:02d}.parquet'
-    df_result.to_parquet(
-        output_file,
-        engine='pyarrow',
-        compression=None,
-        index=False
-    )
+    write_predictions(table, output_file, compression=compression, row_group_size=row_group_size)
  
     key = f'predictions/{year:04d}/{month:02d}/{output_file}'
     s3.upload_file(
@@ -65,6 +67,18 @@ if __name__ == '__main__':
         type=int,
         help='Month of the data to be processed'
     )
+    parser.add_argument(
+        '--compression',
+        default=None,
+        choices=COMPRESSIONS,
+        help='Parquet codec of the output (default: PREDICTIONS_COMPRESSION or zstd)'
+    )
+    parser.add_argument(
+        '--row-group-size',
+        default=None,
+        type=int,
+        help='Rows per Parquet row group of the output'
+    )
     args = parser.parse_args()
-    apply_model(args.year, args.month)
+    apply_model(args.year, args.month, args.compression, args.row_group_size)
 
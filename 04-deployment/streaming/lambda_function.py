@@ -1,9 +1,12 @@
 import os
+import sys
 import json
 import boto3
 import base64
+from pathlib import Path
 
-import mlflow
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.model_cache import load_model  # noqa: E402
 
 
 AWS_REGION = os.getenv('AWS_REGION') or os.getenv('AWS_DEFAULT_REGION') or 'us-west-1'
@@ -16,7 +19,13 @@ PREDICTIONS_STREAM_NAME = os.getenv('PREDICTIONS_STREAM_NAME', 'ride_predictions
 RUN_ID = os.getenv('RUN_ID')
 logged_model = f's3://mlflow-artifacts-remote433/1/{RUN_ID}/artifacts/model'
 # logged_model = f'runs:/{RUN_ID}/model'
-model = mlflow.pyfunc.load_model(logged_model)
+# Downloaded once into MODEL_CACHE_DIR; later cold starts load from local disk
+MODEL_BUNDLE = os.getenv('MODEL_BUNDLE')
+if MODEL_BUNDLE:
+    # .npz from `python -m nyc_taxi.bundle`: numpy only (boto3 for s3://), no mlflow import on cold start
+    model = load_model(MODEL_BUNDLE, flavor='bundle')
+else:
+    model = load_model(logged_model)
 
 TEST_RUN = os.getenv('TEST_RUN', 'False') == 'True'
 
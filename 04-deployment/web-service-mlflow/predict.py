@@ -1,15 +1,21 @@
 import os
+import sys
 import pickle
+from pathlib import Path
 
-import mlflow
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.model_cache import load_model  # noqa: E402
+from nyc_taxi.serving import NDJSON, BatchError, is_ndjson, parse_rides, predict_batch, to_ndjson  # noqa: E402
 
 
 RUN_ID = os.getenv('RUN_ID')
 
 logged_model = f's3://mlflow-artifacts-remote433/1/{RUN_ID}/artifacts/model'
 # logged_model = f'runs:/{RUN_ID}/model'
-model = mlflow.pyfunc.load_model(logged_model)
+# Downloaded once into MODEL_CACHE_DIR; later starts load from local disk
+model = load_model(logged_model)
 
 
 def prepare_features(ride):
@@ -24,6 +30,10 @@ def predict(features):
     return float(preds[0])
 
 
+def predict_many(features):
+    return model.predict(features)
+
+
 app = Flask('duration-prediction')
 
 
@@ -42,5 +52,20 @@ def predict_endpoint():
     return jsonify(result)
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_endpoint():
+    # a JSON array of rides or one ride per line (application/x-ndjson); one predict call for all
+    try:
+        rides = parse_rides(request.get_data(), request.content_type)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    results = predict_batch(rides, prepare_features, predict_many)
+
+    if is_ndjson(request.content_type):
+        return Response(to_ndjson({**r, 'model_version': RUN_ID} for r in results), mimetype=NDJSON)
+    return jsonify({'predictions': results, 'model_version': RUN_ID})
+
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=9696)
@@ -1,5 +1,11 @@
+import sys
 import pickle
-from flask import Flask, request, jsonify
+from pathlib import Path
+
+from flask import Flask, Response, request, jsonify
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.serving import NDJSON, BatchError, is_ndjson, parse_rides, predict_batch, to_ndjson  # noqa: E402
 
 with open('lin_reg.bin', 'rb') as f_in:
     (dv, model) = pickle.load(f_in)
@@ -25,10 +31,24 @@ def predict_endpoint():
     prediction = predict(features)
 
     result = {
-        "duration": float(prediction),
+        "duration": float(prediction[0]),
     }
 
     return jsonify(result)
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_endpoint():
+    # a JSON array of rides or one ride per line (application/x-ndjson); one transform + predict for all
+    try:
+        rides = parse_rides(request.get_data(), request.content_type)
+    except BatchError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    results = predict_batch(rides, prepare_features, predict)
+
+    if is_ndjson(request.content_type):
+        return Response(to_ndjson(results), mimetype=NDJSON)
+    return jsonify({"predictions": results})
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=9696)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=9696)
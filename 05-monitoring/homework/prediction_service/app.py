@@ -1,21 +1,21 @@
 import logging
 import os
-import pickle
+import sys
 import uuid
+from pathlib import Path
 
 from flask import Flask, jsonify, request
 from pymongo import MongoClient
 
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from nyc_taxi.reload import watch_model  # noqa: E402
+
 
 MONGO_ADDRESS = os.getenv("MONGO_ADDRESS", "mongodb://localhost:27017/")
 MONGO_DATABASE = os.getenv("MONGO_DATABASE", "ride_prediction")
 LOGGED_MODEL = os.getenv("MODEL_FILE", "lin_reg.bin")
 MODEL_VERSION = os.getenv("MODEL_VERSION", "1")
 
-with open(LOGGED_MODEL, 'rb') as f_in:
-    dv, model = pickle.load(f_in)
-
-
 mongo_client = MongoClient(MONGO_ADDRESS)
 mongo_db = mongo_client[MONGO_DATABASE]
 mongo_collection = mongo_db.get_collection("data")
@@ -25,7 +25,7 @@ app = Flask("Ride-Prediction-Service")
 logging.basicConfig(level=logging.INFO)
 
 
-def prepare_features(ride):
+def prepare_features(ride, dv):
     """Function to prepare features before making prediction"""
 
     record = ride.copy()
@@ -36,6 +36,27 @@ def prepare_features(ride):
     return features, record
 
 
+SAMPLE_RIDE = {"PULocationID": 10, "DOLocationID": 50, "trip_distance": 40}
+
+
+def warm_up(dv_model):
+    dv, model = dv_model
+    model.predict(prepare_features(SAMPLE_RIDE, dv)[0])
+
+
+# MODEL_VERSION labels the model loaded at start; a replaced MODEL_FILE is reloaded while serving
+model_watcher = watch_model(LOGGED_MODEL, label=MODEL_VERSION, warm=warm_up, name="duration model")
+
+
+def predict(ride):
+    """Prediction, prepared record and the version of the model that made it"""
+
+    loaded = model_watcher.current
+    dv, model = loaded.model
+    features, record = prepare_features(ride, dv)
+    return model.predict(features), record, loaded.label
+
+
 def save_db(record, pred_result):
     """Save data to mongo db collection"""
 
@@ -67,9 +88,8 @@ def predict_duration():
     """Function to predict duration"""
 
     ride = request.get_json()
-    features, record = prepare_features(ride)
+    prediction, record, model_version = predict(ride)
 
-    prediction = model.predict(features)
     ride_id = str(uuid.uuid4())
     pred_data = {
             "ride_id": ride_id,
@@ -77,7 +97,7 @@ def predict_duration():
             "trip_distance": record["trip_distance"],
             "status": 200,
             "duration": prediction[0],
-            "model_version": MODEL_VERSION
+            "model_version": model_version
             }
 
     save_db(record, prediction)
@@ -0,0 +1,93 @@
+"""Asyncio (ASGI) serving mode of app.py, with the same routes and payloads.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 9696
+
+Needs ``starlette``, ``uvicorn`` and ``motor`` on top of the Pipfile.
+Predictions run on a bounded thread pool (``PREDICT_THREADS``,
+``PREDICT_MAX_PENDING``) instead of the event loop, and the Mongo insert
+goes through motor after the response is sent.
+"""
+import sys
+import uuid
+import logging
+from pathlib import Path
+from contextlib import asynccontextmanager
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.routing import Route
+from starlette.responses import HTMLResponse, JSONResponse
+from starlette.background import BackgroundTask
+from starlette.applications import Starlette
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from nyc_taxi.aio import BoundedExecutor  # noqa: E402
+
+sys.path.append(str(Path(__file__).resolve().parent))
+# the model and feature preparation are shared with the Flask app
+from app import MONGO_ADDRESS, MONGO_DATABASE, get_info, predict as predict_ride  # noqa: E402
+
+logger = logging.getLogger(__name__)
+executor = BoundedExecutor()
+clients = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # the motor client is bound to the running event loop
+    mongo_client = AsyncIOMotorClient(MONGO_ADDRESS)
+    clients['collection'] = mongo_client[MONGO_DATABASE].get_collection("data")
+    yield
+    mongo_client.close()
+
+
+def predict(ride):
+    prediction, record, model_version = predict_ride(ride)
+    return float(prediction[0]), record, model_version
+
+
+async def save_db(record, prediction):
+    """Save data to mongo db collection"""
+
+    rec = record.copy()
+    rec["prediction"] = prediction
+    try:
+        await clients['collection'].insert_one(rec)
+    except Exception as e:
+        logger.warning('saving the prediction failed: %r', e)
+
+
+async def info(request):
+    return HTMLResponse(get_info())
+
+
+async def predict_duration(request):
+    """Function to predict duration"""
+
+    ride = await request.json()
+    prediction, record, model_version = await executor.run(predict, ride)
+
+    ride_id = str(uuid.uuid4())
+    pred_data = {
+            "ride_id": ride_id,
+            "PU_DO": record["PU_DO"],
+            "trip_distance": record["trip_distance"],
+            "status": 200,
+            "duration": prediction,
+            "model_version": model_version
+            }
+
+    result = {
+        "statusCode": 200,
+        "data" : pred_data
+        }
+
+    return JSONResponse(result, background=BackgroundTask(save_db, record, prediction))
+
+
+app = Starlette(
+    routes=[
+        Route("/", info, methods=["GET"]),
+        Route("/predict-duration", predict_duration, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
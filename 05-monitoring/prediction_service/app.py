@@ -1,28 +1,83 @@
 import os
-import pickle
+import sys
+from pathlib import Path
 
 import requests
+import prometheus_client
+from prometheus_client import multiprocess
 from flask import Flask
 from flask import request
 from flask import jsonify
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
 from pymongo import MongoClient
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.reload import watch_model  # noqa: E402
+from nyc_taxi.microbatch import MicroBatcher  # noqa: E402
+
 
 MODEL_FILE = os.getenv('MODEL_FILE', 'lin_reg.bin')
 
 EVIDENTLY_SERVICE_ADDRESS = os.getenv('EVIDENTLY_SERVICE', 'http://127.0.0.1:5000')
 MONGODB_ADDRESS = os.getenv("MONGODB_ADDRESS", "mongodb://127.0.0.1:27017")
 
-with open(MODEL_FILE, 'rb') as f_in:
-    dv, model = pickle.load(f_in)
+SAMPLE_RIDE = {'PULocationID': 10, 'DOLocationID': 50, 'trip_distance': 40, 'PU_DO': '10_50'}
+
+
+def warm_up(dv_model):
+    dv, model = dv_model
+    model.predict(dv.transform([SAMPLE_RIDE]))
+
+
+# A new MODEL_FILE (or registry version) is loaded and swapped in while serving; MODEL_RELOAD_INTERVAL tunes it
+model_watcher = watch_model(MODEL_FILE, warm=warm_up, name='duration model')
+
+
+def metrics_registry():
+    # Under gunicorn (nyc_taxi.gunicorn_conf) every worker writes its samples to PROMETHEUS_MULTIPROC_DIR;
+    # a scrape adds up all of them instead of reporting whichever worker answered
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return prometheus_client.REGISTRY
+    registry = prometheus_client.CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
 
 
 app = Flask('duration')
-mongo_client = MongoClient(MONGODB_ADDRESS)
+# Add prometheus wsgi middleware to route /metrics requests
+app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {"/metrics": prometheus_client.make_wsgi_app(metrics_registry())})
+# connect on first use, so gunicorn --preload can import this before forking
+mongo_client = MongoClient(MONGODB_ADDRESS, connect=False)
 db = mongo_client.get_database("prediction_service")
 collection = db.get_collection("data")
 
+BATCH_SIZE = prometheus_client.Histogram(
+    'prediction_batch_size', 'Rides scored per model call',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+QUEUE_WAIT = prometheus_client.Histogram(
+    'prediction_queue_wait_seconds', 'Time a ride waits for its batch to be scored',
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+
+def observe_batch(size, queue_waits):
+    BATCH_SIZE.observe(size)
+    for wait in queue_waits:
+        QUEUE_WAIT.observe(wait)
+
+
+def predict_many(records):
+    # one snapshot per batch, so a swap never splits a batch between two models
+    dv, model = model_watcher.current.model
+    X = dv.transform(records)
+    return model.predict(X)
+
+
+# Concurrent requests share one transform + predict call; PREDICT_MAX_WAIT_MS and PREDICT_MAX_BATCH tune it
+batcher = MicroBatcher(predict_many, on_batch=observe_batch)
+
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -30,15 +85,14 @@ def predict():
 
     record['PU_DO'] = '%s_%s' % (record['PULocationID'], record['DOLocationID'])
 
-    X = dv.transform([record])
-    y_pred = model.predict(X)
+    y_pred = float(batcher.predict(record))
 
     result = {
-        'duration': float(y_pred),
+        'duration': y_pred,
     }
 
-    save_to_db(record, float(y_pred))
-    send_to_evidently_service(record, float(y_pred))
+    save_to_db(record, y_pred)
+    send_to_evidently_service(record, y_pred)
     return jsonify(result)
 
 
@@ -0,0 +1,99 @@
+"""Asyncio (ASGI) serving mode of app.py, with the same routes and payloads.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 9696
+
+app.py runs each request on a server thread and blocks it on the model,
+the Mongo insert and the Evidently update in turn. Here one event loop
+serves every connection:
+
+* rides go through app.py's micro-batcher from a bounded thread pool
+  (``PREDICT_THREADS``, ``PREDICT_MAX_PENDING``), never on the loop;
+* the Mongo insert (motor) and the Evidently update (httpx) are sent
+  concurrently after the response, so slow monitoring no longer adds
+  to prediction latency.
+
+``python benchmarks/bench_asgi.py`` compares the two modes on one process.
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from contextlib import asynccontextmanager
+
+import httpx
+import prometheus_client
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.routing import Mount, Route
+from starlette.responses import JSONResponse
+from starlette.background import BackgroundTask
+from starlette.applications import Starlette
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.aio import BoundedExecutor  # noqa: E402
+
+sys.path.append(str(Path(__file__).resolve().parent))
+# the model, micro-batcher and metrics are shared with the Flask app
+from app import EVIDENTLY_SERVICE_ADDRESS, MONGODB_ADDRESS, batcher, metrics_registry  # noqa: E402
+
+logger = logging.getLogger(__name__)
+# the threads only wait for the micro-batcher, so by default there are enough for a full batch
+executor = BoundedExecutor(workers=int(os.getenv('PREDICT_THREADS', batcher.max_batch)))
+clients = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # motor and httpx clients are bound to the running event loop
+    mongo_client = AsyncIOMotorClient(MONGODB_ADDRESS)
+    clients['collection'] = mongo_client.get_database("prediction_service").get_collection("data")
+    async with httpx.AsyncClient(base_url=EVIDENTLY_SERVICE_ADDRESS, timeout=10) as http_client:
+        clients['evidently'] = http_client
+        yield
+    mongo_client.close()
+
+
+async def predict(request):
+    record = await request.json()
+
+    record['PU_DO'] = '%s_%s' % (record['PULocationID'], record['DOLocationID'])
+
+    y_pred = float(await executor.run(batcher.predict, record))
+
+    result = {
+        'duration': y_pred,
+    }
+
+    return JSONResponse(result, background=BackgroundTask(monitor, record, y_pred))
+
+
+async def monitor(record, prediction):
+    results = await asyncio.gather(
+        save_to_db(record, prediction),
+        send_to_evidently_service(record, prediction),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning('monitoring write failed: %r', result)
+
+
+async def save_to_db(record, prediction):
+    rec = record.copy()
+    rec['prediction'] = prediction
+    await clients['collection'].insert_one(rec)
+
+
+async def send_to_evidently_service(record, prediction):
+    rec = record.copy()
+    rec['prediction'] = prediction
+    await clients['evidently'].post("/iterate/taxi", json=[rec])
+
+
+app = Starlette(
+    routes=[
+        Route('/predict', predict, methods=['POST']),
+        Mount('/metrics', prometheus_client.make_asgi_app(metrics_registry())),
+    ],
+    lifespan=lifespan,
+)
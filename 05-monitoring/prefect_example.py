@@ -1,12 +1,13 @@
 import json
 import os
+import sys
 import pickle
+from pathlib import Path
 
 import pandas
 from prefect import flow, task
 
 from pymongo import MongoClient
-import pyarrow.parquet as pq
 
 from evidently import ColumnMapping
 
@@ -16,6 +17,10 @@ from evidently.dashboard.tabs import DataDriftTab,RegressionPerformanceTab
 from evidently.model_profile import Profile
 from evidently.model_profile.sections import DataDriftProfileSection, RegressionPerformanceProfileSection
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.parquet import read_trips  # noqa: E402
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+
 
 @task
 def upload_target(filename):
@@ -33,14 +38,13 @@ def load_reference_data(filename):
     MODEL_FILE = os.getenv('MODEL_FILE', './prediction_service/lin_reg.bin')
     with open(MODEL_FILE, 'rb') as f_in:
         dv, model = pickle.load(f_in)
-    reference_data = pq.read_table(filename).to_pandas()
+    reference_data, stats = read_trips(filename)
+    print(f'read {filename}: {stats}')
     # Create features
     reference_data['PU_DO'] = reference_data['PULocationID'].astype(str) + "_" + reference_data['DOLocationID'].astype(str)
 
     # add target column
-    reference_data['target'] = reference_data.lpep_dropoff_datetime - reference_data.lpep_pickup_datetime
-    reference_data.target = reference_data.target.apply(lambda td: td.total_seconds() / 60)
-    reference_data = reference_data[(reference_data.target >= 1) & (reference_data.target <= 60)]
+    reference_data = prepare_trips(reference_data, categorical=None, target='target')
     features = ['PU_DO', 'PULocationID', 'DOLocationID', 'trip_distance']
     x_pred = dv.transform(reference_data[features].to_dict(orient='records'))
     reference_data['prediction'] = model.predict(x_pred)
@@ -57,7 +61,7 @@ def fetch_data():
 
 @task
 def run_evidently(ref_data, data):
-    ref_data.drop('ehail_fee', axis=1, inplace=True)
+    ref_data.drop('ehail_fee', axis=1, inplace=True, errors='ignore')  # not read for the reference data
     data.drop('ehail_fee', axis=1, inplace=True)  # drop empty column (until Evidently will work with it properly)
     profile = Profile(sections=[DataDriftProfileSection(), RegressionPerformanceProfileSection()])
     mapping = ColumnMapping(prediction="prediction", numerical_features=['trip_distance'],
@@ -1,16 +1,16 @@
+import sys
+from pathlib import Path
+
 from tqdm import tqdm
-import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.fetch import Mirror, trip_data_url  # noqa: E402
 
 files = [("green_tripdata_2022-01.parquet", "."), ("green_tripdata_2021-01.parquet", "./evidently_service/datasets")]
+mirror = Mirror()
 
 print(f"Download files:")
 for file, path in files:
-    url = f"https://d37ci6vzurychx.cloudfront.net/trip-data/{file}"
-    resp = requests.get(url, stream=True)
-    save_path = f"{path}/{file}"
-    with open(save_path, "wb") as handle:
-        for data in tqdm(resp.iter_content(),
-                         desc=f"{file}",
-                         postfix=f"save to {save_path}",
-                         total=int(resp.headers["Content-Length"])):
-            handle.write(data)
+    # Files already in the local mirror are copied without touching the network
+    with tqdm(desc=f"{file}", postfix=f"save to {path}/{file}", unit="B", unit_scale=True) as progress:
+        mirror.fetch_to(trip_data_url(file), path, progress=progress.update)
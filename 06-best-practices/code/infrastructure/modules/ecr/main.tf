@@ -24,7 +24,7 @@ resource "null_resource" "ecr_image" {
       docker buildx create --use --name multiplatform-builder 2>/dev/null || docker buildx use multiplatform-builder
       # Build a single-arch linux/amd64 image (Lambda requires x86_64/amd64)
       # --load loads the image into local Docker, then we push it
-      docker buildx build --platform linux/amd64 -t ${aws_ecr_repository.repo.repository_url}:${var.ecr_image_tag} --load .
+      docker buildx build --platform linux/amd64 -t ${aws_ecr_repository.repo.repository_url}:${var.ecr_image_tag} -f Dockerfile --load ../..
       docker push ${aws_ecr_repository.repo.repository_url}:${var.ecr_image_tag}
     EOF
   }
@@ -20,7 +20,7 @@ if [ "${LOCAL_IMAGE_NAME}" == "" ]; then
     LOCAL_TAG=$(date +"%Y-%m-%d_%H-%M")
     export LOCAL_IMAGE_NAME="stream-model-duration:${LOCAL_TAG}"
     echo "LOCAL_IMAGE_NAME is not set, building the image with the default name: ${LOCAL_IMAGE_NAME}"
-    docker build -t ${LOCAL_IMAGE_NAME} ..
+    docker build -t ${LOCAL_IMAGE_NAME} -f ../Dockerfile ../../..
 else
     echo "LOCAL_IMAGE_NAME is set to: ${LOCAL_IMAGE_NAME}"
     echo "No need to build the image"
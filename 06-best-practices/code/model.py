@@ -1,9 +1,14 @@
 import os
+import sys
 import json
 import base64
+from pathlib import Path
 
 import boto3
-import mlflow
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+# pylint: disable-next=wrong-import-position,import-error
+from nyc_taxi.model_cache import load_model as load_cached_model
 
 AWS_REGION = os.getenv('AWS_REGION') or os.getenv('AWS_DEFAULT_REGION') or 'us-west-1'
 os.environ.setdefault('AWS_REGION', AWS_REGION)
@@ -23,8 +28,23 @@ def get_model_location(run_id: str):
 
 
 def load_model(run_id: str):
-    model_path = get_model_location(run_id)
-    return mlflow.pyfunc.load_model(model_path)
+    bundle_location = os.getenv('MODEL_BUNDLE')
+    if bundle_location is not None:
+        # .npz from `python -m nyc_taxi.bundle`: numpy only, no mlflow import on cold start
+        return load_cached_model(bundle_location, flavor='bundle')
+
+    # Remote artifacts are downloaded once into MODEL_CACHE_DIR; local paths pass through.
+    # The sklearn flavor gives back the pipeline itself, so its encoder can be inspected
+    return load_cached_model(get_model_location(run_id), flavor='sklearn')
+
+
+def get_pu_do_encoding(model):
+    # Bundles record the encoder's setting; a logged pipeline's is on its first step,
+    # where a DictVectorizer (no pair_encoding) takes the '130_205' string
+    encoding = getattr(model, 'pair_encoding', None)
+    if encoding is None and hasattr(model, 'steps'):
+        encoding = getattr(model.steps[0][1], 'pair_encoding', None)
+    return encoding or 'string'
 
 
 def base64_decode(encoded_data: str):
@@ -35,17 +55,25 @@ def base64_decode(encoded_data: str):
 class ModelService:
     def __init__(
         self,
-        model: mlflow.pyfunc.PyFuncModel,
+        model,
         model_version: str = None,
         callbacks=None,
+        pu_do_encoding: str = 'string',
     ):
         self.model = model
         self.model_version = model_version
         self.callbacks = callbacks or []
+        self.pu_do_encoding = pu_do_encoding
 
     def prepare_features(self, ride):
         features = {}
-        features["PU_DO"] = f"{ride['PULocationID']}_{ride['DOLocationID']}"
+        if self.pu_do_encoding == 'string':
+            features["PU_DO"] = f"{ride['PULocationID']}_{ride['DOLocationID']}"
+        else:
+            # 'int' and 'hash' pipelines take the pu * 1000 + do key, no string needed
+            features["PU_DO"] = int(ride['PULocationID']) * 1000 + int(
+                ride['DOLocationID']
+            )
         features["trip_distance"] = ride["trip_distance"]
         return features
 
@@ -117,5 +145,10 @@ def init(predictions_stream_name: str, run_id: str, test_run: bool):
             KinesisCallback(kinesis_client, predictions_stream_name).put_record
         )
 
-    model_service = ModelService(model, model_version=run_id, callbacks=callbacks)
+    model_service = ModelService(
+        model,
+        model_version=run_id,
+        callbacks=callbacks,
+        pu_do_encoding=get_pu_do_encoding(model),
+    )
     return model_service
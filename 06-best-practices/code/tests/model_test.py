@@ -1,5 +1,7 @@
 import pathlib
 
+import pytest
+
 import model
 
 
@@ -43,6 +45,24 @@ def test_prepare_features():
     assert actual_features == expected_features
 
 
+def test_prepare_features_int_encoding():
+    model_service = model.ModelService(None, pu_do_encoding='int')
+
+    ride = {
+        "PULocationID": 130,
+        "DOLocationID": 205,
+        "trip_distance": 3.66,
+    }
+
+    actual_features = model_service.prepare_features(ride)
+
+    expected_features = {
+        "PU_DO": 130205,
+        "trip_distance": 3.66,
+    }
+    assert actual_features == expected_features
+
+
 class ModelMock:
     def __init__(self, value):
         self.value = value
@@ -91,3 +111,38 @@ def test_lambda_handler():
         ]
     }
     assert actual_prediction_events == expected_prediction_events
+
+
+def test_logged_int_pipeline_gets_integer_keys(tmp_path, monkeypatch):
+    # pylint: disable=import-outside-toplevel,import-error
+    import mlflow.sklearn
+    from sklearn.pipeline import make_pipeline
+    from nyc_taxi.features import TripFeatureEncoder
+    from sklearn.linear_model import LinearRegression
+
+    rides = [
+        {"PU_DO": "130_205", "trip_distance": 3.66},
+        {"PU_DO": "10_50", "trip_distance": 1.0},
+        {"PU_DO": "130_205", "trip_distance": 8.0},
+    ]
+    pipeline = make_pipeline(
+        TripFeatureEncoder(pair_encoding='int'), LinearRegression()
+    ).fit(rides, [12.0, 5.0, 25.0])
+    mlflow.sklearn.save_model(
+        pipeline,
+        str(tmp_path / 'model'),
+        serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE,
+    )
+    monkeypatch.setenv('MODEL_LOCATION', str(tmp_path / 'model'))
+
+    model_service = model.init('ride_predictions', '123', test_run=True)
+
+    assert model_service.pu_do_encoding == 'int'
+    event = {"Records": [{"kinesis": {"data": read_text_file('data.b64')}}]}
+    features = model_service.prepare_features(
+        model.base64_decode(read_text_file('data.b64'))['ride']
+    )
+    assert features == {"PU_DO": 130205, "trip_distance": 3.66}
+    actual_prediction_events = model_service.lambda_handler(event, None)
+    prediction = actual_prediction_events['prediction_events'][0]['prediction']
+    assert prediction['ride_duration'] == pytest.approx(pipeline.predict(rides[:1])[0])
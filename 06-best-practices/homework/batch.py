@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import io
 import sys
 import pickle
-import requests
 import pandas as pd
 import os
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from nyc_taxi.backfill import backfill, partitions  # noqa: E402
+from nyc_taxi.fetch import fetch  # noqa: E402
+from nyc_taxi.parquet import read_trips, storage_options_from_env  # noqa: E402
 
 def get_input_path(year, month):
     default_input_pattern = 'https://d37ci6vzurychx.cloudfront.net/trip-data/fhv_tripdata_{year:04d}-{month:02d}.parquet'
@@ -20,22 +24,12 @@ def get_output_path(year, month):
     return output_pattern.format(year=year, month=month)
 
 
-def read_data(filename):
-    # Read parquet didn't work with the URL, so we use requests to get the content and then read the parquet
-    s3_endpoint_url = os.getenv('S3_ENDPOINT_URL')
-    if filename.startswith(("http://", "https://")):
-        r = requests.get(filename, timeout=300)
-        r.raise_for_status()
-        df = pd.read_parquet(io.BytesIO(r.content))
-    elif filename.startswith('s3://') and s3_endpoint_url:
-        options = {
-            'client_kwargs': {
-                'endpoint_url': s3_endpoint_url
-            }
-        }
-        df = pd.read_parquet(filename, storage_options=options)
-    else:
-        df = pd.read_parquet(filename)
+def read_data(filename, columns=None):
+    # http(s) inputs go through the local mirror, so reruns read the cached copy;
+    # only the requested columns are read, and s3 (incl. S3_ENDPOINT_URL) is handled by read_trips
+    path = fetch(filename) if filename.startswith(('http://', 'https://')) else filename
+    df, stats = read_trips(path, columns=columns, storage_options=storage_options_from_env())
+    print(f'read {filename}: {stats}')
     return df
 
 def save_data(df, filename):
@@ -59,7 +53,11 @@ def prepare_data(df, categorical):
     df[categorical] = df[categorical].fillna(-1).astype('int').astype('str')
     return df
 
-def main(year, month):
+def load_model():
+    with open('model.bin', 'rb') as f_in:
+        return pickle.load(f_in)
+
+def main(year, month, output_file=None, model=None):
     # Input and output files didn't end up working, so we use CloudFront URL and local file name
     # input_file = f'https://raw.githubusercontent.com/alexeygrigorev/datasets/master/nyc-tlc/fhv/fhv_tripdata_{year:04d}-{month:02d}.parquet'
     # output_file = f's3://nyc-duration-prediction-alexey/taxi_type=fhv/year={year:04d}/month={month:02d}/predictions.parquet'
@@ -69,14 +67,13 @@ def main(year, month):
     # output_file = 'taxi_type=fhv_year={year:04d}_month={month:02d}.parquet'
 
     input_file = get_input_path(year, month)
-    output_file = get_output_path(year, month)
+    output_file = output_file or get_output_path(year, month)
 
     categorical = ['PUlocationID', 'DOlocationID']
     
-    with open('model.bin', 'rb') as f_in:
-        dv, lr = pickle.load(f_in)
+    dv, lr = model or load_model()
 
-    df = read_data(input_file)
+    df = read_data(input_file, columns=categorical + ['pickup_datetime', 'dropOff_datetime'])
     df = prepare_data(df, categorical)
     
     df['ride_id'] = f'{year:04d}/{month:02d}_' + df.index.astype('str')
@@ -93,7 +90,33 @@ def main(year, month):
 
     save_data(df_result, output_file)
 
+_worker = {}
+
+def init_worker():
+    # Backfill workers load the model once and reuse it for every month they score
+    _worker['model'] = load_model()
+
+def score_partition(partition, output_file):
+    main(partition.year, partition.month, output_file=output_file, model=_worker['model'])
+
+def run_backfill(start, end):
+    # Writes <BACKFILL_OUTPUT>/taxi_type=fhv/year=<yyyy>/month=<mm>/predictions.parquet;
+    # months finished by an earlier run are skipped
+    result = backfill(score_partition,
+                      partitions('fhv', start, end),
+                      root=os.getenv('BACKFILL_OUTPUT', 'output'),
+                      workers=int(os.getenv('BACKFILL_WORKERS', os.cpu_count())),
+                      retries=int(os.getenv('BACKFILL_RETRIES', 2)),
+                      initializer=init_worker)
+    print(result)
+    if result.failed:
+        sys.exit(1)
+
 if __name__ == '__main__':
+    if sys.argv[1] == 'backfill':
+        # python batch.py backfill 2021-01 2021-12
+        run_backfill(sys.argv[2], sys.argv[3])
+        sys.exit()
     a, b = int(sys.argv[1]), int(sys.argv[2])
     # Accept either "year month" (2021 2) or "month year" (2 2021)
     year, month = (a, b) if a > 12 else (b, a)
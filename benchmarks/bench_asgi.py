@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare the Flask and asyncio (ASGI) monitoring services on one process under concurrent clients.
+
+    python benchmarks/bench_asgi.py --clients 1 8 32 128 --monitor-ms 10 --seconds 5
+
+Serves 05-monitoring/prediction_service on one process, ``flask`` as
+app:app on one gunicorn worker with nyc_taxi.gunicorn_conf (gthread) and
+``asgi`` as asgi:app on uvicorn. The Mongo insert and the Evidently
+update are replaced by sleeps of ``--monitor-ms`` each (time.sleep in
+the Flask app, asyncio.sleep in the ASGI one), so no database or
+Evidently service is needed and the cost of the side calls is the same
+for both. Each client posts one ride per connection, like send_data.py,
+and the script reports rides/s and latency percentiles.
+"""
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import subprocess
+import http.client
+from time import perf_counter, sleep
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICE_DIR = ROOT / '05-monitoring/prediction_service'
+RIDE = json.dumps({'PULocationID': 10, 'DOLocationID': 50, 'trip_distance': 4.5})
+
+
+def _monitor_seconds():
+    return float(os.environ['BENCH_MONITOR_MS']) / 1000
+
+
+def stubbed_flask():
+    """app:app with the Mongo and Evidently writes replaced by sleeps (gunicorn app factory)."""
+    import time
+
+    import app
+
+    def save_to_db(record, prediction):
+        time.sleep(_monitor_seconds())
+
+    def send_to_evidently_service(record, prediction):
+        time.sleep(_monitor_seconds())
+
+    app.save_to_db = save_to_db
+    app.send_to_evidently_service = send_to_evidently_service
+    return app.app
+
+
+def stubbed_asgi():
+    """asgi:app with the Mongo and Evidently writes replaced by sleeps (uvicorn --factory)."""
+    import asyncio
+
+    import asgi
+
+    async def save_to_db(record, prediction):
+        await asyncio.sleep(_monitor_seconds())
+
+    async def send_to_evidently_service(record, prediction):
+        await asyncio.sleep(_monitor_seconds())
+
+    asgi.save_to_db = save_to_db
+    asgi.send_to_evidently_service = send_to_evidently_service
+    return asgi.app
+
+
+def post(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('POST', '/predict', body=RIDE, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(mode, monitor_ms):
+    port = free_port()
+    if mode == 'flask':
+        command = [
+            '-m', 'gunicorn', '-c', 'python:nyc_taxi.gunicorn_conf', '--workers', '1',
+            '--bind', f'127.0.0.1:{port}', 'bench_asgi:stubbed_flask()',
+        ]
+    else:
+        command = ['-m', 'uvicorn', '--factory', 'bench_asgi:stubbed_asgi', '--port', str(port), '--log-level', 'warning']
+    pythonpath = [str(ROOT), str(SERVICE_DIR), str(Path(__file__).parent)] + os.environ.get('PYTHONPATH', '').split(os.pathsep)
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, pythonpath)),
+        BENCH_MONITOR_MS=str(monitor_ms),
+        MODEL_FILE=str(SERVICE_DIR / 'lin_reg.bin'),
+        MODEL_RELOAD_INTERVAL='0',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-W', 'ignore', *command],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(600):
+        try:
+            if post(port) == 200:
+                return server, port
+        except OSError:
+            pass
+        if server.poll() is not None:
+            break
+        sleep(0.1)
+    server.kill()
+    raise RuntimeError(f'the {mode} service did not start')
+
+
+def run(port, seconds, clients):
+    deadline = perf_counter() + seconds
+
+    def client():
+        latencies = []
+        while perf_counter() < deadline:
+            start = perf_counter()
+            assert post(port) == 200
+            latencies.append(perf_counter() - start)
+        return latencies
+
+    start = perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = sorted(latency for result in pool.map(lambda _: client(), range(clients)) for latency in result)
+    return len(latencies) / (perf_counter() - start), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--monitor-ms', type=float, default=10, help='latency of each stubbed Mongo/Evidently write')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f'Mongo and Evidently writes stubbed at {args.monitor_ms:g} ms each')
+    for mode in ('flask', 'asgi'):
+        server, port = serve(mode, args.monitor_ms)
+        try:
+            run(port, 1, max(args.clients))
+            for clients in args.clients:
+                rides, latencies = run(port, args.seconds, clients)
+                p50, p99 = (latencies[int(q * (len(latencies) - 1))] * 1000 for q in (0.5, 0.99))
+                print(f'{mode:<5} {clients:>4} clients: {rides:>8,.0f} rides/s  p50 {p50:7.2f}ms  p99 {p99:7.2f}ms')
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
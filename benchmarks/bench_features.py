@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare to_dict + DictVectorizer against nyc_taxi.features.TripFeatureEncoder.
+
+    python benchmarks/bench_features.py --rows 2000000
+"""
+import sys
+import argparse
+from time import perf_counter
+from pathlib import Path
+
+import pandas as pd
+from sklearn.feature_extraction import DictVectorizer
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+from nyc_taxi.features import TripFeatureEncoder  # noqa: E402
+
+DEFAULT_FILE = Path(__file__).resolve().parents[1] / '03-orchestration/data/green_tripdata_2021-01.parquet'
+
+
+def dict_vectorizer_transform(dv, df):
+    df = df.copy()
+    df['PU_DO'] = df['PULocationID'] + '_' + df['DOLocationID']
+    dicts = df[['PU_DO', 'trip_distance']].to_dict(orient='records')
+    return dv.transform(dicts)
+
+
+def timeit(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file')
+    parser.add_argument('--rows', type=int, default=None, help='tile the file up to this many rows')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.file)
+    if args.rows:
+        df = pd.concat([df] * -(-args.rows // len(df)), ignore_index=True).iloc[:args.rows]
+    df_str = prepare_trips(df)
+    df_int = prepare_trips(df, categorical=None)
+    print(f'{len(df_str)} rows from {args.file}')
+
+    encoder = TripFeatureEncoder().fit(df_int)
+    dv = encoder.to_dict_vectorizer()
+
+    baseline, expected = timeit(lambda: dict_vectorizer_transform(dv, df_str), args.repeat)
+    str_ids, _ = timeit(lambda: encoder.transform(df_str), args.repeat)
+    int_ids, actual = timeit(lambda: encoder.transform(df_int), args.repeat)
+    assert (actual != expected).nnz == 0
+
+    n = len(df_str)
+    print(f'DictVectorizer          : {baseline:8.3f}s  {n / baseline:>14,.0f} rows/s')
+    print(f'encoder (string IDs)    : {str_ids:8.3f}s  {n / str_ids:>14,.0f} rows/s  {baseline / str_ids:6.1f}x')
+    print(f'encoder (integer IDs)   : {int_ids:8.3f}s  {n / int_ids:>14,.0f} rows/s  {baseline / int_ids:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare per-request model calls with nyc_taxi.microbatch under concurrent single-ride requests.
+
+    python benchmarks/bench_microbatch.py --rides 20000 --threads 1 8 32 --max-wait-ms 2
+
+Request threads call the 05-monitoring prediction service's model the way
+/predict does -- one ride each -- either directly or through a
+MicroBatcher, and the script reports rides/s and latency percentiles.
+"""
+import sys
+import pickle
+import argparse
+import warnings
+from time import perf_counter
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from nyc_taxi.microbatch import MicroBatcher  # noqa: E402
+
+DEFAULT_MODEL = ROOT / '05-monitoring/prediction_service/lin_reg.bin'
+
+
+def make_rides(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return [
+        {'PU_DO': f'{pu}_{do}', 'trip_distance': float(d)}
+        for pu, do, d in zip(rng.integers(1, 266, n), rng.integers(1, 266, n), rng.uniform(0.1, 20, n).round(2))
+    ]
+
+
+def run(predict, rides, threads):
+    latencies = np.empty(len(rides))
+
+    def request(i):
+        start = perf_counter()
+        predict(rides[i])
+        latencies[i] = perf_counter() - start
+
+    start = perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(request, range(len(rides))))
+    return perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=str(DEFAULT_MODEL), help='pickled (dv, model)')
+    parser.add_argument('--rides', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with open(args.model, 'rb') as f_in:
+            dv, model = pickle.load(f_in)
+
+    def predict_many(records):
+        return model.predict(dv.transform(records))
+
+    rides = make_rides(args.rides)
+    for threads in args.threads:
+        sizes = []
+        batcher = MicroBatcher(
+            predict_many, max_wait_ms=args.max_wait_ms, max_batch=args.max_batch,
+            on_batch=lambda size, waits: sizes.append(size),
+        )
+        for name, predict in [('direct', lambda ride: predict_many([ride])[0]), ('micro-batched', batcher.predict)]:
+            seconds, latencies = run(predict, rides, threads)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            batches = f'  mean batch {np.mean(sizes):5.1f}' if name == 'micro-batched' else ''
+            print(
+                f'{threads:>3} threads {name:<14}: {len(rides) / seconds:>9,.0f} rides/s  '
+                f'p50 {p50:6.2f}ms  p99 {p99:6.2f}ms{batches}'
+            )
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
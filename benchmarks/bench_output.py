@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare the df_result + to_parquet output path against nyc_taxi.predictions.
+
+    python benchmarks/bench_output.py --rows 4000000
+"""
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.predictions import predictions_table, write_predictions  # noqa: E402
+from nyc_taxi.ride_ids import ride_ids  # noqa: E402
+
+RUN_ID = 'ecfa50f261e64914817112759fbbfc48'
+
+
+def make_scored(rows, seed=1):
+    rng = np.random.default_rng(seed)
+    duration = rng.uniform(1, 60, rows)
+    return pd.DataFrame({
+        'ride_id': ride_ids('green', 2021, 1, np.arange(rows)),
+        'PULocationID': rng.integers(1, 266, rows),
+        'DOLocationID': rng.integers(1, 266, rows),
+        'duration': duration,
+    }), duration + rng.normal(0, 5, rows)
+
+
+def legacy(df, y_pred, path, compression):
+    df_result = pd.DataFrame()
+    df_result['ride_id'] = df['ride_id']
+    df_result['PULocationID'] = df['PULocationID']
+    df_result['DOLocationID'] = df['DOLocationID']
+    df_result['actual_duration'] = df['duration']
+    df_result['predicted_duration'] = y_pred
+    df_result['diff'] = df_result['actual_duration'] - df_result['predicted_duration']
+    df_result['model_version'] = RUN_ID
+    df_result.to_parquet(path, engine='pyarrow', compression=compression, index=False)
+
+
+def arrow(df, y_pred, path, compression):
+    actual_duration = df['duration'].to_numpy()
+    table = predictions_table({
+        'ride_id': df['ride_id'],
+        'PULocationID': df['PULocationID'],
+        'DOLocationID': df['DOLocationID'],
+        'actual_duration': actual_duration,
+        'predicted_duration': y_pred,
+        'diff': actual_duration - y_pred,
+    }, model_version=RUN_ID)
+    write_predictions(table, path, compression=compression)
+
+
+def timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=4_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df, y_pred = make_scored(args.rows)
+    print(f'{args.rows} predictions')
+    cases = [
+        ('df_result, uncompressed', legacy, None),
+        ('df_result, snappy', legacy, 'snappy'),
+        ('arrow, snappy', arrow, 'snappy'),
+        ('arrow, zstd', arrow, 'zstd'),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, write, compression) in enumerate(cases):
+            path = Path(tmp) / f'{i}.parquet'
+            write_time = timeit(lambda: write(df, y_pred, path, compression), args.repeat)
+            read_time = timeit(lambda: pq.read_table(path).to_pandas(), args.repeat)
+            size = path.stat().st_size / 2**20
+            print(f'{name:<24}: write {write_time:6.3f}s  read {read_time:6.3f}s  {size:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Load test /predict against /predict/batch of 04-deployment/web-service.
+
+    python benchmarks/bench_predict_batch.py --rides 20000 --concurrency 4 --batch-size 100 1000
+
+The service runs in its own process (Flask's threaded server, started from
+the web-service directory so it finds lin_reg.bin); the client keeps one
+HTTP connection per thread and reports rides per second for each mode.
+"""
+import sys
+import json
+import socket
+import argparse
+import subprocess
+import http.client
+from time import perf_counter, sleep
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICE_DIR = ROOT / '04-deployment/web-service'
+
+
+def make_rides(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return [
+        {'PULocationID': int(pu), 'DOLocationID': int(do), 'trip_distance': round(float(d), 2)}
+        for pu, do, d in zip(rng.integers(1, 266, n), rng.integers(1, 266, n), rng.uniform(0.1, 20, n))
+    ]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_service(port):
+    code = f"import predict; predict.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    process = subprocess.Popen(
+        [sys.executable, '-c', code], cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            sleep(0.1)
+    process.kill()
+    raise RuntimeError('the web service did not start')
+
+
+def post(connection, path, body, content_type='application/json'):
+    connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+    response = connection.getresponse()
+    data = response.read()
+    assert response.status == 200, (response.status, data[:200])
+    return data
+
+
+def run(port, requests, concurrency):
+    """Send ``(path, body, content_type)`` requests from ``concurrency`` threads; seconds taken."""
+    def worker(chunk):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            return [post(connection, *req) for req in chunk]
+        finally:
+            connection.close()
+
+    chunks = [requests[i::concurrency] for i in range(concurrency)]
+    start = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, chunks))
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=20_000)
+    parser.add_argument('--single-rides', type=int, default=2_000, help='rides sent through /predict')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    rides = make_rides(args.rides)
+    port = free_port()
+    service = start_service(port)
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        batch = json.loads(post(connection, '/predict/batch', json.dumps(rides[:50])))['predictions']
+        single = [json.loads(post(connection, '/predict', json.dumps(ride)))['duration'] for ride in rides[:50]]
+        assert np.allclose([r['duration'] for r in batch], single)
+        connection.close()
+
+        requests = [('/predict', json.dumps(ride)) for ride in rides[:args.single_rides]]
+        seconds = run(port, requests, args.concurrency)
+        print(f'{"/predict":<28}: {len(requests) / seconds:>10,.0f} rides/s')
+
+        for batch_size in args.batch_size:
+            for name, content_type, encode in [
+                ('json', 'application/json', json.dumps),
+                ('ndjson', 'application/x-ndjson', lambda chunk: '\n'.join(map(json.dumps, chunk))),
+            ]:
+                requests = [
+                    ('/predict/batch', encode(rides[i:i + batch_size]), content_type)
+                    for i in range(0, len(rides), batch_size)
+                ]
+                seconds = run(port, requests, args.concurrency)
+                print(f'{f"/predict/batch {name} x{batch_size}":<28}: {len(rides) / seconds:>10,.0f} rides/s')
+    finally:
+        service.terminate()
+        service.wait()
+
+
+if __name__ == '__main__':
+    main()
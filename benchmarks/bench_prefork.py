@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Memory and throughput of gunicorn against worker count, with and without nyc_taxi.gunicorn_conf.
+
+    python benchmarks/bench_prefork.py --workers 1 2 4 --trees 40 --seconds 5
+
+Serves 04-deployment/web-service/predict.py with a random forest standing
+in for lin_reg.bin, so the model is large enough to see in the totals.
+``preload`` is gunicorn with nyc_taxi.gunicorn_conf (preload_app and
+gc.freeze in the master); ``no-preload`` is plain gunicorn, where every
+worker imports the app itself. Memory is the proportional set size (PSS)
+of the master and its workers: pages shared copy-on-write count once
+across the processes. The random forest is trained in a child process,
+like the service, so the benchmark itself stays small.
+
+``--reload`` instead measures memory before and after the model file is
+replaced, with the model behind ``nyc_taxi.reload`` as in the monitoring
+service: ``master`` reloads in the gunicorn master and replaces the
+workers (nyc_taxi.gunicorn_conf), ``workers`` is every worker loading
+the new model itself, as before the master did it.
+"""
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+from time import perf_counter, sleep
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICE_DIR = ROOT / '04-deployment/web-service'
+DEFAULT_FILE = ROOT / '03-orchestration/data/green_tripdata_2021-01.parquet'
+RIDE = json.dumps({'PULocationID': 10, 'DOLocationID': 50, 'trip_distance': 4.5})
+RELOAD_INTERVAL = 0.5
+# predict.py with its model behind nyc_taxi.reload, like the monitoring service
+WATCHED_APP = """
+import os
+import predict
+from nyc_taxi import gunicorn_conf
+from nyc_taxi.reload import watch_file
+
+predict.dv = predict.model = None
+watcher = watch_file('lin_reg.bin')
+if os.getenv('BENCH_RELOAD') == 'workers':
+    # skip reload_in_master, so each worker watches and loads on its own
+    gunicorn_conf.reload_in_master = lambda restart: None
+
+
+def predict_current(features):
+    dv, model = watcher.current.model
+    return model.predict(dv.transform(features))
+
+
+predict.predict = predict_current
+app = predict.app
+"""
+
+
+def make_model(filename, trees, workdir):
+    import pickle
+
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.feature_extraction import DictVectorizer
+
+    sys.path.append(str(ROOT))
+    from nyc_taxi.trips import prepare_trips
+
+    df = prepare_trips(pd.read_parquet(filename), categorical=None)
+    df['PU_DO'] = df['PULocationID'].astype(str) + '_' + df['DOLocationID'].astype(str)
+    dv = DictVectorizer()
+    X = dv.fit_transform(df[['PU_DO', 'trip_distance']].to_dict(orient='records'))
+    model = RandomForestRegressor(n_estimators=trees, min_samples_leaf=2, random_state=1).fit(X, df['duration'])
+    with open(workdir / 'lin_reg.bin', 'wb') as f_out:
+        pickle.dump((dv, model), f_out)
+    return (workdir / 'lin_reg.bin').stat().st_size
+
+
+def memory(pid):
+    """``{'rss': ..., 'pss': ...}`` in bytes for ``pid``."""
+    totals = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f_in:
+        for line in f_in:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                totals[key.lower()] = int(value.split()[0]) * 1024
+    return totals
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f_in:
+        return [int(child) for child in f_in.read().split()]
+
+
+def post(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request('POST', '/predict', body=RIDE, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(workdir, workers, preload, app='predict:app', **env):
+    port = free_port()
+    command = [sys.executable, '-W', 'ignore', '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    if preload:
+        command += ['-c', 'python:nyc_taxi.gunicorn_conf']
+    command.append(app)
+    pythonpath = [str(ROOT), str(SERVICE_DIR)] + os.environ.get('PYTHONPATH', '').split(os.pathsep)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, pythonpath)), **env)
+    master = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(600):
+        try:
+            if post(port) == 200 and len(children(master.pid)) == workers:
+                return master, port
+        except OSError:
+            pass
+        sleep(0.1)
+    master.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def load(port, seconds, concurrency):
+    deadline = perf_counter() + seconds
+
+    def client():
+        done = 0
+        while perf_counter() < deadline:
+            assert post(port) == 200
+            done += 1
+        return done
+
+    start = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        done = sum(pool.map(lambda _: client(), range(concurrency)))
+    return done / (perf_counter() - start)
+
+
+def total_pss(master):
+    return sum(memory(pid)['pss'] for pid in [master.pid] + children(master.pid))
+
+
+def measure_reload(workdir, workers, mode, seconds):
+    """Total PSS before and after the model file is replaced, in bytes."""
+    master, port = serve(
+        workdir, workers, True, app='watched:app',
+        BENCH_RELOAD=mode, MODEL_RELOAD_INTERVAL=str(RELOAD_INTERVAL),
+    )
+    try:
+        # every worker touches the model, and starts its watcher if it has one
+        load(port, 1, 2 * workers)
+        before = total_pss(master)
+        old_workers = set(children(master.pid))
+
+        model = workdir / 'lin_reg.bin'
+        tmp = workdir / 'lin_reg.bin.tmp'
+        tmp.write_bytes(model.read_bytes())
+        os.replace(tmp, model)
+        start = perf_counter()
+        while perf_counter() - start < 120:
+            if mode == 'master':
+                # the master loaded the new model once the old workers are all replaced
+                current = set(children(master.pid))
+                if len(current) == workers and not current & old_workers:
+                    break
+            elif perf_counter() - start > seconds:
+                # the workers' own watchers load it in the background
+                break
+            load(port, 0.2, 2 * workers)
+        load(port, 1, 2 * workers)
+        return before, total_pss(master)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file to train on')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--trees', type=int, default=40)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--reload', action='store_true', help='memory before and after a model reload instead')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(make_model(args.file, args.trees, Path(args.child)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run(
+            [sys.executable, '-W', 'ignore', __file__, '--child', tmp, '--file', args.file, '--trees', str(args.trees)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        print(f'model pickle {int(out.split()[-1]) / 2**20:.0f} MiB')
+
+        if args.reload:
+            (Path(tmp) / 'watched.py').write_text(WATCHED_APP)
+            for workers in args.workers:
+                for mode in ('master', 'workers'):
+                    before, after = measure_reload(Path(tmp), workers, mode, args.seconds)
+                    print(
+                        f'{workers} workers reload in {mode:<7}: PSS before {before / 2**20:6.0f} MiB  '
+                        f'after {after / 2**20:6.0f} MiB'
+                    )
+            return
+
+        for workers in args.workers:
+            for preload in (True, False):
+                master, port = serve(tmp, workers, preload)
+                try:
+                    # a few requests per worker so every one has touched the model
+                    load(port, 1, 2 * workers)
+                    pids = [master.pid] + children(master.pid)
+                    usage = [memory(pid) for pid in pids]
+                    rides = load(port, args.seconds, 2 * workers)
+                finally:
+                    master.send_signal(signal.SIGTERM)
+                    master.wait()
+                name = 'preload' if preload else 'no-preload'
+                print(
+                    f'{workers} workers {name:<10}: PSS {sum(u["pss"] for u in usage) / 2**20:6.0f} MiB  '
+                    f'RSS sum {sum(u["rss"] for u in usage) / 2**20:6.0f} MiB  {rides:8,.0f} rides/s'
+                )
+
+
+if __name__ == '__main__':
+    main()
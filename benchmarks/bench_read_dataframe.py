@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare the per-row lambda duration path against nyc_taxi.trips.
+
+    python benchmarks/bench_read_dataframe.py --rows 2000000
+"""
+import sys
+import argparse
+from time import perf_counter
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+
+DEFAULT_FILE = Path(__file__).resolve().parents[1] / '03-orchestration/data/green_tripdata_2021-01.parquet'
+
+
+def legacy_prepare(df):
+    df['duration'] = df.lpep_dropoff_datetime - df.lpep_pickup_datetime
+    df.duration = df.duration.apply(lambda td: td.total_seconds() / 60)
+    df = df[(df.duration >= 1) & (df.duration <= 60)].copy()
+
+    categorical = ['PULocationID', 'DOLocationID']
+    df[categorical] = df[categorical].astype(str)
+    return df
+
+
+def load(filename, rows):
+    df = pd.read_parquet(filename)
+    if rows and rows > len(df):
+        df = pd.concat([df] * -(-rows // len(df)), ignore_index=True)
+    if rows:
+        df = df.iloc[:rows]
+    return df
+
+
+def timeit(fn, df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = perf_counter()
+        fn(frame)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file')
+    parser.add_argument('--rows', type=int, default=None, help='tile the file up to this many rows')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = load(args.file, args.rows)
+    print(f'{len(df)} rows from {args.file}')
+
+    legacy = timeit(legacy_prepare, df, args.repeat)
+    vectorized = timeit(prepare_trips, df, args.repeat)
+
+    print(f'lambda apply : {legacy:8.3f}s  {len(df) / legacy:>14,.0f} rows/s')
+    print(f'prepare_trips: {vectorized:8.3f}s  {len(df) / vectorized:>14,.0f} rows/s')
+    print(f'speedup      : {legacy / vectorized:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Request latency while the model is replaced: nyc_taxi.reload against reloading on the request path.
+
+    python benchmarks/bench_reload.py --trees 40 --seconds 10 --every 2
+
+A random forest (so loading takes a while) is pickled as ``(dv, model)``
+and replaced every ``--every`` seconds while client threads score single
+rides. ``inline`` is the obvious alternative to a restart: the request
+that notices the new mtime loads it, and the others wait on the lock.
+``watcher`` loads and warms it on the watcher thread and swaps it in.
+"""
+import os
+import sys
+import pickle
+import argparse
+import tempfile
+import threading
+from time import perf_counter, sleep
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction import DictVectorizer
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+from nyc_taxi.reload import file_version, load_pickle, watch_file  # noqa: E402
+
+DEFAULT_FILE = ROOT / '03-orchestration/data/green_tripdata_2021-01.parquet'
+RIDE = {'PULocationID': 10, 'DOLocationID': 50, 'trip_distance': 4.5, 'PU_DO': '10_50'}
+
+
+def make_model(filename, trees, path):
+    df = prepare_trips(pd.read_parquet(filename), categorical=None)
+    df['PU_DO'] = df['PULocationID'].astype(str) + '_' + df['DOLocationID'].astype(str)
+    dv = DictVectorizer()
+    X = dv.fit_transform(df[['PU_DO', 'trip_distance']].to_dict(orient='records'))
+    model = RandomForestRegressor(n_estimators=trees, min_samples_leaf=2, random_state=1, n_jobs=1)
+    model.fit(X, df['duration'])
+    with open(path, 'wb') as f_out:
+        pickle.dump((dv, model), f_out)
+
+
+def warm_up(dv_model):
+    dv, model = dv_model
+    model.predict(dv.transform([RIDE]))
+
+
+class InlineReload:
+    """Checks the file on every request and reloads it there."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.version = file_version(path)
+        self.model = load_pickle(path)
+
+    def current(self):
+        if file_version(self.path) != self.version:
+            with self.lock:
+                version = file_version(self.path)
+                if version != self.version:
+                    self.model = load_pickle(self.path)
+                    self.version = version
+        return self.model
+
+
+def run(current, path, seconds, every, concurrency):
+    latencies = []
+    stop = threading.Event()
+
+    def client():
+        local = []
+        while not stop.is_set():
+            start = perf_counter()
+            dv, model = current()
+            model.predict(dv.transform([RIDE]))
+            local.append(perf_counter() - start)
+        return local
+
+    def deployer():
+        while not stop.wait(every):
+            # a new mtime is enough to make both strategies load the file again
+            os.utime(path)
+
+    thread = threading.Thread(target=deployer)
+    thread.start()
+    with ThreadPoolExecutor(concurrency) as pool:
+        futures = [pool.submit(client) for _ in range(concurrency)]
+        sleep(seconds)
+        stop.set()
+        for future in futures:
+            latencies.extend(future.result())
+    thread.join()
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file to train on')
+    parser.add_argument('--trees', type=int, default=40)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--every', type=float, default=2, help='seconds between model replacements')
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'lin_reg.bin'
+        make_model(args.file, args.trees, path)
+        start = perf_counter()
+        load_pickle(path)
+        print(f'model pickle {path.stat().st_size / 2**20:.0f} MiB, loads in {perf_counter() - start:.2f}s')
+
+        inline = InlineReload(path)
+        watcher = watch_file(path, warm=warm_up, interval=0.1)
+        for name, current in [('inline', inline.current), ('watcher', lambda: watcher.current.model)]:
+            ms = run(current, path, args.seconds, args.every, args.concurrency)
+            print(
+                f'{name:<8}: {len(ms) / args.seconds:7,.0f} rides/s  p50 {np.percentile(ms, 50):6.2f} ms  '
+                f'p99 {np.percentile(ms, 99):7.2f} ms  max {ms.max():7.1f} ms'
+            )
+        watcher.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare whole-month and streaming batch scoring in 04-deployment/batch/score.py.
+
+    python benchmarks/bench_score.py --rows 4000000 --batch-size 65536
+
+Preparing the inputs and each mode run in fresh processes: peak RSS carries
+over from a parent into the children it starts, so the parent stays small.
+"""
+import sys
+import json
+import pickle
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+from pathlib import Path
+
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / '04-deployment/batch'))
+from nyc_taxi.parquet import peak_rss  # noqa: E402
+from nyc_taxi.trips import prepare_trips  # noqa: E402
+from nyc_taxi.features import TripFeatureEncoder  # noqa: E402
+
+DEFAULT_FILE = ROOT / '03-orchestration/data/green_tripdata_2021-01.parquet'
+
+
+def make_inputs(filename, rows, workdir):
+    df = pd.read_parquet(filename)
+    if rows:
+        df = pd.concat([df] * -(-rows // len(df)), ignore_index=True).iloc[:rows]
+    month = workdir / 'green_tripdata_2021-01.parquet'
+    df.to_parquet(month, index=False)
+
+    train = prepare_trips(df.iloc[:100_000], categorical=None)
+    encoder = TripFeatureEncoder().fit(train)
+    model = LinearRegression().fit(encoder.transform(train), train['duration'])
+    pipeline = make_pipeline(encoder.to_dict_vectorizer(), model)
+    with open(workdir / 'model.pkl', 'wb') as f_out:
+        pickle.dump(pipeline, f_out)
+    return month, len(df)
+
+
+def run_mode(workdir, batch_size):
+    import score
+
+    def load_model(run_id):
+        with open(workdir / 'model.pkl', 'rb') as f_in:
+            return pickle.load(f_in)
+
+    score.load_model = load_model
+    start = perf_counter()
+    score.apply_model(str(workdir / 'green_tripdata_2021-01.parquet'), 'bench', str(workdir / f'out-{batch_size}.parquet'), batch_size)
+    print(json.dumps({'seconds': perf_counter() - start, 'peak_rss': peak_rss()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file')
+    parser.add_argument('--rows', type=int, default=None, help='tile the file up to this many rows')
+    parser.add_argument('--batch-size', type=int, default=65_536)
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child and args.prepare:
+        month, n = make_inputs(args.file, args.rows, Path(args.child))
+        print(json.dumps({'rows': n, 'bytes': month.stat().st_size}))
+        return
+    if args.child:
+        run_mode(Path(args.child), args.batch_size)
+        return
+
+    def child(*extra):
+        out = subprocess.run(
+            [sys.executable, __file__, '--child', tmp, *extra],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        inputs = child('--prepare', '--file', args.file, *(['--rows', str(args.rows)] if args.rows else []))
+        n = inputs['rows']
+        print(f'{n} rows, {inputs["bytes"] / 2**20:.1f} MiB parquet')
+
+        results = {}
+        for name, batch_size in [('whole month', 0), (f'streaming {args.batch_size}', args.batch_size)]:
+            results[name] = child('--batch-size', str(batch_size))
+
+        for name, result in results.items():
+            print(
+                f'{name:<20}: {result["seconds"]:8.3f}s  {n / result["seconds"]:>12,.0f} rows/s  '
+                f'peak RSS {result["peak_rss"] / 2**20:7.0f} MiB'
+            )
+        whole, streaming = pd.read_parquet(workdir / 'out-0.parquet'), pd.read_parquet(workdir / f'out-{args.batch_size}.parquet')
+        assert whole.equals(streaming)
+
+
+if __name__ == '__main__':
+    main()
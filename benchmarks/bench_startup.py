@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare model cold start through mlflow.pyfunc, a plain pickle and nyc_taxi.bundle.
+
+    python benchmarks/bench_startup.py --model forest --repeat 5
+
+Every start runs in a fresh interpreter, like a Lambda cold start, and
+reports the time to import and load the model and make the first
+prediction, then the peak RSS. Only the standard library is imported at
+module level so the children start from the same baseline.
+
+``bundle-s3`` is the deployed path: ``load_model('s3://.../model.npz',
+flavor='bundle')`` with an empty model cache, as in a fresh Lambda
+container, served by a local S3 stand-in (``MLFLOW_S3_ENDPOINT_URL``).
+It also reports whether the start imported mlflow.
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+import argparse
+import resource
+import tempfile
+import subprocess
+from time import perf_counter
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+DEFAULT_FILE = ROOT / '03-orchestration/data/green_tripdata_2021-01.parquet'
+RIDE = {'PU_DO': '130_205', 'trip_distance': 3.66}
+BUNDLE_URI = 's3://bench/model.npz'
+MODES = ('pyfunc', 'pickle', 'bundle', 'bundle-s3')
+
+
+def make_inputs(filename, kind, workdir):
+    import pickle
+
+    import mlflow.sklearn
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import make_pipeline
+
+    from nyc_taxi.bundle import export_bundle
+    from nyc_taxi.trips import prepare_trips
+
+    df = prepare_trips(pd.read_parquet(filename), categorical=None)
+    df['PU_DO'] = df['PULocationID'].astype(str) + '_' + df['DOLocationID'].astype(str)
+    dicts = df[['PU_DO', 'trip_distance']].to_dict(orient='records')
+    if kind == 'forest':
+        regressor = RandomForestRegressor(n_estimators=20, max_depth=10, min_samples_leaf=5, n_jobs=-1, random_state=1)
+    else:
+        regressor = LinearRegression()
+    pipeline = make_pipeline(DictVectorizer(), regressor).fit(dicts, df['duration'])
+
+    mlflow.sklearn.save_model(
+        pipeline, str(workdir / 'model'), serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE,
+    )
+    with open(workdir / 'model.pkl', 'wb') as f_out:
+        pickle.dump(pipeline, f_out)
+    export_bundle(pipeline, workdir / 'model.npz')
+    sizes = {
+        'pyfunc': sum(f.stat().st_size for f in (workdir / 'model').rglob('*') if f.is_file()),
+        'pickle': (workdir / 'model.pkl').stat().st_size,
+        'bundle': (workdir / 'model.npz').stat().st_size,
+    }
+    return {'sizes': sizes, 'prediction': float(pipeline.predict(RIDE)[0])}
+
+
+def cold_start(mode, workdir, calls):
+    start = perf_counter()
+    if mode == 'pyfunc':
+        import mlflow.pyfunc
+        model = mlflow.pyfunc.load_model(str(workdir / 'model'))
+    elif mode == 'pickle':
+        import pickle
+        with open(workdir / 'model.pkl', 'rb') as f_in:
+            model = pickle.load(f_in)
+    elif mode == 'bundle':
+        from nyc_taxi.bundle import load_bundle
+        model = load_bundle(workdir / 'model.npz')
+    else:
+        from nyc_taxi.model_cache import load_model
+        model = load_model(BUNDLE_URI, flavor='bundle')
+    loaded = perf_counter()
+    prediction = float(model.predict(RIDE)[0])
+    first = perf_counter()
+    for _ in range(calls):
+        model.predict(RIDE)
+    warm = (perf_counter() - first) / max(calls, 1)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = usage if sys.platform == 'darwin' else usage * 1024
+    return {
+        'load': loaded - start,
+        'first': first - start,
+        'warm': warm,
+        'peak_rss': peak_rss,
+        'prediction': prediction,
+        'mlflow': 'mlflow' in sys.modules,
+    }
+
+
+def serve_bucket(workdir):
+    """A read-only S3 stand-in serving ``s3://bench/<name>`` from ``workdir``; boto3's signatures are ignored."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _object(self):
+            with open(workdir / self.path.split('?')[0].split('/', 2)[-1], 'rb') as f_in:
+                return f_in.read()
+
+        def _send(self, data, body):
+            start, end = 0, len(data) - 1
+            ranged = self.headers.get('Range')
+            if ranged:
+                start, end = (int(x) for x in ranged.split('=')[1].split('-'))
+                end = min(end, len(data) - 1)
+            self.send_response(206 if ranged else 200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('ETag', f'"{hashlib.md5(data).hexdigest()}"')
+            self.send_header('Last-Modified', 'Thu, 01 Jan 2026 00:00:00 GMT')
+            if ranged:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+            self.end_headers()
+            if body:
+                self.wfile.write(data[start:end + 1])
+
+        def do_HEAD(self):
+            self._send(self._object(), body=False)
+
+        def do_GET(self):
+            self._send(self._object(), body=True)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=str(DEFAULT_FILE), help='green trip parquet file to train on')
+    parser.add_argument('--model', choices=['linear', 'forest'], default='linear')
+    parser.add_argument('--repeat', type=int, default=3, help='cold starts per mode, the best is reported')
+    parser.add_argument('--calls', type=int, default=200, help='warm single-ride predictions per start')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--mode', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child and args.mode:
+        print(json.dumps(cold_start(args.mode, Path(args.child), args.calls)))
+        return
+    if args.child:
+        print(json.dumps(make_inputs(args.file, args.model, Path(args.child))))
+        return
+
+    def child(*extra, env=None):
+        start = perf_counter()
+        out = subprocess.run(
+            [sys.executable, __file__, '--child', tmp, *extra],
+            check=True, capture_output=True, text=True, env=env,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        result['process'] = perf_counter() - start
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = child('--file', args.file, '--model', args.model)
+        print(f'{args.model} pipeline trained on {args.file}')
+        inputs['sizes']['bundle-s3'] = inputs['sizes']['bundle']
+        bucket = serve_bucket(Path(tmp))
+        s3_env = dict(
+            os.environ,
+            MLFLOW_S3_ENDPOINT_URL=f'http://127.0.0.1:{bucket.server_address[1]}',
+            AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench', AWS_DEFAULT_REGION='us-west-1',
+        )
+        for mode in MODES:
+            runs = []
+            for _ in range(args.repeat):
+                env = None
+                if mode == 'bundle-s3':
+                    # every start finds an empty cache, like a new Lambda container's /tmp
+                    env = dict(s3_env, MODEL_CACHE_DIR=tempfile.mkdtemp(dir=tmp))
+                runs.append(child('--mode', mode, '--calls', str(args.calls), env=env))
+            best = min(runs, key=lambda run: run['first'])
+            assert abs(best['prediction'] - inputs['prediction']) < 1e-6, (mode, best['prediction'])
+            print(
+                f'{mode:<9}: import+load {best["load"]:6.3f}s  first prediction {best["first"]:6.3f}s  '
+                f'process {best["process"]:6.3f}s  warm {best["warm"] * 1e6:7.0f}us  '
+                f'peak RSS {best["peak_rss"] / 2**20:5.0f} MiB  size {inputs["sizes"][mode] / 2**20:6.2f} MiB  '
+                f'mlflow {"imported" if best["mlflow"] else "not imported"}'
+            )
+        bucket.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare per-call fluent MLflow logging against nyc_taxi.tracking.BatchLogger.
+
+Each simulated trial logs what the hyperopt objectives log: two tags, the
+sampled params and one metric.
+
+    python benchmarks/bench_tracking.py --runs 200 --store sqlite
+    python benchmarks/bench_tracking.py --tracking-uri http://127.0.0.1:5000
+"""
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter, sleep
+from pathlib import Path
+
+import mlflow
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nyc_taxi.tracking import BatchLogger  # noqa: E402
+
+PARAMS = {
+    'max_depth': 12,
+    'learning_rate': 0.1,
+    'reg_alpha': 0.02,
+    'reg_lambda': 0.01,
+    'min_child_weight': 1.5,
+}
+
+
+def fluent_trials(runs, work):
+    for i in range(runs):
+        with mlflow.start_run():
+            mlflow.set_tag('developer', 'chad')
+            mlflow.set_tag('model', 'xgboost')
+            mlflow.log_params(PARAMS)
+            sleep(work)
+            mlflow.log_metric('rmse', 6.0 + i / runs)
+
+
+def batched_trials(runs, work, tracking):
+    for i in range(runs):
+        with tracking.start_run() as run:
+            run.set_tag('developer', 'chad')
+            run.set_tag('model', 'xgboost')
+            run.log_params(PARAMS)
+            sleep(work)
+            run.log_metric('rmse', 6.0 + i / runs)
+
+
+def tracking_uri(store, directory):
+    if store == 'sqlite':
+        return f'sqlite:///{directory}/mlflow.db'
+    os.environ.setdefault('MLFLOW_ALLOW_FILE_STORE', 'true')
+    return Path(directory, 'mlruns').as_uri()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--work-ms', type=float, default=0, help='simulated training time per trial')
+    parser.add_argument('--store', choices=['sqlite', 'file'], default='sqlite')
+    parser.add_argument('--tracking-uri', default=None, help='use this tracking server instead of a local store')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    mlflow.set_tracking_uri(args.tracking_uri or tracking_uri(args.store, directory))
+    work = args.work_ms / 1000
+    print(f'{args.runs} runs against {mlflow.get_tracking_uri()}')
+
+    mlflow.set_experiment('bench-fluent')
+    start = perf_counter()
+    fluent_trials(args.runs, work)
+    fluent = perf_counter() - start
+
+    mlflow.set_experiment('bench-batched')
+    tracking = BatchLogger()
+    start = perf_counter()
+    batched_trials(args.runs, work, tracking)
+    in_trials = perf_counter() - start
+    tracking.close()
+    batched = perf_counter() - start
+
+    print(f'fluent        : {fluent:8.3f}s  {1000 * fluent / args.runs:7.2f} ms/trial')
+    print(f'batched trials: {in_trials:8.3f}s  {1000 * in_trials / args.runs:7.2f} ms/trial')
+    print(f'batched total : {batched:8.3f}s  (including the final flush)')
+    print(f'speedup       : {fluent / in_trials:8.1f}x in the trial loop, {fluent / batched:.1f}x overall')
+
+
+if __name__ == '__main__':
+    main()
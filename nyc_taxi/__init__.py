@@ -0,0 +1 @@
+"""Shared data helpers for the NYC taxi duration-prediction pipelines."""
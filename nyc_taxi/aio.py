@@ -0,0 +1,41 @@
+"""Helpers for the asyncio (ASGI) modes of the prediction services.
+
+Model inference is CPU-bound and blocks, so an ASGI app must not call
+``model.predict`` on the event loop. ``BoundedExecutor.run(fn, *args)``
+runs it on a small thread pool instead and bounds how many calls may be
+queued for it: past ``max_pending`` callers wait for a slot, so a burst
+of requests turns into back-pressure on the event loop instead of an
+unbounded backlog in memory.
+
+``PREDICT_THREADS`` (default 4) and ``PREDICT_MAX_PENDING`` (default 256)
+configure the defaults.
+"""
+import os
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_THREADS = 4
+DEFAULT_MAX_PENDING = 256
+
+
+class BoundedExecutor:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or int(os.getenv('PREDICT_THREADS', DEFAULT_THREADS))
+        self.max_pending = max_pending or int(os.getenv('PREDICT_MAX_PENDING', DEFAULT_MAX_PENDING))
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='predict')
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        # asyncio primitives belong to one event loop; tests and reloads may start another
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        return self._semaphores[loop]
+
+    async def run(self, fn, *args):
+        async with self._semaphore():
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,79 @@
+"""Memory-mappable copies of the preprocessed (X, y) datasets.
+
+``train.pkl`` has to be unpickled into private memory by every process that
+uses it, so N trial workers hold N copies of the sparse matrix. Here the
+matrix is stored as its raw ``data``/``indices``/``indptr`` arrays (plus the
+target) in ``.npy`` files, and ``load_dataset`` maps them read-only: the
+pages live in the OS page cache and are shared by every process attached to
+them.
+
+To keep the mapping intact through ``fit``/``predict``, save the matrix in
+the layout the estimator consumes -- sklearn only converts (and copies) a
+sparse matrix whose format, dtype or index dtype it does not accept. The
+tree ensembles fit on CSC and predict on CSR, both float32 with int32
+indices.
+"""
+import os
+import json
+import pickle
+
+import numpy as np
+import scipy.sparse as sp
+
+SPARSE_FORMATS = {'csr': sp.csr_matrix, 'csc': sp.csc_matrix}
+_ARRAYS = ('data', 'indices', 'indptr', 'y')
+
+
+def save_dataset(path, X, y, format='csr', dtype=None):
+    """Write ``X`` (converted to ``format``/``dtype``) and ``y`` under the directory ``path``."""
+    if format not in SPARSE_FORMATS:
+        raise ValueError(f'format must be one of {tuple(SPARSE_FORMATS)}, got {format!r}')
+    X = sp.csr_matrix(X).asformat(format)
+    if dtype is not None:
+        X = X.astype(dtype)
+    X.sort_indices()
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        'data': X.data,
+        'indices': X.indices.astype(np.int32),
+        'indptr': X.indptr.astype(np.int32),
+        'y': np.asarray(y),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), values)
+    with open(os.path.join(path, 'meta.json'), 'w') as f_out:
+        json.dump({'format': format, 'shape': list(X.shape)}, f_out)
+
+
+def has_dataset(path):
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def load_dataset(path, mmap_mode='r'):
+    """``(X, y)`` backed by memory maps of the files written by ``save_dataset``.
+
+    Pass ``mmap_mode=None`` to read the arrays into memory instead.
+    """
+    with open(os.path.join(path, 'meta.json')) as f_in:
+        meta = json.load(f_in)
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in _ARRAYS
+    }
+    matrix = SPARSE_FORMATS[meta['format']]
+    X = matrix(
+        (arrays['data'], arrays['indices'], arrays['indptr']),
+        shape=tuple(meta['shape']),
+        copy=False,
+    )
+    return X, arrays['y']
+
+
+def load_split(data_path, name, mmap_mode='r'):
+    """``(X, y)`` of the ``name`` split: the mapped arrays if saved, else ``<name>.pkl``."""
+    path = os.path.join(data_path, name)
+    if has_dataset(path):
+        return load_dataset(path, mmap_mode)
+    with open(os.path.join(data_path, f'{name}.pkl'), 'rb') as f_in:
+        return pickle.load(f_in)
@@ -0,0 +1,121 @@
+"""Backfill batch predictions over a range of months and taxi types.
+
+The batch jobs score one ``(taxi_type, year, month)`` per invocation, so a
+year of backfill means a dozen cold starts that each reload the model.
+``backfill`` fans the partitions out over a process pool instead: workers
+are started once with ``initializer(*initargs)``, which is where they should
+load the model, and then score partition after partition with the
+module-level ``score_partition(partition, output_file)``.
+
+Outputs use a Hive-style layout,
+``<root>/taxi_type=green/year=2021/month=03/predictions.parquet``, and each
+finished partition gets a ``_SUCCESS`` marker next to its file. Marked
+partitions are skipped, so a rerun -- or a retry round after a failure --
+only redoes the partitions that are still missing.
+"""
+import os
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SUCCESS = '_SUCCESS'
+
+
+@dataclass(frozen=True, order=True)
+class Partition:
+    taxi_type: str
+    year: int
+    month: int
+
+    def directory(self, root):
+        return os.path.join(root, f'taxi_type={self.taxi_type}', f'year={self.year:04d}', f'month={self.month:02d}')
+
+    def __str__(self):
+        return f'{self.taxi_type} {self.year:04d}-{self.month:02d}'
+
+
+@dataclass
+class BackfillResult:
+    completed: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+    def __str__(self):
+        failed = ''.join(f'\n  {partition}: {error}' for partition, error in sorted(self.failed.items()))
+        return (
+            f'{len(self.completed)} partitions scored, {len(self.skipped)} already done, '
+            f'{len(self.failed)} failed{failed}'
+        )
+
+
+def month_range(start, end):
+    """``(year, month)`` pairs from ``start`` to ``end`` inclusive, both given as ``'YYYY-MM'``."""
+    (year, month), (end_year, end_month) = (map(int, value.split('-')) for value in (start, end))
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def partitions(taxi_types, start, end):
+    if isinstance(taxi_types, str):
+        taxi_types = taxi_types.split(',')
+    return [Partition(taxi_type, year, month) for taxi_type in taxi_types for year, month in month_range(start, end)]
+
+
+def output_file(root, partition, filename='predictions.parquet'):
+    return os.path.join(partition.directory(root), filename)
+
+
+def is_complete(root, partition):
+    return os.path.exists(os.path.join(partition.directory(root), SUCCESS))
+
+
+def backfill(
+    score_partition,
+    partitions,
+    root,
+    workers=None,
+    retries=2,
+    initializer=None,
+    initargs=(),
+    filename='predictions.parquet',
+):
+    """Score every partition not already marked complete under ``root``.
+
+    Failed partitions are retried up to ``retries`` more times, each round on
+    a fresh pool so a crashed worker cannot take the retries down with it.
+    Returns a ``BackfillResult``.
+    """
+    result = BackfillResult()
+    todo = []
+    for partition in partitions:
+        (result.skipped if is_complete(root, partition) else todo).append(partition)
+
+    for attempt in range(retries + 1):
+        if not todo:
+            break
+        if attempt:
+            print(f'retrying {len(todo)} failed partitions (attempt {attempt + 1} of {retries + 1})')
+        failed = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+            futures = {}
+            for partition in todo:
+                os.makedirs(partition.directory(root), exist_ok=True)
+                futures[pool.submit(score_partition, partition, output_file(root, partition, filename))] = partition
+            for future in as_completed(futures):
+                partition = futures[future]
+                error = future.exception()
+                if error is not None:
+                    print(f'{partition} failed: {error!r}')
+                    result.failed[partition] = repr(error)
+                    failed.append(partition)
+                    continue
+                # Marked only once the worker returned, so a partial file is never taken as done
+                with open(os.path.join(partition.directory(root), SUCCESS), 'w'):
+                    pass
+                result.failed.pop(partition, None)
+                result.completed.append(partition)
+                print(f'{partition} done')
+        todo = sorted(failed)
+    return result
@@ -0,0 +1,210 @@
+"""Compact serving bundles for the duration pipelines.
+
+Lambda cold starts are dominated by ``import mlflow`` and
+``mlflow.pyfunc.load_model``, which unpickle a scikit-learn pipeline after
+pulling in half of the MLflow and environment-handling stack. A bundle is
+the same pipeline reduced to arrays in a single ``.npz`` file:
+
+* the feature encoding -- for each categorical feature the dense
+  code -> column lookup table of ``TripFeatureEncoder``, plus the columns
+  of the numerical features;
+* the regressor -- coefficients and intercept for linear models, or every
+  tree of a forest flattened into node arrays.
+
+``export_bundle`` needs scikit-learn and runs wherever the model is
+trained or registered; ``load_bundle`` and ``BundleModel`` only import
+NumPy. ``BundleModel.predict`` takes the feature dicts the services
+already build (``{'PU_DO': '130_205', 'trip_distance': 3.66}``) and
+matches the pipeline's predictions.
+
+    python -m nyc_taxi.bundle s3://mlflow-artifacts-remote433/1/<RUN_ID>/artifacts/model model.npz
+"""
+import json
+
+import numpy as np
+
+FORMAT_VERSION = 1
+PAIR = 'PU_DO'
+PAIR_COLUMNS = ('PULocationID', 'DOLocationID')
+PAIR_STRIDE = 1000
+
+
+def _regressor_arrays(regressor):
+    if hasattr(regressor, 'coef_') and np.ndim(regressor.coef_) == 1:
+        return 'linear', {
+            'coef': np.asarray(regressor.coef_, dtype=np.float64),
+            'intercept': np.asarray(regressor.intercept_, dtype=np.float64),
+        }
+    trees = getattr(regressor, 'estimators_', None)
+    if trees is None and hasattr(regressor, 'tree_'):
+        trees = [regressor]
+    if trees is None or np.ndim(trees) != 1 or not all(hasattr(tree, 'tree_') for tree in trees):
+        raise ValueError(f'cannot export a {type(regressor).__name__}: only linear models and tree averages are supported')
+
+    arrays = {name: [] for name in ('left', 'right', 'feature', 'threshold', 'value')}
+    roots, offset = [], 0
+    for tree in trees:
+        tree = tree.tree_
+        internal = tree.children_left >= 0
+        roots.append(offset)
+        # children are stored relative to their tree; shift them into the flat arrays
+        arrays['left'].append(np.where(internal, tree.children_left + offset, -1))
+        arrays['right'].append(np.where(internal, tree.children_right + offset, -1))
+        arrays['feature'].append(np.where(internal, tree.feature, 0))
+        arrays['threshold'].append(tree.threshold)
+        arrays['value'].append(tree.value[:, 0, 0])
+        offset += tree.node_count
+    arrays = {name: np.concatenate(parts) for name, parts in arrays.items()}
+    arrays['left'] = arrays['left'].astype(np.int32)
+    arrays['right'] = arrays['right'].astype(np.int32)
+    arrays['feature'] = arrays['feature'].astype(np.int32)
+    arrays['roots'] = np.asarray(roots, dtype=np.int32)
+    return 'forest', arrays
+
+
+def export_bundle(pipeline, path, metadata=None):
+    """Write a fitted ``(preprocessor, regressor)`` pipeline to ``path`` as ``.npz``."""
+    from nyc_taxi.features import as_encoder
+
+    encoder = as_encoder(pipeline[0])
+    if not hasattr(encoder, '_lookups'):
+        encoder._build_lookups()
+    kind, arrays = _regressor_arrays(pipeline[-1])
+    arrays = {f'model_{name}': values for name, values in arrays.items()}
+    for i, feature in enumerate(encoder.categorical):
+        lookup = encoder._lookups[feature]
+        arrays[f'lookup_{i}'] = lookup.table
+        arrays[f'lookup_{i}_offset'] = np.asarray(lookup.offset, dtype=np.int64)
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'model': kind,
+        'categorical': list(encoder.categorical),
+        'numerical': {feature: int(encoder.vocabulary_[feature]) for feature in encoder.numerical},
+        'pair_encoding': encoder.pair_encoding,
+        'n_buckets': int(encoder.n_buckets),
+        'n_features': len(encoder.vocabulary_),
+        'metadata': dict(metadata or {}),
+    }
+    arrays['meta'] = np.asarray(json.dumps(meta))
+    with open(path, 'wb') as f_out:
+        np.savez_compressed(f_out, **arrays)
+
+
+def _hash_buckets(codes, n_buckets):
+    # Same multiplicative hash as nyc_taxi.features.hash_buckets
+    hashed = (codes.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2**32)
+    return (hashed % np.uint64(n_buckets)).astype(np.int64)
+
+
+def _location_code(value):
+    # like features._int_codes, only the canonical spelling of an integer counts
+    try:
+        code = int(value)
+    except (TypeError, ValueError):
+        return 0, False
+    if isinstance(value, str):
+        return code, str(code) == value
+    return code, code == value
+
+
+def _pair_code(ride):
+    if PAIR not in ride:
+        (pu, pu_valid), (do, do_valid) = (_location_code(ride.get(column)) for column in PAIR_COLUMNS)
+        return pu * PAIR_STRIDE + do, pu_valid and do_valid
+    value = ride[PAIR]
+    if isinstance(value, str):
+        pu, _, do = value.partition('_')
+        (pu, pu_valid), (do, do_valid) = _location_code(pu), _location_code(do)
+        return pu * PAIR_STRIDE + do, pu_valid and do_valid
+    return _location_code(value)
+
+
+class BundleModel:
+    def __init__(self, arrays):
+        self.meta = json.loads(str(arrays['meta']))
+        if self.meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"unsupported bundle format {self.meta['format_version']}")
+        self.kind = self.meta['model']
+        self.metadata = self.meta['metadata']
+        self.pair_encoding = self.meta['pair_encoding']
+        self.lookups = [
+            (int(arrays[f'lookup_{i}_offset']), arrays[f'lookup_{i}'])
+            for i in range(len(self.meta['categorical']))
+        ]
+        self.model = {name[len('model_'):]: arrays[name] for name in arrays if name.startswith('model_')}
+
+    def _codes(self, rides, feature):
+        if feature == PAIR:
+            codes, valid = zip(*(_pair_code(ride) for ride in rides))
+        else:
+            codes, valid = zip(*(_location_code(ride.get(feature)) for ride in rides))
+        codes, valid = np.asarray(codes, dtype=np.int64), np.asarray(valid, dtype=bool)
+        if feature == PAIR and self.pair_encoding == 'hash':
+            codes = _hash_buckets(codes, self.meta['n_buckets'])
+        return codes, valid
+
+    def encode(self, rides):
+        """Column indices and values of each ride's non-zero features, -1 for unknown categories."""
+        columns, values = [], []
+        for (offset, table), feature in zip(self.lookups, self.meta['categorical']):
+            codes, valid = self._codes(rides, feature)
+            index = codes - offset
+            valid &= (index >= 0) & (index < len(table))
+            columns.append(np.where(valid, table[np.where(valid, index, 0)], -1))
+            values.append(np.ones(len(rides)))
+        for feature, column in self.meta['numerical'].items():
+            columns.append(np.full(len(rides), column))
+            values.append(np.asarray([ride[feature] for ride in rides], dtype=np.float64))
+        return np.column_stack(columns), np.column_stack(values)
+
+    def predict(self, rides):
+        """Predicted durations for one feature dict or a list of them."""
+        if isinstance(rides, dict):
+            rides = [rides]
+        columns, values = self.encode(rides)
+        if self.kind == 'linear':
+            coef = self.model['coef']
+            contributions = np.where(columns >= 0, coef[np.maximum(columns, 0)] * values, 0.0)
+            return contributions.sum(axis=1) + self.model['intercept']
+        return self._predict_forest(columns, values)
+
+    def _predict_forest(self, columns, values):
+        left, right = self.model['left'], self.model['right']
+        feature, threshold = self.model['feature'], self.model['threshold']
+        # scikit-learn trees compare float32 features against float64 thresholds
+        values = values.astype(np.float32)
+        nodes = np.repeat(self.model['roots'][np.newaxis, :], len(columns), axis=0)
+        while True:
+            internal = left[nodes] >= 0
+            if not internal.any():
+                break
+            split = feature[nodes]
+            x = np.zeros(nodes.shape, dtype=np.float32)
+            for k in range(columns.shape[1]):
+                x += np.where(columns[:, k, np.newaxis] == split, values[:, k, np.newaxis], 0)
+            child = np.where(x <= threshold[nodes], left[nodes], right[nodes])
+            nodes = np.where(internal, child, nodes)
+        return self.model['value'][nodes].mean(axis=1)
+
+
+def load_bundle(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        return BundleModel({name: arrays[name] for name in arrays.files})
+
+
+def main():
+    import argparse
+    from nyc_taxi.model_cache import load_model
+
+    parser = argparse.ArgumentParser(description='Export an MLflow sklearn pipeline as a NumPy serving bundle.')
+    parser.add_argument('model_uri', help='e.g. s3://<bucket>/<experiment>/<run_id>/artifacts/model')
+    parser.add_argument('output', help='path of the .npz bundle')
+    args = parser.parse_args()
+
+    pipeline = load_model(args.model_uri, flavor='sklearn')
+    export_bundle(pipeline, args.output, metadata={'model_uri': args.model_uri})
+    print(f'exported {args.model_uri} to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
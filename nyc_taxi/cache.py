@@ -0,0 +1,108 @@
+"""Content-addressed cache of preprocessing outputs.
+
+The key of a preprocessing run is a hash of everything its outputs depend
+on: the bytes of the input files, the feature spec and the code that
+produces them. ``OutputCache`` keeps one directory per key under its root;
+on a hit the cached files are copied into the destination instead of
+recomputing them, so switching back to an earlier configuration is a hit as
+well.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from dataclasses import asdict, dataclass
+
+
+def file_digest(path, chunk_size=2**20):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(*paths):
+    """Hash of the given source files, standing in for the code version."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f_in:
+            digest.update(f_in.read())
+    return digest.hexdigest()
+
+
+def cache_key(**parts):
+    """Stable hash of JSON-serializable key parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses'
+
+
+class OutputCache:
+    """Directories of output files, one per cache key, under ``root``."""
+
+    def __init__(self, root):
+        self.root = root
+        self.stats = self._load_stats()
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def _load_stats(self):
+        try:
+            with open(os.path.join(self.root, 'stats.json')) as f_in:
+                return CacheStats(**json.load(f_in))
+        except FileNotFoundError:
+            return CacheStats()
+
+    def _save_stats(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'stats.json'), 'w') as f_out:
+            json.dump(asdict(self.stats), f_out)
+
+    def restore(self, key, dest, names):
+        """Copy the cached ``names`` into ``dest``; False (a miss) if not cached."""
+        entry = self._entry(key)
+        hit = all(os.path.exists(os.path.join(entry, name)) for name in names)
+        if hit:
+            os.makedirs(dest, exist_ok=True)
+            for name in names:
+                _copy(os.path.join(entry, name), os.path.join(dest, name))
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+        self._save_stats()
+        return hit
+
+    def store(self, key, src, names):
+        """Save ``names`` from ``src`` under ``key``."""
+        os.makedirs(self.root, exist_ok=True)
+        # Fill a scratch directory first so a cache entry is never half written
+        scratch = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            for name in names:
+                _copy(os.path.join(src, name), os.path.join(scratch, name))
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            os.replace(scratch, self._entry(key))
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+
+
+def _copy(src, dest):
+    if os.path.isdir(dest):
+        shutil.rmtree(dest)
+    if os.path.isdir(src):
+        shutil.copytree(src, dest)
+    else:
+        shutil.copy2(src, dest)
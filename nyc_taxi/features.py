@@ -0,0 +1,294 @@
+"""Array-native replacement for ``DictVectorizer`` on the trip features.
+
+The pipelines turn every trip into a dict (``{'PU_DO': '130_205',
+'trip_distance': 3.66}``) just so ``DictVectorizer`` can one-hot encode it.
+``TripFeatureEncoder`` produces the same sparse matrix straight from the
+location-ID and numeric columns: each categorical value is reduced to an
+integer code, looked up in a dense code -> column table, and the CSR arrays
+are assembled with NumPy.
+
+The column layout is identical to a fitted ``DictVectorizer`` (feature names
+sorted as strings), so encoders can be built from the ``dv.pkl`` /
+``preprocessor.b`` / ``lin_reg.bin`` artifacts already on disk and converted
+back with ``to_dict_vectorizer`` for code that still passes dicts.
+
+``pair_encoding`` picks how the pickup/dropoff pair becomes columns:
+
+* ``'string'`` -- one column per seen pair, named ``PU_DO=130_205`` like the
+  DictVectorizer artifacts (the default);
+* ``'int'`` -- one column per seen pair keyed by ``pu * 1000 + do``, named
+  ``PU_DO=130205``; callers can pass that integer as ``PU_DO`` instead of
+  formatting a string per trip;
+* ``'hash'`` -- the integer key hashed into ``n_buckets`` fixed columns, so
+  pairs never seen in training still get a column.
+
+The encoding is part of the fitted encoder, so pickling it (as ``dv.pkl`` or
+``preprocessor.b``) records it for the serving side.
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import DictVectorizer
+
+PAIR = 'PU_DO'
+PAIR_COLUMNS = ('PULocationID', 'DOLocationID')
+# Taxi zone IDs are below 1000, so pu * 1000 + do is a unique pair code
+PAIR_STRIDE = 1000
+PAIR_ENCODINGS = ('string', 'int', 'hash')
+
+
+def pair_codes(pu, do):
+    return np.asarray(pu, dtype=np.int64) * PAIR_STRIDE + np.asarray(do, dtype=np.int64)
+
+
+def hash_buckets(codes, n_buckets):
+    """Spread pair codes over ``n_buckets`` with a multiplicative hash."""
+    codes = np.asarray(codes, dtype=np.int64).astype(np.uint64)
+    hashed = (codes * np.uint64(2654435761)) % np.uint64(2**32)
+    return (hashed % np.uint64(n_buckets)).astype(np.int64)
+
+
+def _int_codes(values):
+    """Integer codes of a column of location IDs, and which rows have one.
+
+    String IDs (as produced by ``trips.cast_categorical``) only count when
+    they are the canonical spelling of an integer, since anything else
+    (``'nan'``, ``'1.0'``) would not match a ``DictVectorizer`` key either.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64), np.ones(len(values), dtype=bool)
+
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_numeric(pd.Series(uniques), errors='coerce')
+    valid_unique = parsed.notna().to_numpy(copy=True)
+    if pd.api.types.is_object_dtype(uniques) or pd.api.types.is_string_dtype(uniques):
+        canonical = parsed.fillna(0).astype(np.int64).astype(str).to_numpy()
+        valid_unique &= canonical == np.asarray(uniques, dtype=object).astype(str)
+    else:
+        valid_unique &= (parsed.fillna(0) % 1 == 0).to_numpy()
+
+    unique_ints = np.append(parsed.fillna(0).to_numpy().astype(np.int64), 0)
+    valid_unique = np.append(valid_unique, False)
+    # code -1 (missing) picks the trailing invalid entry
+    return unique_ints[codes], valid_unique[codes]
+
+
+def _split_pairs(values):
+    parts = pd.Series(values).astype(str).str.split('_', n=1, expand=True)
+    if parts.shape[1] != 2:
+        parts[1] = None
+    return parts[0], parts[1]
+
+
+class _Lookup:
+    """Dense code -> column table over the range of known codes."""
+
+    def __init__(self, codes, columns):
+        codes = np.asarray(codes, dtype=np.int64)
+        self.offset = int(codes.min()) if len(codes) else 0
+        size = int(codes.max()) - self.offset + 1 if len(codes) else 0
+        self.table = np.full(size, -1, dtype=np.int32)
+        self.table[codes - self.offset] = columns
+
+    def __call__(self, codes, valid):
+        index = codes - self.offset
+        valid = valid & (index >= 0) & (index < len(self.table))
+        columns = np.full(len(codes), -1, dtype=np.int32)
+        columns[valid] = self.table[index[valid]]
+        return columns
+
+
+class TripFeatureEncoder(BaseEstimator, TransformerMixin):
+    """One-hot encode location IDs and pass numeric columns through, as CSR.
+
+    ``categorical`` names either ``'PU_DO'`` (the pickup/dropoff pair, read
+    from ``PULocationID``/``DOLocationID`` or from a ``PU_DO`` column holding
+    ``'130_205'`` strings or ``130205`` integer keys) or a single location-ID
+    column such as ``'PUlocationID'``.
+    """
+
+    def __init__(
+        self,
+        categorical=(PAIR,),
+        numerical=('trip_distance',),
+        dtype=np.float64,
+        pair_encoding='string',
+        n_buckets=2**12,
+    ):
+        self.categorical = categorical
+        self.numerical = numerical
+        self.dtype = dtype
+        self.pair_encoding = pair_encoding
+        self.n_buckets = n_buckets
+
+    def _pair_codes(self, X):
+        if PAIR not in X:
+            pu, pu_valid = _int_codes(X[PAIR_COLUMNS[0]])
+            do, do_valid = _int_codes(X[PAIR_COLUMNS[1]])
+            return pair_codes(pu, do), pu_valid & do_valid
+        if pd.api.types.is_integer_dtype(pd.Series(X[PAIR])):
+            return _int_codes(X[PAIR])
+        pu, do = _split_pairs(X[PAIR])
+        pu, pu_valid = _int_codes(pu)
+        do, do_valid = _int_codes(do)
+        return pair_codes(pu, do), pu_valid & do_valid
+
+    def _feature_codes(self, X, feature):
+        if feature != PAIR:
+            return _int_codes(X[feature])
+        codes, valid = self._pair_codes(X)
+        if self.pair_encoding == 'hash':
+            codes = hash_buckets(codes, self.n_buckets)
+        return codes, valid
+
+    def _feature_name(self, feature, code):
+        if feature != PAIR:
+            return f'{feature}={code}'
+        if self.pair_encoding == 'string':
+            return f'{PAIR}={code // PAIR_STRIDE}_{code % PAIR_STRIDE}'
+        if self.pair_encoding == 'int':
+            return f'{PAIR}={code}'
+        return f'{PAIR}#{code}'
+
+    @staticmethod
+    def _as_frame(X):
+        if isinstance(X, dict):
+            return pd.DataFrame([X])
+        if isinstance(X, list):
+            return pd.DataFrame(X)
+        return X
+
+    def _set_vocabulary(self, categories, vocabulary):
+        self.categories_ = categories
+        self.vocabulary_ = vocabulary
+        self.feature_names_ = sorted(vocabulary, key=vocabulary.get)
+        self._build_lookups()
+
+    def _build_lookups(self):
+        self._lookups = {}
+        for feature, codes in self.categories_.items():
+            names = [self._feature_name(feature, code) for code in codes]
+            columns = [self.vocabulary_[name] for name in names]
+            self._lookups[feature] = _Lookup(codes, columns)
+
+    def fit(self, X, y=None):
+        if self.pair_encoding not in PAIR_ENCODINGS:
+            raise ValueError(f'pair_encoding must be one of {PAIR_ENCODINGS}, got {self.pair_encoding!r}')
+        X = self._as_frame(X)
+        categories = {}
+        for feature in self.categorical:
+            if feature == PAIR and self.pair_encoding == 'hash':
+                categories[feature] = np.arange(self.n_buckets, dtype=np.int64)
+                continue
+            codes, valid = self._feature_codes(X, feature)
+            categories[feature] = np.unique(codes[valid])
+
+        names = list(self.numerical)
+        for feature, codes in categories.items():
+            names += [self._feature_name(feature, code) for code in codes]
+        names.sort()
+
+        self._set_vocabulary(categories, {name: i for i, name in enumerate(names)})
+        return self
+
+    def transform(self, X):
+        X = self._as_frame(X)
+        n_rows = len(X)
+        if not hasattr(self, '_lookups'):
+            self._build_lookups()
+
+        columns, values = [], []
+        for feature in self.categorical:
+            codes, valid = self._feature_codes(X, feature)
+            columns.append(self._lookups[feature](codes, valid))
+            values.append(np.ones(n_rows, dtype=self.dtype))
+        for feature in self.numerical:
+            columns.append(np.full(n_rows, self.vocabulary_[feature], dtype=np.int32))
+            values.append(X[feature].to_numpy(dtype=self.dtype))
+
+        columns = np.column_stack(columns) if columns else np.empty((n_rows, 0), np.int32)
+        values = np.column_stack(values) if values else np.empty((n_rows, 0), self.dtype)
+
+        # Unknown categories (-1) are dropped; sort the rest so indices are ordered per row
+        present = columns >= 0
+        order = np.argsort(np.where(present, columns, np.iinfo(np.int32).max), axis=1, kind='stable')
+        columns = np.take_along_axis(columns, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        present = np.take_along_axis(present, order, axis=1)
+
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(present.sum(axis=1), out=indptr[1:])
+        return sp.csr_matrix(
+            (values[present], columns[present], indptr),
+            shape=(n_rows, len(self.vocabulary_)),
+            dtype=self.dtype,
+        )
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names_, dtype=object)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lookups', None)
+        return state
+
+    @classmethod
+    def from_dict_vectorizer(cls, dv: DictVectorizer):
+        """Encoder with exactly the columns of a fitted ``DictVectorizer``."""
+        categories, numerical = {}, []
+        for name in dv.feature_names_:
+            if '=' not in name:
+                numerical.append(name)
+                continue
+            feature, value = name.split('=', 1)
+            try:
+                if feature == PAIR:
+                    pu, do = value.split('_')
+                    code = int(pair_codes(int(pu), int(do)))
+                else:
+                    code = int(value)
+            except ValueError as e:
+                raise ValueError(f'{name!r} is not an integer location feature') from e
+            categories.setdefault(feature, []).append(code)
+
+        encoder = cls(categorical=tuple(categories), numerical=tuple(numerical), dtype=dv.dtype)
+        for feature, codes in categories.items():
+            for code in codes:
+                if encoder._feature_name(feature, code) not in dv.vocabulary_:
+                    raise ValueError(f'{feature}={code} is not an integer location feature')
+        encoder._set_vocabulary(
+            {feature: np.asarray(codes, dtype=np.int64) for feature, codes in categories.items()},
+            dict(dv.vocabulary_),
+        )
+        return encoder
+
+    def to_dict_vectorizer(self):
+        """A ``DictVectorizer`` with the same columns, for dict-based callers."""
+        if self.pair_encoding != 'string':
+            raise ValueError(f'a {self.pair_encoding!r} pair encoding has no DictVectorizer equivalent')
+        dv = DictVectorizer(dtype=self.dtype)
+        dv.feature_names_ = list(self.feature_names_)
+        dv.vocabulary_ = dict(self.vocabulary_)
+        return dv
+
+
+def as_encoder(preprocessor):
+    """Encoder for a saved preprocessor, either a DictVectorizer or a TripFeatureEncoder."""
+    if isinstance(preprocessor, TripFeatureEncoder):
+        return preprocessor
+    return TripFeatureEncoder.from_dict_vectorizer(preprocessor)
+
+
+def to_preprocessor(encoder: TripFeatureEncoder):
+    """What to save as dv.pkl / preprocessor.b.
+
+    String-encoded pairs are saved as the equivalent ``DictVectorizer`` so
+    existing consumers keep working; other encodings save the encoder itself,
+    which records the encoding for serving.
+    """
+    if encoder.pair_encoding == 'string':
+        return encoder.to_dict_vectorizer()
+    return encoder
@@ -0,0 +1,240 @@
+"""Download TLC trip files through a local content-addressed mirror.
+
+``Mirror.fetch(url)`` returns the path of a local copy of ``url``:
+
+* files live under ``<root>/objects/<sha256>``, and ``<root>/refs`` maps each
+  URL to the digest it resolved to, so a file that is already mirrored is
+  served without touching the network (``offline=True`` or
+  ``NYC_TAXI_OFFLINE=1`` turns a miss into an error instead of a download);
+* when the server accepts byte ranges, the file is split into
+  ``chunk_size`` ranges that are downloaded concurrently into
+  ``<root>/partial``; finished ranges are recorded with the chunk size, so
+  an interrupted download resumes with only the missing ones;
+* a file lock under ``<root>/locks`` serializes downloads of the same URL,
+  so two processes never write into one partial file: the second waits
+  and is served the first one's copy;
+* the result is checked against the Content-Length, the ETag when it is a
+  plain MD5 (as for S3/CloudFront objects) and an optional expected SHA-256
+  before it enters the mirror.
+
+The mirror defaults to ``NYC_TAXI_MIRROR`` or ``~/.cache/nyc_taxi/mirror``.
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are not locked
+    fcntl = None
+
+import requests
+
+TRIP_DATA_URL = 'https://d37ci6vzurychx.cloudfront.net/trip-data/{filename}'
+DEFAULT_MIRROR = os.path.join('~', '.cache', 'nyc_taxi', 'mirror')
+
+_MD5 = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChecksumError(ValueError):
+    pass
+
+
+def trip_data_url(filename):
+    return TRIP_DATA_URL.format(filename=filename)
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _digests(path, chunk_size=2**20):
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(chunk_size), b''):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+class Mirror:
+    def __init__(self, root=None, workers=4, chunk_size=8 * 2**20, offline=None, timeout=60, session=None):
+        root = root or os.getenv('NYC_TAXI_MIRROR', DEFAULT_MIRROR)
+        self.root = os.path.expanduser(root)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.offline = os.getenv('NYC_TAXI_OFFLINE') == '1' if offline is None else offline
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _object(self, sha256):
+        return self._path('objects', sha256[:2], sha256)
+
+    def _ref(self, url):
+        return self._path('refs', f'{_url_key(url)}.json')
+
+    def lookup(self, url):
+        """Path of the mirrored copy of ``url``, or None."""
+        try:
+            with open(self._ref(url)) as f_in:
+                ref = json.load(f_in)
+        except FileNotFoundError:
+            return None
+        path = self._object(ref['sha256'])
+        if os.path.exists(path) and os.path.getsize(path) == ref['size']:
+            return path
+        return None
+
+    def fetch(self, url, sha256=None, progress=None):
+        """Local path of ``url``, downloading it into the mirror if needed.
+
+        ``progress`` is called with the number of bytes of each received block.
+        """
+        path = self.lookup(url)
+        if path is None:
+            if self.offline:
+                raise FileNotFoundError(f'{url} is not mirrored in {self.root} and downloads are disabled')
+            with self._locked(url):
+                # another process may have mirrored it while we waited for the lock
+                path = self.lookup(url)
+                if path is None:
+                    return self._download(url, sha256, progress)
+        if sha256 is not None and _digests(path)[0] != sha256:
+            raise ChecksumError(f'mirrored {url} does not match sha256 {sha256}')
+        return path
+
+    @contextmanager
+    def _locked(self, url):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self._path('locks'), exist_ok=True)
+        # the lock files stay behind: removing one could let two holders in
+        with open(self._path('locks', f'{_url_key(url)}.lock'), 'w') as f_lock:
+            fcntl.flock(f_lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f_lock, fcntl.LOCK_UN)
+
+    def fetch_to(self, url, directory, sha256=None, progress=None):
+        """Copy of ``url`` at ``directory/<file name>``, for code that expects a path there."""
+        source = self.fetch(url, sha256, progress)
+        os.makedirs(directory, exist_ok=True)
+        dest = os.path.join(directory, url.rsplit('/', 1)[-1])
+        if not (os.path.exists(dest) and os.path.getsize(dest) == os.path.getsize(source)):
+            shutil.copyfile(source, dest + '.tmp')
+            os.replace(dest + '.tmp', dest)
+        return dest
+
+    def _download(self, url, sha256, progress):
+        head = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        head.raise_for_status()
+        size = int(head.headers.get('Content-Length', 0)) or None
+        etag = head.headers.get('ETag', '').strip('"')
+        ranged = head.headers.get('Accept-Ranges') == 'bytes' and size is not None
+
+        os.makedirs(self._path('partial'), exist_ok=True)
+        part = self._path('partial', f'{_url_key(url)}.part')
+        state_path = part + '.json'
+        state = {'size': size, 'etag': etag, 'chunk_size': self.chunk_size, 'done': []}
+        if os.path.exists(state_path) and os.path.exists(part):
+            with open(state_path) as f_in:
+                previous = json.load(f_in)
+            # Resume only if the remote file is still the one we started on, and the
+            # recorded range indices mean the same byte ranges
+            if all(previous.get(key) == state[key] for key in ('size', 'etag', 'chunk_size')):
+                state = previous
+
+        if ranged:
+            self._download_ranges(url, part, state, state_path, progress)
+        else:
+            self._download_stream(url, part, progress)
+
+        actual_sha256, md5 = _digests(part)
+        problem = None
+        if size is not None and os.path.getsize(part) != size:
+            problem = f'{os.path.getsize(part)} bytes instead of {size}'
+        elif _MD5.match(etag) and md5 != etag:
+            problem = f'md5 {md5} does not match the ETag {etag}'
+        elif sha256 is not None and actual_sha256 != sha256:
+            problem = f'sha256 {actual_sha256} instead of {sha256}'
+        if problem:
+            for path in (part, state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise ChecksumError(f'download of {url} is corrupt: {problem}')
+
+        path = self._object(actual_sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(part, path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        os.makedirs(self._path('refs'), exist_ok=True)
+        with open(self._ref(url) + '.tmp', 'w') as f_out:
+            json.dump({'url': url, 'sha256': actual_sha256, 'size': os.path.getsize(path), 'etag': etag}, f_out)
+        os.replace(self._ref(url) + '.tmp', self._ref(url))
+        return path
+
+    def _download_stream(self, url, part, progress):
+        with self.session.get(url, stream=True, timeout=self.timeout) as r:
+            r.raise_for_status()
+            with open(part, 'wb') as f_out:
+                for block in r.iter_content(chunk_size=2**20):
+                    f_out.write(block)
+                    if progress:
+                        progress(len(block))
+
+    def _download_ranges(self, url, part, state, state_path, progress):
+        size = state['size']
+        ranges = [(start, min(start + self.chunk_size, size) - 1) for start in range(0, size, self.chunk_size)]
+        done = set(state['done'])
+        if progress:
+            progress(sum(end - start + 1 for i, (start, end) in enumerate(ranges) if i in done))
+
+        with open(part, 'ab') as f_out:
+            f_out.truncate(size)
+        lock = threading.Lock()
+
+        def fetch_range(i):
+            start, end = ranges[i]
+            headers = {'Range': f'bytes={start}-{end}'}
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise IOError(f'{url} ignored the range request')
+                with open(part, 'r+b') as f_out:
+                    f_out.seek(start)
+                    for block in r.iter_content(chunk_size=2**20):
+                        f_out.write(block)
+                        if progress:
+                            progress(len(block))
+            with lock:
+                done.add(i)
+                state['done'] = sorted(done)
+                with open(state_path, 'w') as f_state:
+                    json.dump(state, f_state)
+
+        todo = [i for i in range(len(ranges)) if i not in done]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # list() re-raises the first failed range; finished ones stay recorded
+            list(pool.map(fetch_range, todo))
+
+
+def fetch(url, **kwargs):
+    """``Mirror().fetch(url)`` with the default mirror."""
+    return Mirror().fetch(url, **kwargs)
+
+
+def fetch_to(url, directory, **kwargs):
+    """``Mirror().fetch_to(url, directory)`` with the default mirror."""
+    return Mirror().fetch_to(url, directory, **kwargs)
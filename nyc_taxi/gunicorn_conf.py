@@ -0,0 +1,82 @@
+"""gunicorn settings for the prediction services: load the model once, share it.
+
+    gunicorn -c python:nyc_taxi.gunicorn_conf --bind=0.0.0.0:9696 app:app
+
+``predict.py`` and ``prediction_service/app.py`` unpickle ``(dv, model)`` at
+import. With ``preload_app`` the master imports the app once and forks the
+workers from it, so they share the model's pages copy-on-write. Before the
+first fork the master moves everything loaded so far out of the cyclic
+GC's reach (``gc.freeze()``): otherwise a collection in a worker writes to
+the inherited objects' headers and unshares their pages.
+
+Workers come from ``WEB_CONCURRENCY`` (gunicorn's own default) or the CPU
+count; ``--max-requests``/``--max-requests-jitter`` recycle them and
+``kill -HUP`` restarts them gracefully, as usual with gunicorn.
+
+Each worker serves requests on ``GUNICORN_THREADS`` threads (gthread).
+A sync worker handles one request at a time, so the micro-batcher would
+only ever see batches of one; the threads therefore default to, and never
+go below, ``PREDICT_MAX_BATCH``, enough to fill a whole batch.
+
+Anything that must not cross a fork -- open connections, threads -- has to
+be created lazily in the worker (``MongoClient(connect=False)``, the
+micro-batcher's thread).
+
+Model reloads (``nyc_taxi.reload``) happen in the master, so the workers
+keep sharing the model after it changes: a thread there polls the
+watchers and sends the master SIGHUP on a new version, and ``on_reload``
+loads it before gunicorn forks the new workers and retires the old ones.
+``kill -HUP`` after replacing the model file does the same by hand.
+
+Metrics use prometheus_client's multiprocess mode, so a scrape reports
+all workers rather than whichever one answered: every process writes its
+samples to files in ``PROMETHEUS_MULTIPROC_DIR`` (set here unless given,
+before the app creates its metrics) and the app serves ``/metrics`` from a
+``MultiProcessCollector`` over that directory. Samples left there by a
+previous run are removed at start, and the files of an exited worker are
+marked dead.
+"""
+import gc
+import os
+import glob
+import signal
+import tempfile
+
+from nyc_taxi.microbatch import DEFAULT_MAX_BATCH
+from nyc_taxi.reload import reload_in_master, reload_watchers
+
+preload_app = True
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+worker_class = 'gthread'
+_max_batch = int(os.getenv('PREDICT_MAX_BATCH', DEFAULT_MAX_BATCH))
+threads = max(int(os.getenv('GUNICORN_THREADS', _max_batch)), _max_batch)
+
+_metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus'))
+os.makedirs(_metrics_dir, exist_ok=True)
+for _path in glob.glob(os.path.join(_metrics_dir, '*.db')):
+    os.remove(_path)
+
+
+def when_ready(server):
+    # runs in the master after the preloaded import, before any worker is forked
+    reload_in_master(restart=lambda: os.kill(os.getpid(), signal.SIGHUP))
+    gc.collect()
+    gc.freeze()
+
+
+def on_reload(server):
+    # SIGHUP, from the model poller or by hand after a deploy: load new models here,
+    # before gunicorn forks the replacement workers from the master
+    if reload_watchers():
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:  # a service without metrics
+        return
+    multiprocess.mark_process_dead(worker.pid)
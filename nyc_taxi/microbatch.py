@@ -0,0 +1,136 @@
+"""Server-side micro-batching of single-ride predictions.
+
+Clients such as ``05-monitoring/send_data.py`` post one ride per request,
+while ``dv.transform`` + ``model.predict`` cost about the same for one row
+as for a hundred. ``MicroBatcher`` sits between the request threads and
+the model: each request submits its ride and blocks on a future, and one
+background thread takes the queued rides and scores them with a single
+``predict_many(items)`` call.
+
+Batches adapt to the load. A batch is closed as soon as it holds every
+request that is waiting for a prediction, since waiting longer would only
+delay them; otherwise when it has ``max_batch`` items or ``max_wait_ms``
+after its first item was queued. A lone request is scored right away, and
+under load the rides that pile up while one batch is scored form the next.
+
+If ``predict_many`` raises, the batch's items are scored one by one so the
+exception only reaches the request that caused it.
+
+``PREDICT_MAX_WAIT_MS`` (default 2) and ``PREDICT_MAX_BATCH`` (default 64)
+configure the defaults; ``on_batch(size, queue_waits)`` is called after
+every batch for metrics.
+"""
+import os
+import queue
+import threading
+from time import monotonic
+from concurrent.futures import Future
+
+DEFAULT_MAX_WAIT_MS = 2.0
+DEFAULT_MAX_BATCH = 64
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, predict_many, max_wait_ms=None, max_batch=None, on_batch=None):
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv('PREDICT_MAX_WAIT_MS', DEFAULT_MAX_WAIT_MS))
+        if max_batch is None:
+            max_batch = int(os.getenv('PREDICT_MAX_BATCH', DEFAULT_MAX_BATCH))
+        if max_batch < 1 or max_wait_ms < 0:
+            raise ValueError(f'max_batch must be >= 1 and max_wait_ms >= 0, got {max_batch} and {max_wait_ms}')
+        self.predict_many = predict_many
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.on_batch = on_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        # submitted but not yet taken into a batch, counting rides still on their way into the queue
+        self._outstanding = 0
+
+    def _ensure_started(self):
+        # Started on first use, and again in a forked child, which inherits no threads
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._outstanding = 0
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, item):
+        """A future for the prediction of ``item``."""
+        if self._closed:
+            raise RuntimeError('the micro-batcher is closed')
+        self._ensure_started()
+        future = Future()
+        with self._lock:
+            self._outstanding += 1
+        self._queue.put((item, future, monotonic()))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        """Score what is queued, then stop the background thread."""
+        self._closed = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self):
+        """The next batch, and whether the batcher was closed while collecting it."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < min(self.max_batch, self._outstanding):
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._score(batch)
+
+    def _score(self, batch):
+        started = monotonic()
+        with self._lock:
+            self._outstanding -= len(batch)
+        items = [item for item, _, _ in batch]
+        try:
+            predictions = list(self.predict_many(items))
+            if len(predictions) != len(items):
+                raise ValueError(f'predict_many returned {len(predictions)} predictions for {len(items)} items')
+        except Exception:
+            for item, future, _ in batch:
+                try:
+                    future.set_result(self.predict_many([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+        else:
+            for (_, future, _), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+        if self.on_batch is not None:
+            self.on_batch(len(batch), [started - enqueued for _, _, enqueued in batch])
@@ -0,0 +1,199 @@
+"""Local on-disk cache of MLflow model artifacts.
+
+Every batch job and service start used to fetch its model from
+``s3://mlflow-artifacts-remote433/...`` again. ``ModelCache.path(uri)``
+downloads an artifact directory once into ``<root>/<key>/artifacts``, with
+the key derived from the URI (bucket, experiment, run ID and artifact path),
+and later calls return the local copy:
+
+* a ``manifest.json`` records the size and SHA-256 of every file; entries
+  are checked against it before use (sizes by default, ``verify='hash'``
+  re-hashes) and re-downloaded if they do not match;
+* entries are evicted least recently used first once the cache grows past
+  ``max_bytes``;
+* ``offline=True`` (``MODEL_CACHE_OFFLINE=1``) serves cached entries and
+  raises instead of downloading.
+
+Local paths are returned as they are. Only cache immutable URIs -- run
+artifacts, not ``models:/<name>/<stage>``, whose target moves.
+
+``MODEL_CACHE_DIR`` (default ``~/.cache/nyc_taxi/models``),
+``MODEL_CACHE_MAX_MB``, ``MODEL_CACHE_VERIFY`` and ``MODEL_CACHE_OFFLINE``
+configure the default cache used by ``load_model``.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from urllib.parse import urlparse
+
+DEFAULT_ROOT = os.path.join('~', '.cache', 'nyc_taxi', 'models')
+DEFAULT_MAX_MB = 2048
+VERIFY = ('size', 'hash')
+MANIFEST = 'manifest.json'
+
+
+def _download_with_mlflow(uri, dst_path):
+    import mlflow.artifacts
+    return mlflow.artifacts.download_artifacts(artifact_uri=uri, dst_path=dst_path)
+
+
+def _download_file(uri, dst_path):
+    # A single S3 object (a model bundle) comes straight from boto3: importing mlflow
+    # would cost more than the download, on every start with an empty cache
+    parsed = urlparse(uri)
+    if parsed.scheme != 's3':
+        return _download_with_mlflow(uri, dst_path)
+    import boto3
+    path = os.path.join(dst_path, os.path.basename(parsed.path))
+    # the same endpoint override as mlflow's S3 artifact store
+    s3 = boto3.client('s3', endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL'))
+    s3.download_file(parsed.netloc, parsed.path.lstrip('/'), path)
+    return path
+
+
+def is_remote(uri):
+    scheme = urlparse(uri).scheme
+    # one-letter schemes are Windows drive letters
+    return len(scheme) > 1 and scheme != 'file'
+
+
+def _hash_file(path, chunk_size=2**20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest(directory):
+    files = {}
+    for parent, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(parent, name)
+            files[os.path.relpath(path, directory)] = {'size': os.path.getsize(path), 'sha256': _hash_file(path)}
+    return files
+
+
+class ModelCache:
+    def __init__(self, root=None, max_bytes=None, verify=None, offline=None, download=None):
+        self.root = os.path.expanduser(root or os.getenv('MODEL_CACHE_DIR', DEFAULT_ROOT))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('MODEL_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 2**20)
+        self.max_bytes = max_bytes
+        self.verify = verify or os.getenv('MODEL_CACHE_VERIFY', 'size')
+        if self.verify not in VERIFY:
+            raise ValueError(f'verify must be one of {VERIFY}, got {self.verify!r}')
+        self.offline = os.getenv('MODEL_CACHE_OFFLINE') == '1' if offline is None else offline
+        # download(uri, dst_path) -> local path; an S3 stand-in or a copy in tests
+        self.download = download or _download_with_mlflow
+
+    def key(self, uri):
+        return hashlib.sha256(uri.rstrip('/').encode()).hexdigest()[:32]
+
+    def _entry(self, uri):
+        return os.path.join(self.root, self.key(uri))
+
+    def _is_valid(self, entry):
+        try:
+            with open(os.path.join(entry, MANIFEST)) as f_in:
+                manifest = json.load(f_in)
+        except (FileNotFoundError, ValueError):
+            return False
+        artifacts = os.path.join(entry, 'artifacts')
+        for name, expected in manifest['files'].items():
+            path = os.path.join(artifacts, name)
+            if not os.path.isfile(path) or os.path.getsize(path) != expected['size']:
+                return False
+            if self.verify == 'hash' and _hash_file(path) != expected['sha256']:
+                return False
+        return True
+
+    def path(self, uri):
+        """Local directory holding the artifacts at ``uri``."""
+        if not is_remote(uri):
+            return uri
+        entry = self._entry(uri)
+        if self._is_valid(entry):
+            # the manifest's mtime is the entry's last use, for LRU eviction
+            os.utime(os.path.join(entry, MANIFEST))
+            return os.path.join(entry, 'artifacts')
+        if self.offline:
+            raise FileNotFoundError(f'{uri} is not in the model cache at {self.root} and downloads are disabled')
+        return self._store(uri, entry)
+
+    def _store(self, uri, entry):
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.download-', dir=self.root)
+        try:
+            downloaded = self.download(uri, staging)
+            artifacts = os.path.join(staging, 'artifacts')
+            if os.path.isdir(downloaded):
+                os.rename(downloaded, artifacts)
+            else:
+                os.makedirs(artifacts)
+                os.rename(downloaded, os.path.join(artifacts, os.path.basename(downloaded)))
+            files = _manifest(artifacts)
+            with open(os.path.join(staging, MANIFEST), 'w') as f_out:
+                json.dump({'uri': uri, 'files': files, 'size': sum(f['size'] for f in files.values())}, f_out)
+            # A broken entry is replaced as a whole; the rename keeps readers from seeing half of one
+            if not self._is_valid(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # another process (e.g. a backfill worker) stored the same model first
+                if not self._is_valid(entry):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict(keep=entry)
+        return os.path.join(entry, 'artifacts')
+
+    def entries(self):
+        """``(last_used, size, directory)`` of every complete entry, least recently used first."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in os.listdir(self.root):
+            manifest = os.path.join(self.root, name, MANIFEST)
+            try:
+                with open(manifest) as f_in:
+                    size = json.load(f_in)['size']
+                entries.append((os.path.getmtime(manifest), size, os.path.join(self.root, name)))
+            except (FileNotFoundError, NotADirectoryError, ValueError):
+                continue
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, directory in entries:
+            if total <= self.max_bytes:
+                break
+            if directory == keep:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+
+
+def load_model(uri, flavor='pyfunc', cache=None):
+    """``mlflow.<flavor>.load_model`` from the local copy of ``uri``.
+
+    ``flavor='bundle'`` loads an ``.npz`` exported by ``nyc_taxi.bundle``
+    without importing mlflow; an ``s3://`` bundle is downloaded with boto3.
+    """
+    if flavor == 'bundle':
+        from nyc_taxi.bundle import load_bundle
+        local_path = (cache or ModelCache(download=_download_file)).path(uri)
+        if os.path.isdir(local_path):
+            # a single remote file is cached as artifacts/<name>
+            local_path = os.path.join(local_path, os.path.basename(uri.rstrip('/')))
+        return load_bundle(local_path)
+    local_path = (cache or ModelCache()).path(uri)
+    import mlflow
+    if flavor == 'sklearn':
+        import mlflow.sklearn
+        return mlflow.sklearn.load_model(local_path)
+    return mlflow.pyfunc.load_model(local_path)
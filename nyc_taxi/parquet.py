@@ -0,0 +1,319 @@
+"""Column-pruned Parquet reads of NYC TLC trip files.
+
+The trip files carry ~20 columns, but the duration model only needs the
+location IDs, the trip distance and the two timestamps. ``read_trips`` reads
+just those column chunks, skips row groups whose statistics cannot satisfy
+the filters, and reports how much of the file it actually touched;
+``iter_trips`` streams the same columns in bounded batches. Both index the
+rows by their position in the file, filtered or not.
+"""
+import io
+import os
+import sys
+import resource
+import operator
+from datetime import datetime
+from dataclasses import dataclass
+
+import numpy as np
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from nyc_taxi.trips import CATEGORICAL, PICKUP_DROPOFF_COLUMNS
+
+MODEL_COLUMNS = CATEGORICAL + ['trip_distance']
+
+_COMPARE = {
+    '==': (operator.eq, pc.equal),
+    '!=': (operator.ne, pc.not_equal),
+    '<': (operator.lt, pc.less),
+    '<=': (operator.le, pc.less_equal),
+    '>': (operator.gt, pc.greater),
+    '>=': (operator.ge, pc.greater_equal),
+}
+
+
+@dataclass
+class ReadStats:
+    file_bytes: int = 0
+    bytes_read: int = 0
+    row_groups_read: int = 0
+    row_groups_total: int = 0
+    rows: int = 0
+    table_bytes: int = 0
+    rss_delta: int = 0
+
+    def __str__(self):
+        fraction = self.bytes_read / self.file_bytes if self.file_bytes else 0
+        return (
+            f'{self.rows} rows, {self.bytes_read / 2**20:.1f} of '
+            f'{self.file_bytes / 2**20:.1f} MiB read ({fraction:.0%}), '
+            f'{self.row_groups_read}/{self.row_groups_total} row groups, '
+            f'table {self.table_bytes / 2**20:.1f} MiB, '
+            f'peak RSS +{self.rss_delta / 2**20:.0f} MiB'
+        )
+
+
+class _CountingFile(io.RawIOBase):
+    """Wrap a binary file and count the bytes pyarrow pulls through it."""
+
+    def __init__(self, raw):
+        super().__init__()
+        self._raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+def _open(source, storage_options=None):
+    if hasattr(source, 'read'):
+        return source
+    if source.startswith(('http://', 'https://', 's3://')):
+        try:
+            import fsspec
+            return fsspec.open(source, 'rb', **(storage_options or {})).open()
+        except ImportError:
+            if source.startswith('s3://'):
+                raise
+        # Without fsspec the whole object has to come over the wire first
+        import requests
+        r = requests.get(source, timeout=300)
+        r.raise_for_status()
+        return io.BytesIO(r.content)
+    return open(source, 'rb')
+
+
+def _file_size(f):
+    position = f.tell()
+    size = f.seek(0, io.SEEK_END)
+    f.seek(position)
+    return size
+
+
+def _status_bytes(field):
+    with open('/proc/self/status') as f_in:
+        for line in f_in:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    raise OSError(f'no {field} in /proc/self/status')
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, since the last ``reset_peak_rss``."""
+    try:
+        return _status_bytes('VmHWM')
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def reset_peak_rss():
+    """Start measuring the peak from the current RSS; the baseline in bytes.
+
+    Linux resets the high-water mark through ``/proc/self/clear_refs``.
+    Elsewhere the peak stays the process-lifetime one, so a read's delta
+    only shows when it raises that peak.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f_out:
+            f_out.write('5')
+        return _status_bytes('VmRSS')
+    except OSError:
+        return peak_rss()
+
+
+def default_columns(schema_names):
+    """Model columns plus whichever pickup/dropoff pair the file uses."""
+    columns = [c for c in MODEL_COLUMNS if c in schema_names]
+    for pickup, dropoff in PICKUP_DROPOFF_COLUMNS.values():
+        if pickup in schema_names and dropoff in schema_names:
+            columns += [pickup, dropoff]
+            break
+    return columns
+
+
+def _row_group_may_match(row_group, names, filters):
+    for column, op, value in filters:
+        if column not in names:
+            continue
+        statistics = row_group.column(names.index(column)).statistics
+        if statistics is None or not statistics.has_min_max:
+            continue
+        low, high = statistics.min, statistics.max
+        try:
+            if op == 'in':
+                if not any(low <= v <= high for v in value):
+                    return False
+            elif op == '==' and not low <= value <= high:
+                return False
+            elif op in ('<', '<=') and not _COMPARE[op][0](low, value):
+                return False
+            elif op in ('>', '>=') and not _COMPARE[op][0](high, value):
+                return False
+        except TypeError:
+            # statistics not comparable with the filter value, read the group
+            continue
+    return True
+
+
+def pickup_window(taxi_type, year, month):
+    """Filters keeping the rides picked up in ``year``/``month``.
+
+    TLC monthly files carry a few rides from other months (and years); these
+    filters drop them, and row groups outside the month are never read.
+    """
+    pickup, _ = PICKUP_DROPOFF_COLUMNS[taxi_type]
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return [(pickup, '>=', start), (pickup, '<', end)]
+
+
+def _filter_mask(table, filters):
+    mask = None
+    for column, op, value in filters:
+        if op == 'in':
+            condition = pc.is_in(table[column], value_set=pa.array(value))
+        else:
+            condition = _COMPARE[op][1](table[column], pa.scalar(value))
+        mask = condition if mask is None else pc.and_(mask, condition)
+    # a null never matches
+    return pc.fill_null(mask, False)
+
+
+def read_table(source, columns=None, filters=None, storage_options=None):
+    """Read the requested columns of a trip file as an Arrow table.
+
+    ``filters`` is a list of ``(column, op, value)`` tuples combined with AND,
+    with ``op`` one of ``== != < <= > >= in``. Row groups whose min/max
+    statistics rule out a match are never read; the surviving rows are then
+    filtered exactly. Returns the table and its ``ReadStats``.
+    """
+    baseline = reset_peak_rss()
+    table, _, stats = _read(source, columns, filters, storage_options)
+    stats.rss_delta = peak_rss() - baseline
+    return table, stats
+
+
+def _read(source, columns, filters, storage_options):
+    filters = list(filters or [])
+    with _CountingFile(_open(source, storage_options)) as f:
+        stats = ReadStats(file_bytes=_file_size(f))
+        parquet_file = pq.ParquetFile(f)
+        metadata = parquet_file.metadata
+        names = parquet_file.schema_arrow.names
+
+        if columns is None:
+            columns = default_columns(names)
+        filter_columns = [c for c, _, _ in filters if c not in columns]
+
+        row_groups = [
+            i for i in range(metadata.num_row_groups)
+            if _row_group_may_match(metadata.row_group(i), names, filters)
+        ]
+        table = parquet_file.read_row_groups(row_groups, columns=columns + filter_columns)
+        positions = _positions(metadata, row_groups) if filters else None
+
+        stats.bytes_read = f.bytes_read
+        stats.row_groups_read = len(row_groups)
+        stats.row_groups_total = metadata.num_row_groups
+
+    if filters:
+        mask = _filter_mask(table, filters)
+        table = table.filter(mask).select(columns)
+        positions = positions[mask.to_numpy(zero_copy_only=False)]
+
+    stats.rows = table.num_rows
+    stats.table_bytes = table.nbytes
+    return table, positions, stats
+
+
+def _positions(metadata, row_groups):
+    """Positions in the file of the rows of ``row_groups``."""
+    starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    if not row_groups:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(starts[i], starts[i + 1]) for i in row_groups])
+
+
+def read_trips(source, columns=None, filters=None, storage_options=None):
+    """``read_table`` converted to pandas. Returns the DataFrame and its ``ReadStats``."""
+    baseline = reset_peak_rss()
+    table, positions, stats = _read(source, columns, filters, storage_options)
+    df = table.to_pandas()
+    if filters:
+        df.index = pd.Index(positions)
+    # the conversion to pandas counts towards the read
+    stats.rss_delta = peak_rss() - baseline
+    return df, stats
+
+
+def iter_trips(source, columns=None, batch_size=65_536, filters=None, storage_options=None):
+    """Stream the requested columns of a trip file as DataFrames of at most ``batch_size`` rows.
+
+    Only the current batch is decoded at a time, so memory stays bounded
+    whatever the size of the file. Each frame is indexed by the rows'
+    positions in the file, like ``read_trips`` on the whole file, and
+    ``filters`` select the same rows.
+    """
+    filters = list(filters or [])
+    with _open(source, storage_options) as f:
+        parquet_file = pq.ParquetFile(f)
+        metadata = parquet_file.metadata
+        names = parquet_file.schema_arrow.names
+        if columns is None:
+            columns = default_columns(names)
+        filter_columns = [c for c, _, _ in filters if c not in columns]
+        row_groups = [
+            i for i in range(metadata.num_row_groups)
+            if _row_group_may_match(metadata.row_group(i), names, filters)
+        ]
+        positions = _positions(metadata, row_groups) if filters else None
+        offset = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups,
+                                               columns=columns + filter_columns):
+            start, offset = offset, offset + batch.num_rows
+            if filters:
+                mask = _filter_mask(batch, filters)
+                index = pd.Index(positions[start:offset][mask.to_numpy(zero_copy_only=False)])
+                batch = batch.filter(mask).select(columns)
+            else:
+                index = pd.RangeIndex(start, offset)
+            df = batch.to_pandas()
+            df.index = index
+            yield df
+
+
+def storage_options_from_env():
+    """fsspec options for a custom S3 endpoint, e.g. Localstack."""
+    endpoint_url = os.getenv('S3_ENDPOINT_URL')
+    if endpoint_url is None:
+        return None
+    return {'client_kwargs': {'endpoint_url': endpoint_url}}
@@ -0,0 +1,109 @@
+"""Stop unpromising XGBoost hyperopt trials after a few boosting rounds.
+
+A pruner sees the validation curve of the running trial after every round
+and decides whether it is still worth training:
+
+* ``MedianPruner`` -- prune when the trial's best score so far is worse than
+  the median of the completed trials' best scores after as many rounds;
+* ``SuccessiveHalvingPruner`` -- at rounds ``min_rounds * reduction_factor**k``
+  only the best ``1 / reduction_factor`` of the trials that reached that rung
+  go on.
+
+``pruning_callback`` plugs a pruner into ``xgb.train``; the objective then
+reports a pruned trial to hyperopt as ``STATUS_FAIL`` with ``pruned=True``,
+so it does not count as a result but the trial budget moves on. Scores are
+losses (lower is better), as for the ``rmse`` metric.
+"""
+import numpy as np
+
+PRUNERS = ('median', 'halving', 'none')
+
+
+class MedianPruner:
+    def __init__(self, n_startup_trials=3, n_warmup_rounds=5, interval=1):
+        self.n_startup_trials = n_startup_trials
+        self.n_warmup_rounds = n_warmup_rounds
+        self.interval = interval
+        self._completed = []
+
+    def report(self, curve):
+        """Whether to prune a trial whose validation scores so far are ``curve``."""
+        step = len(curve) - 1
+        if len(self._completed) < self.n_startup_trials or step < self.n_warmup_rounds:
+            return False
+        if (step - self.n_warmup_rounds) % self.interval:
+            return False
+        # Trials that stopped early keep their final best score
+        others = [np.min(completed[:step + 1]) for completed in self._completed]
+        return np.min(curve) > np.median(others)
+
+    def complete(self, curve):
+        self._completed.append(list(curve))
+
+
+class SuccessiveHalvingPruner:
+    def __init__(self, min_rounds=5, reduction_factor=3):
+        self.min_rounds = min_rounds
+        self.reduction_factor = reduction_factor
+        self._rungs = {}
+
+    def _is_rung(self, rounds):
+        rung = self.min_rounds
+        while rung < rounds:
+            rung *= self.reduction_factor
+        return rung == rounds
+
+    def report(self, curve):
+        rounds = len(curve)
+        if not self._is_rung(rounds):
+            return False
+        scores = self._rungs.setdefault(rounds, [])
+        score = np.min(curve)
+        scores.append(score)
+        n_promoted = max(1, len(scores) // self.reduction_factor)
+        return score > sorted(scores)[n_promoted - 1]
+
+    def complete(self, curve):
+        pass
+
+
+def make_pruner(name, **kwargs):
+    """The pruner called ``name`` (one of ``PRUNERS``), or None for ``'none'``."""
+    if name == 'median':
+        return MedianPruner(**kwargs)
+    if name == 'halving':
+        return SuccessiveHalvingPruner(**kwargs)
+    if name == 'none':
+        return None
+    raise ValueError(f'pruner must be one of {PRUNERS}, got {name!r}')
+
+
+def pruning_callback(pruner, data_name='validation', metric=None):
+    """An ``xgb.train`` callback that stops the trial when ``pruner`` says so.
+
+    ``metric`` defaults to the last evaluation metric, the one XGBoost's own
+    early stopping watches. After training, ``callback.pruned`` tells whether
+    the trial was cut short and ``callback.curve`` holds its scores. With
+    ``pruner=None`` the callback only records the curve.
+    """
+    import xgboost as xgb
+
+    class PruningCallback(xgb.callback.TrainingCallback):
+        def __init__(self):
+            super().__init__()
+            self.pruned = False
+            self.curve = []
+
+        def after_iteration(self, model, epoch, evals_log):
+            scores = evals_log[data_name]
+            self.curve = list(scores[metric] if metric else list(scores.values())[-1])
+            if pruner is not None:
+                self.pruned = pruner.report(self.curve)
+            return self.pruned
+
+        def after_training(self, model):
+            if pruner is not None and not self.pruned:
+                pruner.complete(self.curve)
+            return model
+
+    return PruningCallback()
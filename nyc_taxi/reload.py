@@ -0,0 +1,244 @@
+"""Hot model reload for the prediction services.
+
+The services used to read ``MODEL_FILE`` once at import, so a new model
+meant a restart and cold caches. ``ModelWatcher`` keeps the current model
+in an immutable ``Loaded`` snapshot and polls a version token every
+``interval`` seconds on a background thread:
+
+* ``watch_file(path)`` -- the file's mtime and size; deploy by writing the
+  new file next to the old one and renaming it into place;
+* ``watch_registry(name, stage)`` -- the latest MLflow registry version in
+  ``stage``, loaded through the model cache.
+
+When the token changes, the new model is loaded and warmed up (``warm``
+runs a prediction, so first-call costs are paid off the request path) on
+the watcher thread, and only then swapped in with a single attribute
+assignment. A request reads ``watcher.current`` once and uses that
+snapshot throughout, so it never mixes two models or sees one half
+loaded. A load that fails is logged and the old model keeps serving until
+the token changes again. The replaced model is released on the watcher
+thread one poll later, so freeing it never lands on a request.
+
+``MODEL_RELOAD_INTERVAL`` (seconds, default 30, ``0`` disables polling)
+sets the default interval. Like the micro-batcher, the thread starts on
+first use in each process.
+
+Under a pre-forking server (gunicorn with ``nyc_taxi.gunicorn_conf``) a
+model loaded in every worker would be a private copy per worker, undoing
+the copy-on-write sharing of the preloaded one. There the master calls
+``reload_in_master``: the workers stop watching, one thread in the master
+polls every watcher and calls ``restart`` (a SIGHUP to the master) when a
+version changes, and the server's reload hook calls ``reload_watchers``
+to load the new model in the master before the new workers are forked
+from it. The old workers finish their requests with the old model, so
+the swap is a rolling restart, and the workers share the new model.
+"""
+import os
+import pickle
+import logging
+import weakref
+import threading
+from datetime import datetime, timezone
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 30
+
+Loaded = namedtuple('Loaded', ['model', 'version', 'label'])
+
+# Every watcher of this process, for a pre-forking server's master (``reload_in_master``)
+_watchers = weakref.WeakSet()
+# Set in the master by ``reload_in_master``; the workers forked from it inherit it and leave reloads to it
+_master_reloads = False
+
+
+class ModelWatcher:
+    def __init__(self, version, load, label=str, warm=None, interval=None, name='model'):
+        """``version()`` returns a token that changes with the model, ``load(token)`` loads it."""
+        self.version = version
+        self.load = load
+        self.label = label
+        self.warm = warm
+        self.interval = float(os.getenv('MODEL_RELOAD_INTERVAL', DEFAULT_INTERVAL)) if interval is None else interval
+        self.name = name
+        self._failed = None
+        self._retired = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        token = version()
+        # the first load happens at import, like before, and fails loudly
+        self._current = self._load(token)
+        _watchers.add(self)
+
+    def _load(self, token):
+        model = self.load(token)
+        if self.warm is not None:
+            self.warm(model)
+        return Loaded(model, token, self.label(token))
+
+    @property
+    def current(self):
+        """The model snapshot to use for one request or batch."""
+        self._ensure_started()
+        return self._current
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() or not self.interval or _master_reloads:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name=f'{self.name}-watcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception('checking for a new %s failed', self.name)
+
+    def pending(self):
+        """The version token to load next, or None if the current model is up to date."""
+        token = self.version()
+        if token is None or token == self._current.version or token == self._failed:
+            return None
+        return token
+
+    def check(self):
+        """Load and swap in the model if its version changed; whether it did."""
+        # drop the model replaced last time, now that requests using it are done
+        self._retired = None
+        token = self.pending()
+        if token is None:
+            return False
+        try:
+            loaded = self._load(token)
+        except Exception:
+            logger.exception('loading %s %s failed, still serving %s', self.name, self.label(token), self._current.label)
+            self._failed = token
+            return False
+        self._retired, self._current = self._current, loaded
+        logger.info('now serving %s %s', self.name, loaded.label)
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+
+def reload_in_master(restart):
+    """Reload models in this process, a pre-forking server's master, for the workers forked from it.
+
+    Called after the app was imported and before the first fork. The
+    workers stop watching; a thread polls every watcher at the shortest
+    interval and calls ``restart()`` once per new version. Returns the
+    event that stops the thread, or None if no watcher polls.
+    """
+    global _master_reloads
+    _master_reloads = True
+    intervals = [watcher.interval for watcher in _watchers if watcher.interval]
+    if not intervals:
+        return None
+
+    def run():
+        signalled = None
+        while not stop.wait(min(intervals)):
+            try:
+                pending = [watcher.pending() for watcher in list(_watchers)]
+                # the reload loads them; until then the same versions are not signalled again
+                if any(token is not None for token in pending) and pending != signalled:
+                    signalled = pending
+                    restart()
+            except Exception:
+                logger.exception('checking for new models failed')
+
+    stop = threading.Event()
+    threading.Thread(target=run, name='model-reload', daemon=True).start()
+    return stop
+
+
+def reload_watchers():
+    """Load and swap in every new model version now; whether any changed.
+
+    For the master's reload hook: it serves no requests, so the replaced
+    models are released right away instead of one poll later.
+    """
+    changed = False
+    for watcher in list(_watchers):
+        if watcher.check():
+            watcher._retired = None
+            changed = True
+    return changed
+
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # between an unlink and a rename; keep serving the current model
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f_in:
+        return pickle.load(f_in)
+
+
+def watch_file(path, load=None, label=None, **kwargs):
+    """Watch a pickled model file; ``label`` names the model loaded at start."""
+    initial = file_version(path)
+
+    def file_label(token):
+        if label is not None and token == initial:
+            return label
+        modified = datetime.fromtimestamp(token[0] / 1e9, tz=timezone.utc)
+        return f'{os.path.basename(path)}@{modified:%Y-%m-%dT%H:%M:%SZ}'
+
+    return ModelWatcher(
+        version=lambda: file_version(path),
+        load=lambda token: (load or load_pickle)(path),
+        label=file_label,
+        **kwargs,
+    )
+
+
+def watch_registry(name, stage='Production', flavor='sklearn', wrap=None, **kwargs):
+    """Watch the latest version of registered model ``name`` in ``stage``; ``wrap`` adapts what is loaded."""
+    from mlflow.tracking import MlflowClient
+    from nyc_taxi.model_cache import load_model
+
+    client = MlflowClient()
+
+    def version():
+        latest = client.get_latest_versions(name, stages=[stage])
+        if not latest:
+            return None
+        # the artifact URI is immutable for a version, so the model cache applies
+        return latest[0].version, client.get_model_version_download_uri(name, latest[0].version)
+
+    return ModelWatcher(
+        version=version,
+        load=lambda token: (wrap or (lambda model: model))(load_model(token[1], flavor=flavor)),
+        label=lambda token: f'{name}/{token[0]}',
+        **kwargs,
+    )
+
+
+def split_pipeline(pipeline):
+    """A logged ``make_pipeline(dv, model)`` as the services' ``(dv, model)`` pair."""
+    return pipeline[:-1], pipeline[-1]
+
+
+def watch_model(path, **kwargs):
+    """The services' ``(dv, model)``: the pickle at ``path``, or the registry if configured.
+
+    ``MODEL_REGISTRY_NAME`` (and ``MODEL_REGISTRY_STAGE``, default
+    ``Production``) switch from the file to a registered sklearn pipeline.
+    """
+    name = os.getenv('MODEL_REGISTRY_NAME')
+    if name:
+        kwargs.pop('label', None)
+        return watch_registry(name, os.getenv('MODEL_REGISTRY_STAGE', 'Production'), wrap=split_pipeline, **kwargs)
+    return watch_file(path, **kwargs)
@@ -0,0 +1,66 @@
+"""Deterministic ride IDs for batch predictions.
+
+A ride is identified by the trip file it comes from and its row in that
+file, packed into a single int64:
+
+    bit  63      0, IDs are never negative
+    bits 56-62   taxi type, as its position in ``TAXI_TYPES``
+    bits 44-55   year
+    bits 40-43   month
+    bits  0-39   row index in the file (up to ~10^12 rows)
+
+``ride_ids`` builds a whole month with one vectorized OR, and rescoring a
+month gives the same IDs, so reruns join cleanly downstream. IDs sort by
+partition and then by row; ``decode_ride_ids`` recovers the parts.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Codes are stored in the IDs: only ever append to this tuple
+TAXI_TYPES = ('yellow', 'green', 'fhv', 'fhvhv')
+
+ROW_BITS = 40
+_MONTH_SHIFT = ROW_BITS
+_YEAR_SHIFT = ROW_BITS + 4
+_TYPE_SHIFT = ROW_BITS + 16
+
+_TRIP_FILE = re.compile(r'^(?P<taxi_type>[a-z]+)_tripdata_(?P<year>\d{4})-(?P<month>\d{2})\.parquet$')
+
+
+def partition_prefix(taxi_type, year, month):
+    """The high bits shared by every ride ID of one trip file."""
+    if taxi_type not in TAXI_TYPES:
+        raise ValueError(f'taxi_type must be one of {TAXI_TYPES}, got {taxi_type!r}')
+    if not 0 <= year < 2**12 or not 1 <= month <= 12:
+        raise ValueError(f'no ride IDs for {year}-{month}')
+    return (TAXI_TYPES.index(taxi_type) << _TYPE_SHIFT) | (year << _YEAR_SHIFT) | (month << _MONTH_SHIFT)
+
+
+def ride_ids(taxi_type, year, month, rows):
+    """int64 IDs for the given row indices (e.g. ``df.index``) of one trip file."""
+    rows = np.asarray(rows, dtype=np.int64)
+    if rows.size and (rows.min() < 0 or rows.max() >= 2**ROW_BITS):
+        raise ValueError(f'row indices must be in [0, 2**{ROW_BITS})')
+    return rows | np.int64(partition_prefix(taxi_type, year, month))
+
+
+def decode_ride_ids(ids):
+    """DataFrame with the taxi_type, year, month and row of each ID."""
+    ids = np.asarray(ids, dtype=np.int64)
+    return pd.DataFrame({
+        'taxi_type': np.asarray(TAXI_TYPES, dtype=object)[ids >> _TYPE_SHIFT],
+        'year': (ids >> _YEAR_SHIFT) & 0xFFF,
+        'month': (ids >> _MONTH_SHIFT) & 0xF,
+        'row': ids & (2**ROW_BITS - 1),
+    })
+
+
+def parse_trip_filename(filename):
+    """``(taxi_type, year, month)`` from a TLC file name such as ``green_tripdata_2021-01.parquet``."""
+    match = _TRIP_FILE.match(os.path.basename(filename))
+    if match is None:
+        raise ValueError(f'{filename} is not named <taxi_type>_tripdata_<YYYY>-<MM>.parquet')
+    return match['taxi_type'], int(match['year']), int(match['month'])
@@ -0,0 +1,87 @@
+"""Asynchronous hyperopt search on a local process pool.
+
+``fmin`` with plain ``Trials()`` evaluates one suggestion at a time. Here up
+to ``parallelism`` trials run concurrently in worker processes; whenever one
+finishes, its result is told to the algorithm (TPE by default) and a new
+suggestion is submitted, so the workers never wait for a whole batch.
+
+Workers are started once with ``initializer(*initargs)``, which is where they
+should load the training data, so the data is never pickled per trial. The
+objective must be a module-level function taking the evaluated parameter
+dict and returning a hyperopt result dict, exactly as for ``fmin``.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from hyperopt import STATUS_FAIL, Trials, base, space_eval, tpe
+from hyperopt.utils import coarse_utcnow
+
+
+def _suggest(algo, domain, trials, rstate, n):
+    new_ids = trials.new_trial_ids(n)
+    trials.refresh()
+    docs = algo(new_ids, domain, trials, rstate.integers(2**31 - 1))
+    if docs:
+        trials.insert_trial_docs(docs)
+        trials.refresh()
+    return [trial for trial in trials._dynamic_trials if trial['tid'] in set(new_ids)]
+
+
+def _finish(trial, result=None, error=None):
+    if error is not None:
+        trial['result'] = {'status': STATUS_FAIL, 'failure': str(error)}
+        trial['misc']['error'] = (str(type(error)), str(error))
+        trial['state'] = base.JOB_STATE_ERROR
+    else:
+        trial['result'] = result
+        trial['state'] = base.JOB_STATE_DONE
+    trial['refresh_time'] = coarse_utcnow()
+
+
+def parallel_fmin(
+    fn,
+    space,
+    max_evals,
+    parallelism,
+    algo=tpe.suggest,
+    trials=None,
+    rstate=None,
+    initializer=None,
+    initargs=(),
+):
+    """Like ``hyperopt.fmin``, with ``parallelism`` trials in flight at once.
+
+    Returns the best point as ``fmin`` does (``trials.argmin``).
+    """
+    trials = trials if trials is not None else Trials()
+    rstate = rstate if rstate is not None else np.random.default_rng()
+    # the objective is only called in the workers; the domain just describes the space
+    domain = base.Domain(fn, space)
+
+    running = {}
+    n_evals = len(trials._dynamic_trials)
+    with ProcessPoolExecutor(
+        max_workers=parallelism, initializer=initializer, initargs=initargs
+    ) as pool:
+
+        def submit(n):
+            new_trials = _suggest(algo, domain, trials, rstate, n) if n > 0 else []
+            for trial in new_trials:
+                params = space_eval(space, base.spec_from_misc(trial['misc']))
+                trial['state'] = base.JOB_STATE_RUNNING
+                trial['book_time'] = trial['refresh_time'] = coarse_utcnow()
+                running[pool.submit(fn, params)] = trial
+            return len(new_trials)
+
+        n_evals += submit(min(parallelism, max_evals - n_evals))
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = running.pop(future)
+                error = future.exception()
+                _finish(trial, None if error else future.result(), error)
+            trials.refresh()
+
+            n_evals += submit(min(parallelism - len(running), max_evals - n_evals))
+
+    return trials.argmin
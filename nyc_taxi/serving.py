@@ -0,0 +1,119 @@
+"""Batch requests for the duration prediction services.
+
+``/predict`` scores one ride per HTTP request, so the request overhead and
+one ``dv.transform`` + ``model.predict`` call per ride dominate. The
+``/predict/batch`` endpoints accept many rides at once:
+
+* a JSON array of rides (``Content-Type: application/json``), answered
+  with ``{"predictions": [...]}``;
+* newline-delimited JSON (``application/x-ndjson``), one ride per line,
+  answered with one result per line.
+
+All valid rides are scored with a single vectorized predict call. Results
+keep the request order; a ride that cannot be scored gets
+``{"error": ...}`` in its slot instead of failing the whole batch.
+``PREDICT_BATCH_MAX_RIDES`` (default 10000) caps the rides per request.
+"""
+import os
+import json
+import math
+from numbers import Real
+
+NDJSON = 'application/x-ndjson'
+DEFAULT_MAX_RIDES = 10_000
+RIDE_FIELDS = ('PULocationID', 'DOLocationID', 'trip_distance')
+
+
+class BatchError(ValueError):
+    """The request as a whole cannot be read; maps to an HTTP 4xx status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_rides_from_env():
+    return int(os.getenv('PREDICT_BATCH_MAX_RIDES', DEFAULT_MAX_RIDES))
+
+
+def is_ndjson(content_type):
+    return (content_type or '').split(';')[0].strip() in (NDJSON, 'application/jsonlines', 'application/jsonl')
+
+
+def parse_rides(body, content_type=None, max_rides=None):
+    """The rides in a request body, with a ``BatchError`` in place of unreadable NDJSON lines."""
+    max_rides = max_rides_from_env() if max_rides is None else max_rides
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    if is_ndjson(content_type):
+        rides = []
+        for number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rides.append(json.loads(line))
+            except ValueError as e:
+                rides.append(BatchError(f'line {number}: {e}'))
+    else:
+        try:
+            rides = json.loads(body)
+        except ValueError as e:
+            raise BatchError(f'invalid JSON: {e}') from e
+        if not isinstance(rides, list):
+            raise BatchError('expected a JSON array of rides')
+    if len(rides) > max_rides:
+        raise BatchError(f'{len(rides)} rides in one request, the limit is {max_rides}', status=413)
+    return rides
+
+
+def check_ride(ride):
+    """Why ``ride`` cannot be scored, or None."""
+    if not isinstance(ride, dict):
+        return f'expected a ride object, got {type(ride).__name__}'
+    missing = [field for field in RIDE_FIELDS if field not in ride]
+    if missing:
+        return f'missing {", ".join(missing)}'
+    distance = ride['trip_distance']
+    if isinstance(distance, bool) or not isinstance(distance, Real) or not math.isfinite(distance):
+        return f'trip_distance must be a finite number, got {distance!r}'
+    return None
+
+
+def predict_batch(rides, prepare_features, predict_many):
+    """One result dict per ride, in order.
+
+    ``predict_many`` takes a list of feature dicts and returns one
+    prediction per dict. If it fails for the batch, the rides are scored
+    one by one so a single bad ride only fails its own slot.
+    """
+    results = [None] * len(rides)
+    features, positions = [], []
+    for i, ride in enumerate(rides):
+        error = str(ride) if isinstance(ride, BatchError) else check_ride(ride)
+        if error is None:
+            try:
+                features.append(prepare_features(ride))
+                positions.append(i)
+                continue
+            except (KeyError, TypeError, ValueError) as e:
+                error = f'{type(e).__name__}: {e}'
+        results[i] = {'error': error}
+
+    if not features:
+        return results
+    try:
+        predictions = [{'duration': float(p)} for p in predict_many(features)]
+    except Exception:
+        predictions = []
+        for feature in features:
+            try:
+                predictions.append({'duration': float(predict_many([feature])[0])})
+            except Exception as e:
+                predictions.append({'error': f'{type(e).__name__}: {e}'})
+    for i, result in zip(positions, predictions):
+        results[i] = result
+    return results
+
+
+def to_ndjson(results):
+    return ''.join(json.dumps(result) + '\n' for result in results)
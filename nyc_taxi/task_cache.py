@@ -0,0 +1,102 @@
+"""Cache keys for the Prefect data tasks.
+
+``make_cache_key_fn`` builds a ``cache_key_fn`` for ``@task`` from:
+
+* the task's source code (plus any helper modules it depends on);
+* a fingerprint of every input file -- size and mtime (``'stat'``) or a
+  SHA-256 of the contents (``'hash'``) for local files, the ETag or
+  Last-Modified/Content-Length headers for URLs;
+* the other parameters: DataFrames and arrays are hashed by content, so a
+  feature task hits whenever the month it is given is unchanged.
+
+Prefect persists the results of the tasks and, while the key matches and the
+cache has not expired, returns them in a ``Cached`` state instead of running
+the task; ``cache_summary`` turns those states into hit/miss counts for the
+flow logs.
+"""
+import os
+import pickle
+import hashlib
+import inspect
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from nyc_taxi.cache import cache_key, file_digest
+
+FINGERPRINTS = ('stat', 'hash')
+
+
+def _is_url(path):
+    return path.startswith(('http://', 'https://'))
+
+
+def file_fingerprint(path, mode='stat'):
+    """Cheap identity of a local file or URL that changes with its contents."""
+    if _is_url(path):
+        import requests
+        r = requests.head(path, allow_redirects=True, timeout=30)
+        r.raise_for_status()
+        headers = r.headers
+        return headers.get('ETag') or f"{headers.get('Last-Modified')}-{headers.get('Content-Length')}"
+    if mode == 'hash':
+        return file_digest(path)
+    if mode != 'stat':
+        raise ValueError(f'fingerprint must be one of {FINGERPRINTS}, got {mode!r}')
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def value_fingerprint(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return repr(value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return hashlib.sha256(pd.util.hash_pandas_object(value).to_numpy().tobytes()).hexdigest()
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+    return hashlib.sha256(pickle.dumps(value)).hexdigest()
+
+
+def _file_parameters(parameters):
+    return [
+        value for value in parameters.values()
+        if isinstance(value, str) and (_is_url(value) or os.path.isfile(value))
+    ]
+
+
+def make_cache_key_fn(paths=None, fingerprint='stat', modules=()):
+    """A ``cache_key_fn`` for ``@task``.
+
+    ``paths`` maps the task parameters to the files the task reads; by
+    default every string parameter naming an existing file or a URL counts.
+    ``modules`` are hashed along with the task's own source.
+    """
+    def cache_key_fn(context, parameters):
+        code = [inspect.getsource(context.task.fn)]
+        code += [inspect.getsource(module) for module in modules]
+        files = paths(parameters) if paths is not None else _file_parameters(parameters)
+        return cache_key(
+            task=context.task.name,
+            code=hashlib.sha256(''.join(code).encode()).hexdigest(),
+            files={path: file_fingerprint(path, fingerprint) for path in files},
+            parameters={name: value_fingerprint(value) for name, value in parameters.items()},
+        )
+
+    return cache_key_fn
+
+
+def cache_expiration_from_env(default_hours=24):
+    """``TASK_CACHE_EXPIRATION_HOURS`` as a timedelta; 0 or less disables expiry."""
+    hours = float(os.getenv('TASK_CACHE_EXPIRATION_HOURS', default_hours))
+    return timedelta(hours=hours) if hours > 0 else None
+
+
+def cache_summary(futures):
+    """Hit/miss line for named Prefect futures; a hit finished in a ``Cached`` state."""
+    hits = [name for name, future in futures.items() if future.wait().name == 'Cached']
+    misses = [name for name in futures if name not in hits]
+    return (
+        f"{len(hits)} hits, {len(misses)} misses "
+        f"(hits: {', '.join(hits) or '-'}; misses: {', '.join(misses) or '-'})"
+    )
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from time import sleep
+
+from nyc_taxi.aio import BoundedExecutor
+
+
+def test_calls_run_off_the_loop_and_are_bounded():
+    executor = BoundedExecutor(workers=2, max_pending=3)
+    active, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+
+    def predict(x):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        threads.add(threading.get_ident())
+        sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return x * 2
+
+    async def main():
+        loop_thread = threading.get_ident()
+        results = await asyncio.gather(*(executor.run(predict, i) for i in range(10)))
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(main())
+    executor.shutdown()
+
+    assert results == [i * 2 for i in range(10)]
+    assert loop_thread not in threads
+    assert peak[0] <= 2
+
+
+def test_pending_calls_are_limited():
+    executor = BoundedExecutor(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        waiting = executor._semaphore()._value
+        release.set()
+        await asyncio.gather(*tasks)
+        return waiting
+
+    assert asyncio.run(main()) == 0
+    executor.shutdown()
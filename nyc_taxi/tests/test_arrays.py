@@ -0,0 +1,40 @@
+import mmap
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.utils import check_array
+
+from nyc_taxi.arrays import has_dataset, load_dataset, save_dataset
+
+
+def mapped(values):
+    base = values
+    while getattr(base, 'base', None) is not None:
+        base = base.base
+    return isinstance(base, mmap.mmap)
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    X = sp.random(50, 8, density=0.3, format='csr', random_state=1)
+    y = np.arange(50, dtype=np.float64)
+    path = tmp_path / 'train'
+
+    assert not has_dataset(path)
+    save_dataset(path, X, y, format='csc', dtype=np.float32)
+    assert has_dataset(path)
+
+    X_mapped, y_mapped = load_dataset(path)
+    assert X_mapped.format == 'csc'
+    assert np.allclose(X_mapped.toarray(), X.toarray())
+    assert np.array_equal(y_mapped, y)
+    assert mapped(X_mapped.data) and mapped(X_mapped.indices) and mapped(y_mapped)
+
+
+def test_sklearn_keeps_the_mapping(tmp_path):
+    X = sp.random(50, 8, density=0.3, format='csr', random_state=1)
+    save_dataset(tmp_path / 'val', X, np.zeros(50), format='csr', dtype=np.float32)
+    X_mapped, _ = load_dataset(tmp_path / 'val')
+
+    checked = check_array(X_mapped, accept_sparse='csr', dtype=np.float32)
+    assert np.shares_memory(checked.data, X_mapped.data)
+    assert checked.indices.dtype == np.intc and checked.indptr.dtype == np.intc
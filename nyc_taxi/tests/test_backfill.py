@@ -0,0 +1,42 @@
+import os
+
+from nyc_taxi.backfill import Partition, backfill, month_range, partitions
+
+_worker = {}
+
+
+def init_worker(model):
+    _worker['model'] = model
+    _worker['loads'] = _worker.get('loads', 0) + 1
+
+
+def score_partition(partition, output_file):
+    # March fails the first time it is tried
+    flaky = os.path.join(os.path.dirname(output_file), 'tried')
+    if partition.month == 3 and not os.path.exists(flaky):
+        open(flaky, 'w').close()
+        raise RuntimeError('connection reset')
+    with open(output_file, 'w') as f_out:
+        f_out.write(f"{_worker['model']} {_worker['loads']} {partition}")
+
+
+def test_month_range_crosses_years():
+    assert month_range('2021-11', '2022-02') == [(2021, 11), (2021, 12), (2022, 1), (2022, 2)]
+    assert partitions('green,yellow', '2021-01', '2021-02')[-1] == Partition('yellow', 2021, 2)
+
+
+def test_failed_partitions_are_retried_and_done_ones_skipped(tmp_path):
+    months = partitions(['green'], '2021-01', '2021-04')
+    result = backfill(score_partition, months, str(tmp_path), workers=2, initializer=init_worker, initargs=('rf',))
+
+    assert sorted(result.completed) == months
+    assert result.failed == {}
+    march = tmp_path / 'taxi_type=green' / 'year=2021' / 'month=03'
+    assert (march / '_SUCCESS').exists()
+    assert (march / 'predictions.parquet').read_text().startswith('rf 1 ')
+
+    # without the initializer May cannot load its model, and with retries=0 it stays failed
+    rerun = backfill(score_partition, partitions(['green'], '2021-03', '2021-05'), str(tmp_path), workers=1, retries=0)
+    assert rerun.skipped == [Partition('green', 2021, 3), Partition('green', 2021, 4)]
+    assert rerun.completed == []
+    assert list(rerun.failed) == [Partition('green', 2021, 5)]
@@ -0,0 +1,76 @@
+import sys
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+
+from nyc_taxi.bundle import export_bundle, load_bundle
+from nyc_taxi.features import TripFeatureEncoder
+
+
+def rides(n=300, seed=1):
+    rng = np.random.default_rng(seed)
+    pu = rng.integers(1, 30, n)
+    do = rng.integers(1, 30, n)
+    distance = rng.uniform(0, 20, n).round(2)
+    duration = 2 + 3 * distance + (pu % 7) + rng.normal(0, 1, n)
+    return [{'PU_DO': f'{p}_{d}', 'trip_distance': float(x)} for p, d, x in zip(pu, do, distance)], duration
+
+
+def test_linear_pipeline_matches_sklearn(tmp_path):
+    train, y = rides()
+    pipeline = make_pipeline(DictVectorizer(), LinearRegression()).fit(train, y)
+    export_bundle(pipeline, tmp_path / 'model.npz', metadata={'run_id': 'run-1'})
+
+    model = load_bundle(tmp_path / 'model.npz')
+    test, _ = rides(seed=2)
+    test += [{'PU_DO': '999_1', 'trip_distance': 1.0}, {'PU_DO': 'nan_1', 'trip_distance': 2.0}]
+    np.testing.assert_allclose(model.predict(test), pipeline.predict(test))
+    assert model.predict(test[0])[0] == pytest.approx(pipeline.predict(test[0])[0])
+    assert model.metadata == {'run_id': 'run-1'}
+
+
+@pytest.mark.parametrize('pair_encoding', ['int', 'hash'])
+def test_forest_pipeline_matches_sklearn(tmp_path, pair_encoding):
+    train, y = rides()
+    frame = pd.DataFrame(train)
+    codes = frame.PU_DO.str.split('_', expand=True).astype(int)
+    frame['PU_DO'] = codes[0] * 1000 + codes[1]
+    encoder = TripFeatureEncoder(pair_encoding=pair_encoding, n_buckets=64)
+    pipeline = make_pipeline(encoder, RandomForestRegressor(n_estimators=5, max_depth=6, random_state=0))
+    pipeline.fit(frame, y)
+    export_bundle(pipeline, tmp_path / 'model.npz')
+
+    model = load_bundle(tmp_path / 'model.npz')
+    test = frame.to_dict(orient='records')
+    np.testing.assert_allclose(model.predict(test), pipeline.predict(frame))
+
+
+def test_loader_only_imports_numpy(tmp_path):
+    train, y = rides()
+    export_bundle(make_pipeline(DictVectorizer(), LinearRegression()).fit(train, y), tmp_path / 'model.npz')
+    code = (
+        'import sys; from nyc_taxi.bundle import load_bundle; '
+        f'load_bundle({str(tmp_path / "model.npz")!r}).predict({train[0]!r}); '
+        'print(sorted({"sklearn", "scipy", "pandas", "mlflow"} & set(sys.modules)))'
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parents[2],
+    ).stdout
+    assert out.strip() == '[]'
+
+
+def test_unsupported_regressor(tmp_path):
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    train, y = rides(n=50)
+    pipeline = make_pipeline(DictVectorizer(), GradientBoostingRegressor(n_estimators=2)).fit(train, y)
+    with pytest.raises(ValueError):
+        export_bundle(pipeline, tmp_path / 'model.npz')
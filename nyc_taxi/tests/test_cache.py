@@ -0,0 +1,41 @@
+from nyc_taxi.cache import OutputCache, cache_key, file_digest
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_key_follows_content(tmp_path):
+    a = write(tmp_path / 'a.parquet', 'january')
+    b = write(tmp_path / 'b.parquet', 'january')
+    assert file_digest(a) == file_digest(b)
+
+    key = cache_key(inputs=[file_digest(a)], encoding='string')
+    assert key == cache_key(encoding='string', inputs=[file_digest(b)])
+    assert key != cache_key(inputs=[file_digest(a)], encoding='int')
+    write(b, 'february')
+    assert key != cache_key(inputs=[file_digest(b)], encoding='string')
+
+
+def test_store_and_restore(tmp_path):
+    out = tmp_path / 'out'
+    write(out / 'dv.pkl', 'dv')
+    write(out / 'train' / 'data.npy', 'data')
+    names = ['dv.pkl', 'train']
+
+    cache = OutputCache(tmp_path / 'cache')
+    assert not cache.restore('k1', out, names)
+    cache.store('k1', out, names)
+
+    dest = tmp_path / 'dest'
+    assert cache.restore('k1', dest, names)
+    assert (dest / 'dv.pkl').read_text() == 'dv'
+    assert (dest / 'train' / 'data.npy').read_text() == 'data'
+
+    # counts survive across runs
+    cache = OutputCache(tmp_path / 'cache')
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert not cache.restore('k2', dest, names)
+    assert str(cache.stats) == '1 hits, 2 misses'
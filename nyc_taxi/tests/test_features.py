@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction import DictVectorizer
+
+from nyc_taxi.features import TripFeatureEncoder
+
+
+def trips():
+    data = [
+        ('130', '205', 3.66),
+        ('1', '1', 0.0),
+        ('7', '42', 12.5),
+        ('130', '205', 1.2),
+    ]
+    return pd.DataFrame(data, columns=['PULocationID', 'DOLocationID', 'trip_distance'])
+
+
+def to_dicts(df):
+    df = df.copy()
+    df['PU_DO'] = df['PULocationID'] + '_' + df['DOLocationID']
+    return df[['PU_DO', 'trip_distance']].to_dict(orient='records')
+
+
+def assert_same_csr(actual, expected):
+    assert actual.shape == expected.shape
+    np.testing.assert_array_equal(actual.indptr, expected.indptr)
+    np.testing.assert_array_equal(actual.indices, expected.indices)
+    np.testing.assert_array_equal(actual.data, expected.data)
+
+
+def test_fit_matches_dict_vectorizer():
+    dv = DictVectorizer()
+    expected = dv.fit_transform(to_dicts(trips()))
+
+    encoder = TripFeatureEncoder()
+    actual = encoder.fit(trips()).transform(trips())
+
+    assert encoder.feature_names_ == dv.feature_names_
+    assert_same_csr(actual, expected)
+
+
+def test_transform_with_existing_dict_vectorizer():
+    dv = DictVectorizer()
+    dv.fit(to_dicts(trips()))
+
+    df_val = pd.DataFrame(
+        [('7', '42', 2.0), ('265', '1', 5.0), ('1', '1', 1.5)],
+        columns=['PULocationID', 'DOLocationID', 'trip_distance'],
+    )
+    encoder = TripFeatureEncoder.from_dict_vectorizer(dv)
+
+    assert_same_csr(encoder.transform(df_val), dv.transform(to_dicts(df_val)))
+    # integer IDs give the same matrix as their string form
+    df_int = df_val.astype({'PULocationID': int, 'DOLocationID': int})
+    assert_same_csr(encoder.transform(df_int), dv.transform(to_dicts(df_val)))
+
+
+def test_single_location_columns():
+    categorical = ['PUlocationID', 'DOlocationID']
+    df = pd.DataFrame([('-1', '-1'), ('1', '1'), ('3', '-1')], columns=categorical)
+    dv = DictVectorizer()
+    dv.fit(df.to_dict(orient='records'))
+
+    encoder = TripFeatureEncoder.from_dict_vectorizer(dv)
+
+    assert set(encoder.categorical) == set(categorical)
+    df_val = pd.DataFrame([('1', '-1'), ('2', 'nan')], columns=categorical)
+    assert_same_csr(encoder.transform(df_val), dv.transform(df_val.to_dict(orient='records')))
+
+
+def test_int_pair_encoding_accepts_integer_keys():
+    encoder = TripFeatureEncoder(pair_encoding='int').fit(trips())
+
+    assert 'PU_DO=130205' in encoder.feature_names_
+    from_ids = encoder.transform(trips())
+    from_keys = encoder.transform({'PU_DO': 130205, 'trip_distance': 3.66})
+    assert_same_csr(from_keys, from_ids[0])
+
+
+def test_hash_pair_encoding_has_fixed_width():
+    encoder = TripFeatureEncoder(pair_encoding='hash', n_buckets=16).fit(trips())
+
+    X = encoder.transform(pd.DataFrame(
+        [(130, 205, 3.66), (264, 264, 1.0)],
+        columns=['PULocationID', 'DOLocationID', 'trip_distance'],
+    ))
+
+    assert X.shape == (2, 17)
+    # unseen pairs still land in a bucket
+    np.testing.assert_array_equal(X.getnnz(axis=1), [2, 2])
@@ -0,0 +1,137 @@
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from nyc_taxi.fetch import ChecksumError, Mirror
+
+DATA = os.urandom(100_000)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    files = {'/green_tripdata_2021-01.parquet': DATA}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, body, status=200, extra=()):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{hashlib.md5(self.files[self.path]).hexdigest()}"')
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(self.files[self.path])
+
+    def do_GET(self):
+        data = self.files[self.path]
+        ranged = self.headers.get('Range')
+        self.requests.append(ranged)
+        if ranged is None:
+            self._headers(data)
+            self.wfile.write(data)
+            return
+        start, end = (int(x) for x in ranged.split('=')[1].split('-'))
+        body = data[start:end + 1]
+        self._headers(body, 206, [('Content-Range', f'bytes {start}-{end}/{len(data)}')])
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    RangeHandler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(httpd):
+    return f'http://127.0.0.1:{httpd.server_address[1]}/green_tripdata_2021-01.parquet'
+
+
+def test_concurrent_ranges_then_offline(server, tmp_path):
+    mirror = Mirror(tmp_path / 'mirror', workers=4, chunk_size=16_384)
+    path = mirror.fetch(url(server), sha256=hashlib.sha256(DATA).hexdigest())
+
+    with open(path, 'rb') as f_in:
+        assert f_in.read() == DATA
+    assert len(RangeHandler.requests) == 7
+    assert os.path.basename(path) == hashlib.sha256(DATA).hexdigest()
+
+    # the mirrored copy is served with the server gone, even in offline mode
+    mirrored = url(server)
+    server.shutdown()
+    server.server_close()
+    assert Mirror(tmp_path / 'mirror', offline=True).fetch(mirrored) == path
+    dest = Mirror(tmp_path / 'mirror').fetch_to(mirrored, tmp_path / 'data')
+    assert dest == str(tmp_path / 'data' / 'green_tripdata_2021-01.parquet')
+    with pytest.raises(FileNotFoundError):
+        Mirror(tmp_path / 'mirror', offline=True).fetch(mirrored.replace('2021-01', '2021-02'))
+
+
+def test_resume_fetches_only_missing_ranges(server, tmp_path):
+    mirror = Mirror(tmp_path / 'mirror', workers=1, chunk_size=50_000)
+    calls = []
+
+    def fail_on_second_range(n):
+        calls.append(n)
+        if sum(calls) > 50_000:
+            raise ConnectionError('connection dropped')
+
+    with pytest.raises(ConnectionError):
+        mirror.fetch(url(server), progress=fail_on_second_range)
+    assert RangeHandler.requests == ['bytes=0-49999', 'bytes=50000-99999']
+
+    RangeHandler.requests = []
+    with open(mirror.fetch(url(server)), 'rb') as f_in:
+        assert f_in.read() == DATA
+    assert RangeHandler.requests == ['bytes=50000-99999']
+    assert os.listdir(tmp_path / 'mirror' / 'partial') == []
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    mirror = Mirror(tmp_path / 'mirror')
+    with pytest.raises(ChecksumError):
+        mirror.fetch(url(server), sha256='0' * 64)
+    assert mirror.lookup(url(server)) is None
+    assert os.listdir(tmp_path / 'mirror' / 'partial') == []
+
+
+def test_resume_with_another_chunk_size_starts_over(server, tmp_path):
+    calls = []
+
+    def fail_on_second_range(n):
+        calls.append(n)
+        if sum(calls) > 50_000:
+            raise ConnectionError('connection dropped')
+
+    with pytest.raises(ConnectionError):
+        Mirror(tmp_path / 'mirror', workers=1, chunk_size=50_000).fetch(url(server), progress=fail_on_second_range)
+
+    # range 0 of 30,000-byte chunks is not the range 0 recorded above
+    RangeHandler.requests = []
+    with open(Mirror(tmp_path / 'mirror', workers=1, chunk_size=30_000).fetch(url(server)), 'rb') as f_in:
+        assert f_in.read() == DATA
+    assert RangeHandler.requests == ['bytes=0-29999', 'bytes=30000-59999', 'bytes=60000-89999', 'bytes=90000-99999']
+
+
+def test_concurrent_fetches_download_once(server, tmp_path):
+    mirrors = [Mirror(tmp_path / 'mirror', workers=1, chunk_size=16_384) for _ in range(4)]
+    threads = [threading.Thread(target=mirror.fetch, args=(url(server),)) for mirror in mirrors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(RangeHandler.requests) == 7
+    with open(mirrors[0].lookup(url(server)), 'rb') as f_in:
+        assert f_in.read() == DATA
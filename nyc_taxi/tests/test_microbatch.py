@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nyc_taxi.microbatch import MicroBatcher
+
+
+def test_concurrent_requests_share_model_calls():
+    calls, observed = [], []
+    release = threading.Event()
+
+    def predict_many(items):
+        calls.append(list(items))
+        # hold the first batch so the other requests queue up behind it
+        release.wait()
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(
+        predict_many, max_wait_ms=50, max_batch=8, on_batch=lambda size, waits: observed.append((size, waits))
+    )
+    with ThreadPoolExecutor(20) as pool:
+        futures = [pool.submit(batcher.predict, i) for i in range(20)]
+        release.set()
+        results = [future.result(timeout=10) for future in futures]
+    batcher.close()
+
+    assert results == [i * 2 for i in range(20)]
+    assert sorted(item for call in calls for item in call) == list(range(20))
+    assert len(calls) < 20 and max(len(call) for call in calls) <= 8
+    assert [size for size, _ in observed] == [len(call) for call in calls]
+    assert all(wait >= 0 for _, waits in observed for wait in waits)
+
+
+def test_lone_request_does_not_wait_for_company():
+    batcher = MicroBatcher(lambda items: [len(items)] * len(items), max_wait_ms=60_000, max_batch=100)
+    assert batcher.predict('a', timeout=5) == 1
+    assert batcher.predict('b', timeout=5) == 1
+    batcher.close()
+
+
+def test_failing_item_only_fails_its_own_request():
+    def predict_many(items):
+        if 'bad' in items:
+            raise ValueError('bad ride')
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(predict_many, max_wait_ms=20, max_batch=3)
+    futures = [batcher.submit(item) for item in ('a', 'bad', 'c')]
+    assert futures[0].result(timeout=5) == 'A'
+    assert futures[2].result(timeout=5) == 'C'
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit('d')
@@ -0,0 +1,132 @@
+import os
+import shutil
+
+import pytest
+
+from nyc_taxi.model_cache import ModelCache, load_model
+
+
+class Bucket:
+    """Stand-in for S3: serves s3://bucket/<key> from a local directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self.downloads = []
+
+    def put(self, key, files):
+        for name, data in files.items():
+            path = os.path.join(self.root, key, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f_out:
+                f_out.write(data)
+        return f's3://bucket/{key}'
+
+    def download(self, uri, dst_path):
+        self.downloads.append(uri)
+        key = uri[len('s3://bucket/'):]
+        return shutil.copytree(os.path.join(self.root, key), os.path.join(dst_path, os.path.basename(key)))
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return Bucket(str(tmp_path / 'bucket'))
+
+
+def test_second_load_is_local_and_checked(bucket, tmp_path):
+    uri = bucket.put('1/run-a/artifacts/model', {'MLmodel': b'flavors: {}', 'model.pkl': b'x' * 100})
+    cache = ModelCache(str(tmp_path / 'cache'), download=bucket.download)
+
+    path = cache.path(uri)
+    assert cache.path(uri) == path
+    assert bucket.downloads == [uri]
+    assert sorted(os.listdir(path)) == ['MLmodel', 'model.pkl']
+
+    # a truncated file fails the size check and is fetched again
+    with open(os.path.join(path, 'model.pkl'), 'wb') as f_out:
+        f_out.write(b'x')
+    assert cache.path(uri) == path
+    assert len(bucket.downloads) == 2
+
+    # a same-size change is only caught when hashing
+    with open(os.path.join(path, 'model.pkl'), 'wb') as f_out:
+        f_out.write(b'y' * 100)
+    cache.path(uri)
+    assert len(bucket.downloads) == 2
+    ModelCache(cache.root, verify='hash', download=bucket.download).path(uri)
+    assert len(bucket.downloads) == 3
+
+
+def test_offline_serves_cached_models_only(bucket, tmp_path):
+    uri = bucket.put('1/run-a/artifacts/model', {'model.pkl': b'x'})
+    ModelCache(str(tmp_path / 'cache'), download=bucket.download).path(uri)
+
+    offline = ModelCache(str(tmp_path / 'cache'), offline=True, download=bucket.download)
+    assert os.listdir(offline.path(uri)) == ['model.pkl']
+    with pytest.raises(FileNotFoundError):
+        offline.path(bucket.put('1/run-b/artifacts/model', {'model.pkl': b'x'}))
+    assert len(bucket.downloads) == 1
+    assert offline.path(str(tmp_path)) == str(tmp_path)
+
+
+def test_least_recently_used_models_are_evicted(bucket, tmp_path):
+    cache = ModelCache(str(tmp_path / 'cache'), max_bytes=250, download=bucket.download)
+    uris = [bucket.put(f'1/run-{i}/artifacts/model', {'model.pkl': b'x' * 100}) for i in range(3)]
+
+    cache.path(uris[0])
+    cache.path(uris[1])
+    os.utime(os.path.join(cache.root, cache.key(uris[1]), 'manifest.json'), (0, 0))
+    cache.path(uris[2])
+
+    cached = {directory for _, _, directory in cache.entries()}
+    assert cached == {os.path.join(cache.root, cache.key(uri)) for uri in (uris[0], uris[2])}
+
+
+def test_load_model_from_cache(bucket, tmp_path):
+    import mlflow.sklearn
+    from sklearn.dummy import DummyRegressor
+
+    model = DummyRegressor(constant=12.5, strategy='constant').fit([[0]], [0])
+    mlflow.sklearn.save_model(
+        model,
+        str(tmp_path / 'bucket' / '1' / 'run-a' / 'artifacts' / 'model'),
+        serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE,
+    )
+    cache = ModelCache(str(tmp_path / 'cache'), download=bucket.download)
+
+    loaded = load_model('s3://bucket/1/run-a/artifacts/model', flavor='sklearn', cache=cache)
+    assert loaded.predict([[3]])[0] == 12.5
+    load_model('s3://bucket/1/run-a/artifacts/model', cache=cache)
+    assert len(bucket.downloads) == 1
+
+
+def test_s3_bundle_is_downloaded_without_mlflow(bucket, tmp_path, monkeypatch):
+    import boto3
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import make_pipeline
+
+    from nyc_taxi import model_cache
+    from nyc_taxi.bundle import export_bundle
+
+    rides = [{'PU_DO': '1_2', 'trip_distance': 1.0}, {'PU_DO': '3_4', 'trip_distance': 5.0}]
+    pipeline = make_pipeline(DictVectorizer(), LinearRegression()).fit(rides, [6.0, 20.0])
+    os.makedirs(tmp_path / 'bucket' / '1' / 'run-a' / 'artifacts')
+    export_bundle(pipeline, tmp_path / 'bucket' / '1' / 'run-a' / 'artifacts' / 'model.npz')
+
+    class S3:
+        def download_file(self, bucket_name, key, filename):
+            bucket.downloads.append(f's3://{bucket_name}/{key}')
+            shutil.copyfile(os.path.join(bucket.root, key), filename)
+
+    def no_mlflow(uri, dst_path):
+        raise AssertionError('mlflow was used to download a bundle')
+
+    monkeypatch.setattr(boto3, 'client', lambda service, **kwargs: S3())
+    monkeypatch.setattr(model_cache, '_download_with_mlflow', no_mlflow)
+    monkeypatch.setenv('MODEL_CACHE_DIR', str(tmp_path / 'cache'))
+
+    uri = 's3://bucket/1/run-a/artifacts/model.npz'
+    for _ in range(2):
+        model = load_model(uri, flavor='bundle')
+        assert model.predict(rides) == pytest.approx(pipeline.predict(rides))
+    assert bucket.downloads == [uri]
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pandas as pd
+
+from nyc_taxi.parquet import iter_trips, pickup_window, read_trips
+
+
+def write_trips(path):
+    data = [
+        (1, 10, 1.0, datetime(2021, 1, 1, 1, 0), datetime(2021, 1, 1, 1, 10), 'N'),
+        (2, 20, 2.0, datetime(2021, 1, 1, 2, 0), datetime(2021, 1, 1, 2, 10), 'N'),
+        (3, 30, 3.0, datetime(2021, 1, 2, 1, 0), datetime(2021, 1, 2, 1, 10), 'Y'),
+        (4, 40, 4.0, datetime(2021, 1, 2, 2, 0), datetime(2021, 1, 2, 2, 10), 'N'),
+    ]
+    columns = [
+        'PULocationID',
+        'DOLocationID',
+        'trip_distance',
+        'lpep_pickup_datetime',
+        'lpep_dropoff_datetime',
+        'store_and_fwd_flag',
+    ]
+    df = pd.DataFrame(data, columns=columns)
+    df.to_parquet(path, engine='pyarrow', index=False, row_group_size=2)
+
+
+def test_read_trips_projects_model_columns(tmp_path):
+    path = tmp_path / 'green.parquet'
+    write_trips(path)
+
+    df, stats = read_trips(str(path))
+
+    assert list(df.columns) == [
+        'PULocationID',
+        'DOLocationID',
+        'trip_distance',
+        'lpep_pickup_datetime',
+        'lpep_dropoff_datetime',
+    ]
+    assert stats.rows == 4
+    assert stats.bytes_read > 0
+    assert stats.rss_delta >= 0
+
+
+def test_read_trips_skips_row_groups(tmp_path):
+    path = tmp_path / 'green.parquet'
+    write_trips(path)
+
+    filters = [('lpep_pickup_datetime', '>=', datetime(2021, 1, 2, 1, 30))]
+    df, stats = read_trips(str(path), columns=['PULocationID'], filters=filters)
+
+    assert list(df.PULocationID) == [4]
+    # rows keep their position in the file, so ride IDs do not depend on the filter
+    assert list(df.index) == [3]
+    assert (stats.row_groups_read, stats.row_groups_total) == (1, 2)
+
+
+def test_iter_trips_filters_like_read_trips(tmp_path):
+    path = tmp_path / 'green.parquet'
+    write_trips(path)
+
+    filters = [('lpep_pickup_datetime', '>=', datetime(2021, 1, 1, 1, 30)), ('store_and_fwd_flag', '==', 'N')]
+    batches = list(iter_trips(str(path), batch_size=3, filters=filters))
+
+    expected = read_trips(str(path), filters=filters)[0]
+    assert list(expected.index) == [1, 3]
+    assert pd.concat(batches).equals(expected)
+
+
+def test_pickup_window_covers_the_calendar_month():
+    assert pickup_window('yellow', 2021, 12) == [
+        ('tpep_pickup_datetime', '>=', datetime(2021, 12, 1)),
+        ('tpep_pickup_datetime', '<', datetime(2022, 1, 1)),
+    ]
+
+
+def test_iter_trips_streams_batches(tmp_path):
+    path = tmp_path / 'green.parquet'
+    write_trips(path)
+
+    batches = list(iter_trips(str(path), batch_size=3))
+
+    assert [len(df) for df in batches] == [3, 1]
+    assert list(batches[1].index) == [3]
+    assert pd.concat(batches).equals(read_trips(str(path))[0])
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from nyc_taxi.predictions import PredictionWriter, predictions_table, write_predictions
+
+
+def test_table_wraps_buffers_and_stores_model_version(tmp_path):
+    y_pred = np.array([12.5, 7.0, 30.25])
+    table = predictions_table({'ride_id': pd.Series([1, 2, 3]), 'predicted_duration': y_pred}, model_version='run-1')
+
+    assert table.column('predicted_duration').chunk(0).buffers()[1].address == y_pred.ctypes.data
+    assert table.column('model_version').type.value_type == 'string'
+
+    path = tmp_path / 'predictions.parquet'
+    write_predictions(table, str(path), compression='zstd')
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.schema_arrow.metadata[b'model_version'] == b'run-1'
+    assert parquet_file.metadata.row_group(0).column(0).compression == 'ZSTD'
+    df = pd.read_parquet(path)
+    assert list(df.model_version.astype(str)) == ['run-1'] * 3
+
+
+def test_writer_buffers_batches_into_row_groups(tmp_path):
+    path = tmp_path / 'predictions.parquet'
+    with PredictionWriter(str(path), compression='snappy', row_group_size=4) as writer:
+        for start in range(0, 10, 3):
+            rows = np.arange(start, min(start + 3, 10))
+            writer.write(predictions_table({'ride_id': rows, 'predicted_duration': rows * 1.5}, model_version='run-1'))
+
+    metadata = pq.ParquetFile(path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [4, 4, 2]
+    assert list(pd.read_parquet(path).ride_id) == list(range(10))
+
+
+def test_writer_without_rows_needs_a_schema(tmp_path):
+    with pytest.raises(ValueError):
+        PredictionWriter(str(tmp_path / 'empty.parquet')).close()
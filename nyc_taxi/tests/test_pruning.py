@@ -0,0 +1,48 @@
+import pytest
+
+from nyc_taxi.pruning import MedianPruner, SuccessiveHalvingPruner, make_pruner
+
+
+def run_trial(pruner, curve):
+    for rounds in range(1, len(curve) + 1):
+        if pruner.report(curve[:rounds]):
+            return rounds
+    pruner.complete(curve)
+    return None
+
+
+def test_median_pruner():
+    pruner = MedianPruner(n_startup_trials=2, n_warmup_rounds=2)
+    good = [10, 8, 6, 5, 4, 3]
+    bad = [12, 11, 10, 10, 10, 10]
+
+    # nothing is pruned before the startup trials have completed
+    assert run_trial(pruner, bad) is None
+    assert run_trial(pruner, good) is None
+    # median of the best scores after 3 rounds is (6 + 10) / 2
+    assert run_trial(pruner, bad) == 3
+    assert run_trial(pruner, [9, 7, 5, 4, 3, 2]) is None
+
+
+def test_median_pruner_warmup():
+    pruner = MedianPruner(n_startup_trials=1, n_warmup_rounds=4)
+    run_trial(pruner, [1, 1, 1, 1, 1])
+    assert run_trial(pruner, [5, 5, 5, 5, 5]) == 5
+
+
+def test_successive_halving():
+    pruner = SuccessiveHalvingPruner(min_rounds=2, reduction_factor=2)
+    assert [r for r in range(1, 20) if pruner._is_rung(r)] == [2, 4, 8, 16]
+
+    assert run_trial(pruner, [5, 4, 3, 2, 1]) is None
+    # second of two at the rung 2: only the best half goes on
+    assert run_trial(pruner, [6, 6, 6, 6, 6]) == 2
+    assert run_trial(pruner, [4, 3, 2, 1, 0]) is None
+
+
+def test_make_pruner():
+    assert isinstance(make_pruner('median', n_startup_trials=1), MedianPruner)
+    assert isinstance(make_pruner('halving'), SuccessiveHalvingPruner)
+    assert make_pruner('none') is None
+    with pytest.raises(ValueError):
+        make_pruner('hyperband')
@@ -0,0 +1,134 @@
+import os
+import time
+import pickle
+
+import pytest
+
+from nyc_taxi import reload
+from nyc_taxi.reload import ModelWatcher, reload_in_master, reload_watchers, watch_file
+
+
+def deploy(path, model, mtime):
+    # write next to the model and rename into place, as a deployment would
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f_out:
+        pickle.dump(model, f_out)
+    os.utime(tmp, ns=(mtime, mtime))
+    os.replace(tmp, path)
+
+
+def test_new_file_is_warmed_then_swapped_in(tmp_path):
+    path = tmp_path / 'lin_reg.bin'
+    deploy(path, {'coef': 1}, 10**18)
+    warmed = []
+    watcher = watch_file(path, label='1', warm=warmed.append, interval=0)
+    first = watcher.current
+    assert first.model == {'coef': 1} and first.label == '1'
+
+    assert not watcher.check()
+    deploy(path, {'coef': 2}, 2 * 10**18)
+    assert watcher.check()
+
+    assert watcher.current.model == {'coef': 2}
+    assert watcher.current.label == 'lin_reg.bin@2033-05-18T03:33:20Z'
+    assert warmed == [{'coef': 1}, {'coef': 2}]
+    # a request holding the old snapshot keeps a consistent model and label
+    assert first.model == {'coef': 1} and first.label == '1'
+
+
+def test_failed_load_keeps_serving_the_current_model(tmp_path):
+    path = tmp_path / 'lin_reg.bin'
+    deploy(path, {'coef': 1}, 10**18)
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        with open(path, 'rb') as f_in:
+            return pickle.load(f_in)
+
+    watcher = watch_file(path, load=load, interval=0)
+    path.write_bytes(b'half a pickle')
+    assert not watcher.check()
+    assert not watcher.check()
+    assert watcher.current.model == {'coef': 1}
+    # the broken file is tried once, not on every poll
+    assert len(loads) == 2
+
+    path.unlink()
+    assert not watcher.check()
+    deploy(path, {'coef': 3}, 3 * 10**18)
+    assert watcher.check()
+    assert watcher.current.model == {'coef': 3}
+
+
+def test_failed_warm_up_is_not_swapped_in():
+    versions = iter([1, 2])
+
+    def warm(model):
+        if model == 'broken':
+            raise ValueError('cannot predict')
+
+    watcher = ModelWatcher(lambda: next(versions), lambda v: 'ok' if v == 1 else 'broken', warm=warm, interval=0)
+    assert not watcher.check()
+    assert watcher.current.model == 'ok'
+
+    with pytest.raises(ValueError):
+        ModelWatcher(lambda: 1, lambda v: 'broken', warm=warm, interval=0)
+
+
+def test_background_thread_picks_up_new_version():
+    state = {'version': 1}
+    watcher = ModelWatcher(lambda: state['version'], lambda v: f'model-{v}', interval=0.01)
+    assert watcher.current.model == 'model-1'
+    state['version'] = 2
+    deadline = time.monotonic() + 5
+    while watcher.current.model != 'model-2' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    watcher.stop()
+    assert watcher.current.model == 'model-2'
+    assert watcher.current.label == '2'
+
+
+@pytest.fixture
+def master(monkeypatch):
+    # reload_in_master changes module state that would otherwise outlive the test
+    monkeypatch.setattr(reload, '_watchers', reload.weakref.WeakSet())
+    monkeypatch.setattr(reload, '_master_reloads', False)
+
+
+def test_master_signals_once_then_reloads_for_new_workers(master):
+    state = {'version': 1}
+    watcher = ModelWatcher(lambda: state['version'], lambda v: f'model-{v}', interval=0.01)
+    restarts = []
+    stop = reload_in_master(restart=lambda: restarts.append(state['version']))
+    try:
+        # forked workers inherit the flag and never start their own watcher thread
+        assert watcher.current.model == 'model-1'
+        assert watcher._pid is None
+
+        state['version'] = 2
+        deadline = time.monotonic() + 5
+        while not restarts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        # signalled once, not on every poll until the reload hook runs
+        assert restarts == [2]
+        assert watcher.current.model == 'model-1'
+
+        assert reload_watchers()
+        assert watcher.current.model == 'model-2'
+        assert watcher._retired is None
+        assert not reload_watchers()
+    finally:
+        stop.set()
+
+
+def test_manual_reload_without_polling(master, tmp_path):
+    path = tmp_path / 'lin_reg.bin'
+    deploy(path, {'coef': 1}, 10**18)
+    watcher = watch_file(path, interval=0)
+    assert reload_in_master(restart=None) is None
+
+    deploy(path, {'coef': 2}, 2 * 10**18)
+    assert reload_watchers()
+    assert watcher.current.model == {'coef': 2}
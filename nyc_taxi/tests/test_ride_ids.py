@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nyc_taxi.ride_ids import decode_ride_ids, parse_trip_filename, ride_ids
+
+
+def test_ids_are_deterministic_and_decode():
+    index = pd.Index([0, 5, 76517])
+    ids = ride_ids('green', 2021, 1, index)
+
+    assert ids.dtype == np.int64
+    assert (ids == ride_ids('green', 2021, 1, index)).all()
+    assert len(set(ids) | set(ride_ids('yellow', 2021, 1, index)) | set(ride_ids('green', 2021, 2, index))) == 9
+
+    decoded = decode_ride_ids(ids)
+    assert decoded.to_dict('list') == {
+        'taxi_type': ['green'] * 3,
+        'year': [2021] * 3,
+        'month': [1] * 3,
+        'row': [0, 5, 76517],
+    }
+
+
+def test_invalid_partitions_are_rejected():
+    with pytest.raises(ValueError):
+        ride_ids('limo', 2021, 1, [0])
+    with pytest.raises(ValueError):
+        ride_ids('green', 2021, 13, [0])
+    with pytest.raises(ValueError):
+        ride_ids('green', 2021, 1, [2**40])
+
+
+def test_parse_trip_filename():
+    url = 'https://d37ci6vzurychx.cloudfront.net/trip-data/fhv_tripdata_2021-02.parquet'
+    assert parse_trip_filename(url) == ('fhv', 2021, 2)
+    with pytest.raises(ValueError):
+        parse_trip_filename('/tmp/month.parquet')
@@ -0,0 +1,37 @@
+import numpy as np
+from hyperopt import STATUS_FAIL, STATUS_OK, Trials, hp
+
+from nyc_taxi.search import parallel_fmin
+
+_offset = {}
+
+
+def set_offset(value):
+    _offset['x'] = value
+
+
+def objective(params):
+    if params['x'] < -9:
+        raise ValueError('out of range')
+    return {'loss': (params['x'] - _offset['x']) ** 2, 'status': STATUS_OK}
+
+
+def test_parallel_fmin():
+    trials = Trials()
+    best = parallel_fmin(
+        fn=objective,
+        space={'x': hp.uniform('x', -10, 10)},
+        max_evals=20,
+        parallelism=2,
+        trials=trials,
+        rstate=np.random.default_rng(42),
+        initializer=set_offset,
+        initargs=(3,),
+    )
+
+    # failed trials are kept but not counted as valid by Trials
+    assert len(trials._dynamic_trials) == 20
+    statuses = {trial['result']['status'] for trial in trials._dynamic_trials}
+    assert statuses <= {STATUS_OK, STATUS_FAIL}
+    assert abs(best['x'] - 3) < 3
+    assert best['x'] == trials.best_trial['misc']['vals']['x'][0]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+
+from nyc_taxi.serving import NDJSON, BatchError, parse_rides, predict_batch, to_ndjson
+
+
+def prepare_features(ride):
+    return {'PU_DO': f"{ride['PULocationID']}_{ride['DOLocationID']}", 'trip_distance': ride['trip_distance']}
+
+
+@pytest.fixture
+def pipeline():
+    rides = [{'PULocationID': pu, 'DOLocationID': 50, 'trip_distance': float(pu)} for pu in range(1, 20)]
+    return make_pipeline(DictVectorizer(), LinearRegression()).fit(
+        [prepare_features(ride) for ride in rides], [2.0 * ride['trip_distance'] for ride in rides]
+    )
+
+
+def test_batch_matches_single_predictions_in_order(pipeline):
+    rides = [
+        {'PULocationID': 10, 'DOLocationID': 50, 'trip_distance': 4.0},
+        {'PULocationID': 10, 'DOLocationID': 50},
+        {'PULocationID': 3, 'DOLocationID': 50, 'trip_distance': 'far'},
+        [1, 2, 3],
+        {'PULocationID': 7, 'DOLocationID': 50, 'trip_distance': 1.5},
+    ]
+    calls = []
+
+    def predict_many(features):
+        calls.append(len(features))
+        return pipeline.predict(features)
+
+    results = predict_batch(rides, prepare_features, predict_many)
+
+    assert calls == [2]
+    assert results[0]['duration'] == pytest.approx(pipeline.predict(prepare_features(rides[0]))[0])
+    assert results[4]['duration'] == pytest.approx(pipeline.predict(prepare_features(rides[4]))[0])
+    assert results[1] == {'error': 'missing trip_distance'}
+    assert 'trip_distance' in results[2]['error']
+    assert 'ride object' in results[3]['error']
+
+
+def test_failed_batch_falls_back_to_single_rides(pipeline):
+    rides = [{'PULocationID': pu, 'DOLocationID': 50, 'trip_distance': 1.0} for pu in (1, 666, 2)]
+
+    def predict_many(features):
+        if any(f['PU_DO'].startswith('666') for f in features):
+            raise ValueError('bad ride')
+        return pipeline.predict(features)
+
+    results = predict_batch(rides, prepare_features, predict_many)
+    assert 'duration' in results[0] and 'duration' in results[2]
+    assert results[1] == {'error': 'ValueError: bad ride'}
+
+
+def test_parse_json_array_and_ndjson():
+    rides = [{'PULocationID': 1, 'DOLocationID': 2, 'trip_distance': 3.0}] * 2
+    assert parse_rides(json.dumps(rides).encode(), 'application/json') == rides
+
+    body = '\n'.join(json.dumps(ride) for ride in rides) + '\n\n{not json}\n'
+    parsed = parse_rides(body.encode(), f'{NDJSON}; charset=utf-8')
+    assert parsed[:2] == rides
+    assert isinstance(parsed[2], BatchError)
+    assert json.loads(to_ndjson(predict_batch(parsed, prepare_features, lambda f: [0.0] * len(f))).splitlines()[2]) == {
+        'error': "line 4: Expecting property name enclosed in double quotes: line 1 column 2 (char 1)"
+    }
+
+
+def test_unreadable_or_oversized_requests():
+    with pytest.raises(BatchError) as e:
+        parse_rides(b'{"PULocationID": 1}', 'application/json')
+    assert e.value.status == 400
+    with pytest.raises(BatchError) as e:
+        parse_rides(b'[{}, {}, {}]', 'application/json', max_rides=2)
+    assert e.value.status == 413
@@ -0,0 +1,48 @@
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+
+from nyc_taxi.task_cache import cache_summary, file_fingerprint, make_cache_key_fn
+
+
+def read_dataframe(filename):
+    return pd.read_parquet(filename)
+
+
+def context(fn):
+    return SimpleNamespace(task=SimpleNamespace(fn=fn, name=fn.__name__))
+
+
+def test_key_follows_file_and_parameters(tmp_path):
+    path = tmp_path / 'green_tripdata_2021-01.parquet'
+    path.write_bytes(b'january')
+    key_fn = make_cache_key_fn()
+    key = key_fn(context(read_dataframe), {'filename': str(path)})
+
+    assert key == key_fn(context(read_dataframe), {'filename': str(path)})
+    # same bytes, new mtime: a miss with 'stat', a hit with 'hash'
+    hashed = make_cache_key_fn(fingerprint='hash')(context(read_dataframe), {'filename': str(path)})
+    os.utime(path, ns=(0, 0))
+    assert key != key_fn(context(read_dataframe), {'filename': str(path)})
+    assert hashed == make_cache_key_fn(fingerprint='hash')(context(read_dataframe), {'filename': str(path)})
+    assert file_fingerprint(str(path)) == '7-0'
+
+
+def test_frames_are_keyed_by_content():
+    def create_X(df, dv=None):
+        return df
+
+    key_fn = make_cache_key_fn()
+    df = pd.DataFrame({'PULocationID': [1, 2], 'trip_distance': [1.5, 3.0]})
+    key = key_fn(context(create_X), {'df': df, 'dv': None})
+
+    assert key == key_fn(context(create_X), {'df': df.copy(), 'dv': None})
+    changed = df.assign(trip_distance=[1.5, 3.1])
+    assert key != key_fn(context(create_X), {'df': changed, 'dv': None})
+
+
+def test_cache_summary():
+    future = lambda name: SimpleNamespace(wait=lambda: SimpleNamespace(name=name))
+    summary = cache_summary({'read': future('Cached'), 'fit': future('Completed')})
+    assert summary == '1 hits, 1 misses (hits: read; misses: fit)'
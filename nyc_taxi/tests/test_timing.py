@@ -0,0 +1,25 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nyc_taxi.timing import TaskTimer
+
+
+def test_concurrent_tasks_overlap():
+    timer = TaskTimer()
+
+    @timer
+    def read_dataframe(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    assert read_dataframe.__name__ == 'read_dataframe'
+    with ThreadPoolExecutor(2) as pool:
+        assert list(pool.map(read_dataframe, [0.2, 0.2])) == [0.2, 0.2]
+
+    assert [name for name, _, _ in timer.records] == ['read_dataframe'] * 2
+    summary = timer.summary()
+    overlap = float(summary.rsplit('(', 1)[1].split('x')[0])
+    assert overlap > 1.5
+
+    timer.reset()
+    assert timer.summary() == 'no tasks timed'
@@ -0,0 +1,45 @@
+import pytest
+from mlflow.tracking import MlflowClient
+
+from nyc_taxi.tracking import BatchLogger
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # newer MLflow only writes to a local mlruns directory when told to
+    monkeypatch.setenv('MLFLOW_ALLOW_FILE_STORE', 'true')
+    return MlflowClient(tracking_uri=(tmp_path / 'mlruns').as_uri())
+
+
+def test_runs_are_logged_on_close(client):
+    experiment_id = client.create_experiment('trials')
+
+    with BatchLogger(experiment_id=experiment_id, client=client) as tracking:
+        for i in range(3):
+            with tracking.start_run() as run:
+                run.set_tag('model', 'xgboost')
+                run.log_params({'max_depth': i, 'learning_rate': 0.1})
+                run.log_metric('rmse', 10 - i)
+
+    runs = client.search_runs([experiment_id], order_by=['metrics.rmse ASC'])
+    assert len(runs) == 3
+    best = runs[0]
+    assert best.info.status == 'FINISHED'
+    assert best.data.tags['model'] == 'xgboost'
+    assert best.data.params == {'max_depth': '2', 'learning_rate': '0.1'}
+    assert best.data.metrics == {'rmse': 8.0}
+
+
+def test_failed_run(client):
+    experiment_id = client.create_experiment('trials')
+    tracking = BatchLogger(experiment_id=experiment_id, client=client)
+
+    with pytest.raises(ZeroDivisionError):
+        with tracking.start_run() as run:
+            run.log_param('alpha', 1)
+            1 / 0
+    tracking.close()
+
+    [run] = client.search_runs([experiment_id])
+    assert run.info.status == 'FAILED'
+    assert run.data.params == {'alpha': '1'}
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pandas as pd
+
+from nyc_taxi import trips
+
+
+def dt(hour, minute, second=0):
+    return datetime(2021, 1, 1, hour, minute, second)
+
+
+def legacy_read(df):
+    df['duration'] = df.lpep_dropoff_datetime - df.lpep_pickup_datetime
+    df.duration = df.duration.apply(lambda td: td.total_seconds() / 60)
+    df = df[(df.duration >= 1) & (df.duration <= 60)].copy()
+
+    categorical = ['PULocationID', 'DOLocationID']
+    df[categorical] = df[categorical].astype(str)
+    return df
+
+
+def green_trips():
+    data = [
+        (1, 1, dt(1, 2), dt(1, 10), 1.5),
+        (130, 205, dt(1, 2), dt(1, 2, 30), 0.2),
+        (130, 205, dt(1, 2), dt(1, 20, 15), 3.66),
+        (7, 42, dt(1, 2), dt(2, 2, 1), 20.0),
+        (7, 42, dt(1, 2), dt(2, 2), 19.0),
+    ]
+    columns = [
+        'PULocationID',
+        'DOLocationID',
+        'lpep_pickup_datetime',
+        'lpep_dropoff_datetime',
+        'trip_distance',
+    ]
+    return pd.DataFrame(data, columns=columns)
+
+
+def test_prepare_trips_matches_legacy():
+    expected = legacy_read(green_trips())
+    actual = trips.prepare_trips(green_trips())
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_prepare_trips_fhv():
+    data = [
+        (None, None, dt(1, 2), dt(1, 10)),
+        (1, 1, dt(1, 2), dt(1, 10)),
+        (1, 1, dt(1, 2, 0), dt(1, 2, 50)),
+        (1, 1, dt(1, 2, 0), dt(2, 2, 1)),
+    ]
+    categorical = ['PUlocationID', 'DOlocationID']
+    columns = categorical + ['pickup_datetime', 'dropOff_datetime']
+    df = pd.DataFrame(data, columns=columns)
+
+    actual = trips.prepare_trips(df, categorical=categorical, fill_value=-1)
+
+    assert list(actual.index) == [0, 1]
+    assert list(actual.PUlocationID) == ['-1', '1']
+    assert list(actual.duration) == [8.0, 8.0]
+
@@ -0,0 +1,47 @@
+"""Per-task wall-clock timings for the training flows.
+
+Decorate the task functions (under ``@task``) with a shared ``TaskTimer`` and
+log ``timer.summary()`` at the end of the flow: it lists when each task ran
+relative to the flow start, and how much task time overlapped, which shows
+the critical path shrinking as independent tasks run concurrently.
+"""
+import functools
+import threading
+from time import perf_counter
+
+
+class TaskTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.origin = perf_counter()
+        self.records = []
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                with self._lock:
+                    self.records.append((fn.__name__, start - self.origin, end - self.origin))
+
+        return timed
+
+    def summary(self):
+        if not self.records:
+            return 'no tasks timed'
+        records = sorted(self.records, key=lambda record: record[1])
+        lines = [
+            f'{name:<24} {start:8.2f}s -> {end:8.2f}s  ({end - start:7.2f}s)'
+            for name, start, end in records
+        ]
+        busy = sum(end - start for _, start, end in records)
+        wall = max(end for _, _, end in records) - records[0][1]
+        overlap = busy / wall if wall else 1.0
+        lines.append(f'{busy:.2f}s of task time in {wall:.2f}s wall clock ({overlap:.2f}x overlap)')
+        return '\n'.join(lines)
@@ -0,0 +1,166 @@
+"""Batched, asynchronous MLflow logging for hyperopt objectives.
+
+With the fluent API every trial makes a round trip to the tracking server for
+``start_run``, each ``set_tag``, ``log_params``, ``log_metric`` and
+``end_run``. ``BatchLogger.start_run`` instead records the tags, params and
+metrics of the run in memory; when the ``with`` block ends, the run is queued
+and a background thread creates it, writes everything with one
+``log_batch`` call and marks it terminated, while the objective returns.
+
+Call ``flush()`` (or leave the ``with BatchLogger()`` block) wherever the
+runs must be visible, e.g. at the end of a flow. The thread also drains the
+queue before its process exits, which covers pool workers that never call
+``close()``.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+import mlflow
+from mlflow.entities import Metric, Param, RunStatus
+from mlflow.tracking import MlflowClient
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+class BufferedRun:
+    """Tags, params and metrics of one run, held until the run ends."""
+
+    def __init__(self, run_name=None):
+        self.run_name = run_name
+        self.start_time = _now()
+        self.end_time = None
+        self.status = RunStatus.to_string(RunStatus.RUNNING)
+        self.tags = {}
+        self.params = {}
+        self.metrics = []
+
+    def set_tag(self, key, value):
+        self.tags[key] = str(value)
+
+    def set_tags(self, tags):
+        for key, value in tags.items():
+            self.set_tag(key, value)
+
+    def log_param(self, key, value):
+        self.params[key] = str(value)
+
+    def log_params(self, params):
+        for key, value in params.items():
+            self.log_param(key, value)
+
+    def log_metric(self, key, value, step=0):
+        self.metrics.append(Metric(key, float(value), _now(), step))
+
+    def log_metrics(self, metrics, step=0):
+        for key, value in metrics.items():
+            self.log_metric(key, value, step)
+
+
+class BatchLogger:
+    """Log ``BufferedRun``s to MLflow from a background thread.
+
+    The experiment defaults to the active one (``mlflow.set_experiment``) and
+    the tracking URI to the current one, both resolved on first use.
+    """
+
+    def __init__(self, experiment_id=None, client=None):
+        self.experiment_id = experiment_id
+        self.client = client
+        self.errors = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # The thread does not survive a fork, so pool workers start their own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.client is None:
+                self.client = MlflowClient()
+            if self.experiment_id is None:
+                self.experiment_id = mlflow.tracking.fluent._get_experiment_id()
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._closed = False
+            self._thread = threading.Thread(target=self._worker, name='mlflow-batch-logger')
+            self._thread.start()
+
+    def _worker(self):
+        while True:
+            try:
+                run = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                # Drain and stop once closed or once the main thread is done
+                if self._closed or not threading.main_thread().is_alive():
+                    return
+                continue
+            try:
+                self._log(run)
+            except Exception as e:
+                logger.warning('could not log run %r to MLflow: %s', run.run_name, e)
+                self.errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def _log(self, run):
+        created = self.client.create_run(
+            self.experiment_id,
+            start_time=run.start_time,
+            tags=run.tags,
+            run_name=run.run_name,
+        )
+        run_id = created.info.run_id
+        params = [Param(key, value) for key, value in run.params.items()]
+        if params or run.metrics:
+            self.client.log_batch(run_id, metrics=run.metrics, params=params)
+        self.client.set_terminated(run_id, status=run.status, end_time=run.end_time)
+
+    @contextmanager
+    def start_run(self, run_name=None):
+        """Buffer a run; it is queued for logging when the block exits."""
+        self._ensure_started()
+        run = BufferedRun(run_name)
+        try:
+            yield run
+        except BaseException:
+            run.status = RunStatus.to_string(RunStatus.FAILED)
+            raise
+        else:
+            run.status = RunStatus.to_string(RunStatus.FINISHED)
+        finally:
+            run.end_time = _now()
+            self._queue.put(run)
+
+    def flush(self):
+        """Wait until every queued run is logged; re-raise the first failure."""
+        if self._pid != os.getpid():
+            return
+        self._queue.join()
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise errors[0]
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._thread.join()
+            self._pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+